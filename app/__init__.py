@@ -36,6 +36,70 @@ def create_app(config_name='default'):
     from app.routes.auth import auth as auth_blueprint
     app.register_blueprint(auth_blueprint, url_prefix='/auth')
 
+    # Set up the search backend (FTS5, in-memory index or LIKE search)
+    from app.utils.search import setup_search
+    setup_search(app, db)
+
+    # Set up tag/category autocomplete
+    from app.utils.suggest import setup_suggest
+    setup_suggest(app, db)
+
+    # Maintain MinHash signatures for near-duplicate detection
+    from app.utils.duplicates import setup_duplicates
+    setup_duplicates(app, db)
+
+    # Keep the precomputed related prompts up to date
+    from app.utils.related import setup_related
+    setup_related(app, db)
+
+    # Change log for incremental sync
+    from app.utils.changes import setup_changes
+    setup_changes(app, db)
+
+    # Denormalized tag/category snapshot for list pages
+    from app.utils.label_snapshot import setup_label_snapshot
+    setup_label_snapshot(app, db)
+
+    # Tag/category usage counts
+    from app.utils.usage_counts import setup_usage_counts
+    setup_usage_counts(app, db)
+
+    # Bulk import CLI commands
+    from app.utils.bulk_import import setup_bulk_import
+    setup_bulk_import(app)
+
+    # Bump prompt timestamps on tag/category changes (for ETag/Last-Modified)
+    from app.utils.http_cache import setup_http_cache
+    setup_http_cache(app, db)
+
+    # JSON provider and serializer check/benchmark commands
+    from app.utils.serializer import setup_serializer
+    setup_serializer(app)
+
+    # gzip/zstd response compression
+    from app.utils.compression import setup_compression
+    setup_compression(app)
+
+    # API rate limits and concurrency caps
+    from app.utils.rate_limit import setup_rate_limit
+    setup_rate_limit(app)
+
+    # Coalesce identical concurrent read requests
+    from app.utils.single_flight import setup_single_flight
+    setup_single_flight(app)
+
+    # SQL query budgets per request (development and testing)
+    from app.utils.query_budget import setup_query_budget
+    setup_query_budget(app)
+
+    # Index advisor CLI command
+    from app.utils.db_advise import setup_db_advise
+    setup_db_advise(app)
+
+    # Load test CLI command
+    from app.utils.loadtest import setup_loadtest
+    setup_loadtest(app)
+
     # 注释掉自动创建数据库表的代码，改为使用迁移来管理数据库结构
     # with app.app_context():
     #     db.create_all()
@@ -1,5 +1,7 @@
 # Import models to make them available when importing from app.models
-from app.models.prompt import Prompt, prompt_categories, prompt_tags
+from app.models.prompt import (Prompt, PromptLSHBucket, PromptRelated, prompt_categories,
+                               prompt_tags)
 from app.models.category import Category
 from app.models.tag import Tag
-from app.models.user import User
\ No newline at end of file
+from app.models.user import User
+from app.models.change_log import ChangeLog
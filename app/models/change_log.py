@@ -0,0 +1,22 @@
+from datetime import datetime
+from app.extensions import db
+
+class ChangeLog(db.Model):
+    """提示、标签和分类的变更记录，自增 id 作为增量同步的游标"""
+    __tablename__ = 'change_log'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    entity = db.Column(db.String(20), nullable=False)  # prompt, tag, category
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # insert, update, delete
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    # 按用户读取某个游标之后的变更；sqlite_autoincrement 保证 id 不会被重用
+    __table_args__ = (
+        db.Index('ix_change_log_user_id_id', 'user_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+
+    def __repr__(self):
+        return f'<ChangeLog {self.id} {self.op} {self.entity} {self.entity_id}>'
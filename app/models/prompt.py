@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import or_, ForeignKey
+from sqlalchemy import ForeignKey
 from app.extensions import db
 from app.models.tag import Tag
 from app.models.category import Category
@@ -8,15 +8,39 @@ from app.models.category import Category
 prompt_categories = db.Table('prompt_categories',
     db.Column('prompt_id', db.Integer, ForeignKey('prompts.id'), primary_key=True),
     db.Column('category_id', db.Integer, ForeignKey('categories.id'), primary_key=True),
-    db.Column('user_id', db.Integer, ForeignKey('users.id'), nullable=False, index=True)
+    db.Column('user_id', db.Integer, ForeignKey('users.id'), nullable=False, index=True),
+    # 按分类筛选提示时使用（主键以 prompt_id 开头）
+    db.Index('ix_prompt_categories_category_prompt', 'category_id', 'prompt_id')
 )
 
 prompt_tags = db.Table('prompt_tags',
     db.Column('prompt_id', db.Integer, ForeignKey('prompts.id'), primary_key=True),
     db.Column('tag_id', db.Integer, ForeignKey('tags.id'), primary_key=True),
-    db.Column('user_id', db.Integer, ForeignKey('users.id'), nullable=False, index=True)
+    db.Column('user_id', db.Integer, ForeignKey('users.id'), nullable=False, index=True),
+    # 按标签筛选提示时使用（主键以 prompt_id 开头）
+    db.Index('ix_prompt_tags_tag_prompt', 'tag_id', 'prompt_id')
 )
 
+class PromptLSHBucket(db.Model):
+    """提示 MinHash 签名的 LSH 分桶，用于查找近似重复的提示"""
+    __tablename__ = 'prompt_lsh_buckets'
+
+    prompt_id = db.Column(db.Integer, ForeignKey('prompts.id'), primary_key=True)
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    user_id = db.Column(db.Integer, ForeignKey('users.id'), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_prompt_lsh_buckets_user_bucket', 'user_id', 'bucket'),
+    )
+
+class PromptRelated(db.Model):
+    """预先计算的相关提示：TF-IDF 余弦相似度最高的若干个提示"""
+    __tablename__ = 'prompt_related'
+
+    prompt_id = db.Column(db.Integer, ForeignKey('prompts.id'), primary_key=True)
+    related_id = db.Column(db.Integer, ForeignKey('prompts.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
 class Prompt(db.Model):
     __tablename__ = 'prompts'
     
@@ -27,12 +51,22 @@ class Prompt(db.Model):
     user_id = db.Column(db.Integer, ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # 标题和内容的 MinHash 签名，用于近似重复检测（默认不随列表查询加载）
+    minhash = db.deferred(db.Column(db.LargeBinary, nullable=True))
+    # 标签和分类的 JSON 快照，列表接口据此输出而不查询关联表（见 app.utils.label_snapshot）
+    labels = db.deferred(db.Column(db.Text, nullable=True))
+    # 文本或标签变化后需要重新计算相关提示
+    related_stale = db.Column(db.Boolean, nullable=False, default=True, index=True)
+    # 每次标记 related_stale 时加一；重新计算后只清除期间没有再次被标记的提示
+    related_generation = db.Column(db.Integer, nullable=False, default=0)
     
     # Relationships
+    # 默认按需加载；列表等需要关联的查询在调用处用 selectinload 批量加载
     categories = db.relationship(
         'Category',
         secondary=prompt_categories,
-        lazy='subquery',
+        lazy='select',
+        order_by='Category.id',
         primaryjoin="and_(Prompt.id==prompt_categories.c.prompt_id, "
                    "Prompt.user_id==prompt_categories.c.user_id)",
         backref=db.backref('prompts', lazy=True)
@@ -41,11 +75,25 @@ class Prompt(db.Model):
     tags = db.relationship(
         'Tag',
         secondary=prompt_tags,
-        lazy='subquery',
+        lazy='select',
+        order_by='Tag.id',
         primaryjoin="and_(Prompt.id==prompt_tags.c.prompt_id, "
                    "Prompt.user_id==prompt_tags.c.user_id)",
         backref=db.backref('prompts', lazy=True)
     )
+
+    lsh_buckets = db.relationship(
+        'PromptLSHBucket',
+        lazy=True,
+        cascade='all, delete-orphan'
+    )
+
+    # 列表按 (created_at, id) 倒序做游标分页；按用户筛选的查询见 flask db-advise
+    __table_args__ = (
+        db.Index('ix_prompts_created_at_id', 'created_at', 'id'),
+        db.Index('ix_prompts_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_prompts_user_id_related_stale', 'user_id', 'related_stale'),
+    )
     
     def __repr__(self):
         return f'<Prompt {self.title}>'
@@ -65,33 +113,25 @@ class Prompt(db.Model):
             'tags': [t.to_dict() for t in self.tags]
         }
 
+    def search_fields(self):
+        """返回各搜索字段的文本，用于构建搜索索引"""
+        return {
+            'title': self.title,
+            'content': self.content,
+            'description': self.description or '',
+            'tags': ' '.join(t.name for t in self.tags),
+            'categories': ' '.join(c.name for c in self.categories)
+        }
+
     def search_content(self):
         """返回包含所有可搜索内容的字符串"""
-        return f"{self.title} {self.content} {self.description or ''}"
+        return ' '.join(self.search_fields().values())
     
     @classmethod
     def search(cls, query, user_id, page=1, per_page=10):
         """
         在用户范围内搜索提示。
-        包括标签和类别的搜索。
+        包括标签和类别的搜索，可用时使用 FTS5 索引并按相关度排序。
         """
-        # 基础搜索条件：必须属于当前用户
-        base_condition = cls.user_id == user_id
-
-        # 文本搜索
-        text_search = (
-            cls.title.contains(query) | 
-            cls.content.contains(query) | 
-            cls.description.contains(query)
-        )
-        
-        # 标签名称搜索
-        tag_search = cls.tags.any(Tag.name.contains(query))
-        
-        # 类别名称搜索
-        category_search = cls.categories.any(Category.name.contains(query))
-        
-        # 组合所有搜索条件
-        search_filter = base_condition & or_(text_search, tag_search, category_search)
-        
-        return cls.query.filter(search_filter).paginate(page=page, per_page=per_page)
+        from app.utils.search import search_prompts
+        return search_prompts(query, page=page, per_page=per_page, user_id=user_id)
@@ -9,6 +9,8 @@ class Tag(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # 使用该标签的提示数，随关联变化增量维护（见 app.utils.usage_counts）
+    usage_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
 
     # 在用户范围内名称唯一
     __table_args__ = (
@@ -1,10 +1,16 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort
 from app.extensions import db
 from app.models import Prompt, Category, Tag, User 
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, SelectMultipleField, SubmitField
 from wtforms.validators import DataRequired, Length, ValidationError
 from app.utils.auth_decorators import admin_required, get_jwt_identity
+from app.utils.search import get_search_stats
+from app.utils.single_flight import get_single_flight_stats
+from app.utils.duplicates import find_near_duplicates, find_duplicate_clusters
+from app.utils.pagination import InvalidCursor, keyset_paginate
+from app.utils.fieldsets import relationship_options
+from app.utils.query_budget import query_budget
 
 admin = Blueprint('admin', __name__)
 
@@ -44,7 +50,37 @@ class PromptForm(FlaskForm):
             if value not in current_choices:
                 field.choices.append((value, value))
 
+def selected_choices(model, values):
+    """
+    Build select choices for only the selected values.
+
+    The forms load options on demand from the suggest API, so only the
+    submitted or pre-selected items need choices (for validation and
+    re-rendering). Numeric values are resolved to names in one query; other
+    values are new names typed by the user.
+    """
+    values = [v for v in (values or []) if v]
+    ids = [int(v) for v in values if v.isdigit()]
+    names = {}
+    if ids:
+        names = dict(model.query.with_entities(model.id, model.name).filter(
+            model.id.in_(ids)))
+    return [(v, names.get(int(v), v) if v.isdigit() else v) for v in values]
+
+def flash_near_duplicates(prompt):
+    """Warn about existing prompts that are near-duplicates of ``prompt``."""
+    duplicates = find_near_duplicates(prompt, limit=5)
+    if duplicates:
+        titles = ', '.join(f'"{title}" ({score:.0%})' for score, _, title in duplicates)
+        flash(f'This prompt is very similar to: {titles}', 'warning')
+
+def populate_choices(form):
+    """Set the category and tag choices of a PromptForm from its data."""
+    form.categories.choices = selected_choices(Category, form.categories.data)
+    form.tags.choices = selected_choices(Tag, form.tags.data)
+
 @admin.route('/')
+@query_budget(4)
 @admin_required
 def index(current_user):
     """Admin dashboard."""
@@ -61,12 +97,15 @@ def index(current_user):
         return redirect(url_for('auth.login'))
 
 @admin.route('/prompts')
+@query_budget(4)
 @admin_required
 def prompts(current_user):
     """List all prompts."""
-    page = request.args.get('page', 1, type=int)
-    prompts = Prompt.query.order_by(Prompt.created_at.desc()).paginate(
-        page=page, per_page=20)
+    try:
+        prompts = keyset_paginate(Prompt.query.options(*relationship_options()),
+                                  request.args.get('cursor'), per_page=20, include_total=False)
+    except InvalidCursor:
+        abort(400)
     return render_template('admin/prompts.html', prompts=prompts)
 
 @admin.route('/prompts/new', methods=['GET', 'POST'])
@@ -75,27 +114,20 @@ def create_prompt(current_user):
     """Create a new prompt."""
     form = PromptForm()
     user_id = get_jwt_identity()
-    # Populate category and tag choices
-    form.categories.choices = [(str(c.id), c.name) for c in Category.query.all()]
-    form.tags.choices = [(str(t.id), t.name) for t in Tag.query.all()]
+    # Only the selected categories and tags need choices; the rest are
+    # loaded on demand by the Select2 suggest data source
+    populate_choices(form)
     
     if request.method == 'POST':
         # 检查是否为AJAX请求
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             data = request.get_json()
             form = PromptForm(data=data, meta={'csrf': False})
+            populate_choices(form)
             if form.validate():
                 # 处理表单数据...
                 return jsonify({'success': True, 'message': 'Prompt created successfully!'})
             return jsonify({'success': False, 'errors': form.errors}), 400
-        
-        # 传统表单处理
-        for value in form.categories.data:
-            if value not in dict(form.categories.choices):
-                form.categories.choices.append((value, value))
-        for value in form.tags.data:
-            if value not in dict(form.tags.choices):
-                form.tags.choices.append((value, value))
     
     if form.validate_on_submit():
         prompt = Prompt(
@@ -143,6 +175,7 @@ def create_prompt(current_user):
         db.session.add(prompt)
         db.session.commit()
         flash('Prompt created successfully!', 'success')
+        flash_near_duplicates(prompt)
         return redirect(url_for('admin.prompts'))
     
     return render_template('admin/prompt_form.html', form=form, title='New Prompt')
@@ -151,26 +184,19 @@ def create_prompt(current_user):
 @admin_required
 def edit_prompt(id, current_user):
     """Edit an existing prompt."""
-    prompt = Prompt.query.get_or_404(id)
+    prompt = Prompt.query.options(*relationship_options()).get_or_404(id)
     form = PromptForm(obj=prompt)
     user_id = get_jwt_identity()
     
-    # Populate category and tag choices
-    form.categories.choices = [(str(c.id), c.name) for c in Category.query.all()]
-    form.tags.choices = [(str(t.id), t.name) for t in Tag.query.all()]
-    
     if request.method == 'GET':
         # Pre-select existing categories and tags
+        form.categories.choices = [(str(c.id), c.name) for c in prompt.categories]
+        form.tags.choices = [(str(t.id), t.name) for t in prompt.tags]
         form.categories.data = [str(c.id) for c in prompt.categories]
         form.tags.data = [str(t.id) for t in prompt.tags]
     else:
-        # 在POST请求时更新choices以包含新输入的值
-        for value in form.categories.data:
-            if value not in dict(form.categories.choices):
-                form.categories.choices.append((value, value))
-        for value in form.tags.data:
-            if value not in dict(form.tags.choices):
-                form.tags.choices.append((value, value))
+        # 只为提交的值生成choices，新输入的名称原样保留
+        populate_choices(form)
     
     if form.validate_on_submit():
         prompt.title = form.title.data
@@ -210,6 +236,7 @@ def edit_prompt(id, current_user):
         
         db.session.commit()
         flash('Prompt updated successfully!', 'success')
+        flash_near_duplicates(prompt)
         return redirect(url_for('admin.prompts'))
     
     return render_template('admin/prompt_form.html', form=form, title='Edit Prompt')
@@ -224,12 +251,36 @@ def delete_prompt(id, current_user):
     flash('Prompt deleted successfully!', 'success')
     return redirect(url_for('admin.prompts'))
 
+@admin.route('/prompts/duplicates')
+@admin_required
+def duplicates(current_user):
+    """Report clusters of near-duplicate prompts."""
+    clusters = find_duplicate_clusters()
+    return render_template('admin/duplicates.html', clusters=clusters)
+
+@admin.route('/search/stats')
+@admin_required
+def search_stats(current_user):
+    """Search backend and result cache statistics for this worker process."""
+    return jsonify(get_search_stats())
+
+@admin.route('/single-flight/stats')
+@admin_required
+def single_flight_stats(current_user):
+    """Request coalescing statistics for this worker process."""
+    return jsonify(get_single_flight_stats())
+
 @admin.route('/categories')
 @admin_required
 def categories(current_user):
-    """List all categories."""
-    categories = Category.query.order_by(Category.name).all()
-    return render_template('admin/categories.html', categories=categories)
+    """List all categories, by name or by number of prompts (``?sort=usage``)."""
+    if request.args.get('sort') == 'usage':
+        order = (Category.usage_count.desc(), Category.name)
+    else:
+        order = (Category.name,)
+    categories = Category.query.order_by(*order).all()
+    return render_template('admin/categories.html', categories=categories,
+                           sort=request.args.get('sort', 'name'))
 
 @admin.route('/categories/new', methods=['GET', 'POST'])
 @admin_required
@@ -284,9 +335,14 @@ def delete_category(id, current_user):
 @admin.route('/tags')
 @admin_required
 def tags(current_user):
-    """List all tags."""
-    tags = Tag.query.order_by(Tag.name).all()
-    return render_template('admin/tags.html', tags=tags)
+    """List all tags, by name or by number of prompts (``?sort=usage``)."""
+    if request.args.get('sort') == 'usage':
+        order = (Tag.usage_count.desc(), Tag.name)
+    else:
+        order = (Tag.name,)
+    tags = Tag.query.order_by(*order).all()
+    return render_template('admin/tags.html', tags=tags,
+                           sort=request.args.get('sort', 'name'))
 
 @admin.route('/tags/new', methods=['GET', 'POST'])
 @admin_required
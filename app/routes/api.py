@@ -1,6 +1,21 @@
-from flask import Blueprint, jsonify, request, current_app
+from functools import lru_cache
+from flask import Blueprint, abort, jsonify, request, current_app, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import Prompt, Category, Tag
 from app.extensions import db, ma
+from app.utils.search import search_prompts as search_prompts_query, search_facets
+from app.utils.suggest import get_suggest_index
+from app.utils.related import get_related
+from app.utils.prompt_filter import PromptFilter
+from app.utils.pagination import InvalidCursor, InvalidPerPage, keyset_paginate, parse_per_page
+from app.utils.export import EXPORT_FORMATS, csv_lines, iter_prompts, ndjson_lines
+from app.utils.bulk_import import import_prompts, parse_json_records, parse_ndjson_records
+from app.utils.http_cache import listing_validators, prompt_validators
+from app.utils.fieldsets import InvalidFieldset, load_options, parse_fieldset
+from app.utils.serializer import get_serializer
+from app.utils.changes import CursorExpired, current_state, head_cursor, read_changes
+from app.utils.single_flight import coalesce, request_key
+from app.utils.query_budget import query_budget
 
 api = Blueprint('api', __name__)
 
@@ -23,34 +38,71 @@ class PromptSchema(ma.Schema):
 prompt_schema = PromptSchema()
 prompts_schema = PromptSchema(many=True)
 
+@lru_cache(maxsize=None)
+def get_prompt_schema(fields=None, many=False):
+    """Return a schema limited to a sparse fieldset (cached per fieldset)."""
+    if fields is None:
+        return prompts_schema if many else prompt_schema
+    return PromptSchema(only=fields, many=many)
+
+def _per_page():
+    """Return the validated ``per_page`` of the request."""
+    return parse_per_page(request.args, current_app.config['PROMPTS_PER_PAGE'],
+                          current_app.config.get('MAX_PER_PAGE', 100))
+
 @api.route('/prompts', methods=['GET'])
+@query_budget(5)
 def get_prompts():
     """
-    Get a paginated list of prompts with optional filtering by category or tag.
+    Get a paginated list of prompts with optional filtering by categories or tags.
+
+    Pages are addressed by cursor (``cursor``, ``include_total``) unless a
+    ``page`` number is given.
     """
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', current_app.config['PROMPTS_PER_PAGE'], type=int)
+    try:
+        per_page = _per_page()
+        fields = parse_fieldset(request.args)
+    except (InvalidPerPage, InvalidFieldset) as e:
+        return jsonify({'message': str(e)}), 400
     
-    # Base query
-    query = Prompt.query
+    # Apply tag/category filters as semi-joins (no duplicate rows to remove)
+    query = PromptFilter.from_args(request.args).apply(Prompt.query)
     
-    # Apply filters if provided
-    category_id = request.args.get('category', type=int)
-    tag_id = request.args.get('tag', type=int)
+    # Answer conditional requests from the change log head, before touching prompts
+    validators = listing_validators()
+    if validators.is_fresh():
+        return validators.not_modified()
     
-    if category_id:
-        query = query.join(Prompt.categories).filter(Category.id == category_id)
+    # Concurrent identical requests share one computation of the page
+    try:
+        result = coalesce('api.get_prompts', request_key(request.args, validators.etag),
+                          lambda: _listing_page(query, fields, per_page))
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    return validators.apply(jsonify(result))
+
+def _listing_page(query, fields, per_page):
+    """Build the response body of ``get_prompts`` for the filtered query."""
+    # Select plain rows of the requested columns for the fast serializer
+    serializer = get_serializer(fields)
+    query = query.with_entities(*serializer.columns)
     
-    if tag_id:
-        query = query.join(Prompt.tags).filter(Tag.id == tag_id)
+    if 'page' not in request.args:
+        include_total = request.args.get('include_total', 'true').lower() not in ('false', '0')
+        cursor_page = keyset_paginate(query, request.args.get('cursor'), per_page,
+                                      include_total=include_total)
+        return {
+            'prompts': serializer.dump_rows(cursor_page.items),
+            'pagination': cursor_page.to_dict()
+        }
     
-    # Execute query with pagination
+    # Execute query with offset pagination
+    page = request.args.get('page', 1, type=int)
     paginated_prompts = query.order_by(Prompt.created_at.desc()).paginate(
         page=page, per_page=per_page)
     
-    # Prepare response
-    result = {
-        'prompts': prompts_schema.dump(paginated_prompts.items),
+    return {
+        'prompts': serializer.dump_rows(paginated_prompts.items),
         'pagination': {
             'page': paginated_prompts.page,
             'per_page': paginated_prompts.per_page,
@@ -58,18 +110,24 @@ def get_prompts():
             'total_items': paginated_prompts.total
         }
     }
-    
-    return jsonify(result)
 
 @api.route('/prompts/search', methods=['GET'])
+@query_budget(5)
 def search_prompts():
     """
     Search prompts by query string with optional field filtering.
+
+    ``fields`` selects the searched fields here, so the returned fields are
+    chosen with ``fields[prompts]``.
     """
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', current_app.config['PROMPTS_PER_PAGE'], type=int)
     query = request.args.get('q', '')
     fields = request.args.get('fields', 'all')
+    try:
+        per_page = _per_page()
+        prompt_fields = parse_fieldset(request.args, param=None)
+    except (InvalidPerPage, InvalidFieldset) as e:
+        return jsonify({'message': str(e)}), 400
     
     if not query:
         return jsonify({
@@ -79,29 +137,224 @@ def search_prompts():
                 'per_page': per_page,
                 'total_pages': 0,
                 'total_items': 0
-            }
+            },
+            'facets': {'tags': [], 'categories': []}
         })
     
-    # This is a placeholder. In a real implementation, we would use SQLite FTS5
-    # and filter by specific fields based on the 'fields' parameter
-    paginated_prompts = Prompt.search(query, page, per_page)
+    # Concurrent identical searches share one computation of the results
+    result = coalesce('api.search_prompts', request_key(request.args),
+                      lambda: _search_page(query, fields, prompt_fields, page, per_page))
+    return jsonify(result)
+
+def _search_page(query, fields, prompt_fields, page, per_page):
+    """Build the response body of ``search_prompts``."""
+    # Uses the FTS5 index when available, restricted to the requested fields;
+    # only the ids of the page are loaded, the serializer reads their rows
+    prompt_filter = PromptFilter.from_args(request.args)
+    paginated_prompts = search_prompts_query(query, fields, page=page, per_page=per_page,
+                                             prompt_filter=prompt_filter,
+                                             options=load_options(('id',)))
+    prompts, _ = get_serializer(prompt_fields).dump_ids(
+        [prompt.id for prompt in paginated_prompts.items])
     
-    result = {
-        'prompts': prompts_schema.dump(paginated_prompts.items),
+    return {
+        'prompts': prompts,
         'pagination': {
             'page': paginated_prompts.page,
             'per_page': paginated_prompts.per_page,
             'total_pages': paginated_prompts.pages,
             'total_items': paginated_prompts.total
-        }
+        },
+        'facets': search_facets(query, fields, prompt_filter=prompt_filter)
     }
-    
+
+@api.route('/prompts/export', methods=['GET'])
+def export_prompts():
+    """
+    Stream all prompts matching the filters as NDJSON (default) or CSV.
+
+    Prompts are ordered by id; pass the last id received as ``after`` to
+    resume an interrupted download.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'message': f'Unsupported format: {export_format}'}), 400
+    try:
+        fields = parse_fieldset(request.args)
+    except InvalidFieldset as e:
+        return jsonify({'message': str(e)}), 400
+
+    prompts = iter_prompts(PromptFilter.from_args(request.args),
+                           after=request.args.get('after', 0, type=int), fields=fields)
+    lines = ndjson_lines(prompts) if export_format == 'ndjson' else csv_lines(prompts, fields)
+    return Response(
+        stream_with_context(lines),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename=prompts.{export_format}'}
+    )
+
+@api.route('/prompts/import', methods=['POST'])
+@jwt_required()
+def import_prompts_api():
+    """
+    Import prompts for the current user from a JSON array or NDJSON body.
+    """
+    user_id = int(get_jwt_identity())
+    body = request.get_data(as_text=True)
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        records = parse_ndjson_records(body.splitlines())
+    else:
+        try:
+            records = parse_json_records(body)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+    return jsonify(import_prompts(records, user_id))
+
+def _batch_ids():
+    """Read the requested ids from ``?ids=1,2`` or a JSON body ``{"ids": [1, 2]}``."""
+    if request.method == 'POST':
+        values = (request.get_json(silent=True) or {}).get('ids')
+        if not isinstance(values, list):
+            raise ValueError('Request body must be a JSON object with an "ids" list')
+    else:
+        values = [v for arg in request.args.getlist('ids') for v in arg.split(',') if v.strip()]
+    return parse_batch_ids(values)
+
+def parse_batch_ids(values):
+    """Validate requested prompt ids; raises ValueError for anything but integers."""
+    ids = []
+    for value in values:
+        if isinstance(value, bool) or not str(value).strip().isdigit():
+            raise ValueError(f'Invalid prompt id: {value!r}')
+        ids.append(int(value))
+    # 去重并保持请求的顺序
+    return list(dict.fromkeys(ids))
+
+@api.route('/prompts/batch', methods=['GET', 'POST'])
+@query_budget(3)
+def get_prompts_batch():
+    """
+    Get many prompts in one request, in the requested order.
+    """
+    try:
+        ids = _batch_ids()
+        fields = parse_fieldset(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    max_ids = current_app.config['API_BATCH_MAX_IDS']
+    if len(ids) > max_ids:
+        return jsonify({'message': f'At most {max_ids} ids can be requested at once'}), 400
+
+    # 一次 IN 查询读取提示的列，标签和分类各用一次 IN 查询批量读取
+    prompts, missing = get_serializer(fields).dump_ids(ids)
+    return jsonify({'prompts': prompts, 'missing': missing})
+
+@api.route('/prompts/changes', methods=['GET'])
+@query_budget(7)
+@jwt_required()
+def get_changes():
+    """
+    Get the current user's prompt, tag and category changes after a cursor.
+
+    Without ``since`` only the current cursor is returned: read the whole
+    vault after taking it, then sync from it.
+    """
+    user_id = int(get_jwt_identity())
+    try:
+        fields = parse_fieldset(request.args)
+    except InvalidFieldset as e:
+        return jsonify({'message': str(e)}), 400
+
+    since = request.args.get('since')
+    if since is None:
+        return jsonify({'changes': [], 'prompts': [], 'tags': [], 'categories': [],
+                        'cursor': str(head_cursor()), 'has_more': False})
+    if not since.isdigit():
+        return jsonify({'message': 'Invalid cursor'}), 400
+
+    max_limit = current_app.config['CHANGE_FEED_MAX_LIMIT']
+    limit = min(max(request.args.get('limit', max_limit, type=int), 1), max_limit)
+    try:
+        entries, cursor, has_more = read_changes(user_id, int(since), limit)
+    except CursorExpired:
+        return jsonify({'message': 'Cursor expired, sync from scratch'}), 410
+
+    result = {
+        'changes': [{'seq': seq, 'entity': entity, 'id': entity_id, 'op': op,
+                     'changed_at': changed_at.isoformat()}
+                    for seq, entity, entity_id, op, changed_at in entries],
+        'cursor': str(cursor),
+        'has_more': has_more
+    }
+    result.update(current_state(entries, fields))
     return jsonify(result)
 
 @api.route('/prompts/<int:id>', methods=['GET'])
+@query_budget(4)
 def get_prompt(id):
     """
     Get details for a specific prompt.
     """
-    prompt = Prompt.query.get_or_404(id)
-    return jsonify(prompt_schema.dump(prompt))
+    try:
+        fields = parse_fieldset(request.args)
+    except InvalidFieldset as e:
+        return jsonify({'message': str(e)}), 400
+    validators = prompt_validators(id)
+    if validators is None:
+        abort(404)
+    if validators.is_fresh():
+        return validators.not_modified()
+    prompt = Prompt.query.options(*load_options(fields)).get_or_404(id)
+    return validators.apply(jsonify(get_prompt_schema(fields).dump(prompt)))
+
+@api.route('/prompts/<int:id>/related', methods=['GET'])
+@query_budget(2)
+def get_related_prompts(id):
+    """
+    Get the precomputed related prompts of a prompt.
+    """
+    limit = min(max(request.args.get('limit', current_app.config['RELATED_PROMPTS_K'],
+                                     type=int), 1), current_app.config['RELATED_PROMPTS_K'])
+    Prompt.query.with_entities(Prompt.id).filter_by(id=id).first_or_404()
+    related = get_related(id, limit)
+    return jsonify({
+        'prompt_id': id,
+        'related': [{'id': related_id, 'title': title, 'score': round(score, 4)}
+                    for related_id, title, score in related]
+    })
+
+
+def _suggest(kind):
+    """Return one page of the current user's tag or category names by prefix."""
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    prefix = request.args.get('q', '').strip()
+    user_id = int(get_jwt_identity())
+
+    entries, total = get_suggest_index().suggest(user_id, kind, prefix, page, per_page)
+    return jsonify({
+        kind: [{'id': item_id, 'name': name} for item_id, name in entries],
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total_pages': (total + per_page - 1) // per_page,
+            'total_items': total
+        }
+    })
+
+@api.route('/tags/suggest', methods=['GET'])
+@jwt_required()
+def suggest_tags():
+    """
+    Autocomplete the current user's tags by name prefix.
+    """
+    return _suggest('tags')
+
+@api.route('/categories/suggest', methods=['GET'])
+@jwt_required()
+def suggest_categories():
+    """
+    Autocomplete the current user's categories by name prefix.
+    """
+    return _suggest('categories')
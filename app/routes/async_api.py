@@ -0,0 +1,342 @@
+"""
+Async variant of the JSON API's read endpoints, served over ASGI.
+
+Sync workers spend most of a read request waiting on the database, and the
+only way to serve more requests at once is to add workers (and memory).
+Here the hottest read endpoints are answered on an event loop with an async
+SQLAlchemy engine (``aiosqlite`` for SQLite, ``asyncmy`` for MySQL), so a
+single worker keeps many requests in flight while they wait on I/O:
+
+- ``GET /api/prompts`` (cursor pages)
+- ``GET /api/prompts/<id>``
+- ``GET /api/prompts/batch``
+
+They build their statements with the same code as the sync endpoints
+(``PromptFilter``, ``keyset_query``, ``PromptSerializer``) and return the
+same bodies, ETags, ``304 Not Modified`` responses and compression.
+
+Everything else is passed to the Flask app, which runs in a thread pool
+(asgiref's ``WsgiToAsgi``): writes, HTML pages, the other API endpoints,
+and any read request the async handlers do not accept — invalid
+parameters, missing prompts, ``page`` numbers — so errors look exactly as
+they do with the sync app. The rate limits and concurrency caps of
+``app.utils.rate_limit`` apply to the async endpoints as well (a request
+that turns out to be a 404 is counted again by Flask). ``asgi.py`` mounts
+both::
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8000 --workers 4
+"""
+
+import re
+from functools import partial
+from urllib.parse import parse_qsl
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import http_date, parse_accept_header, parse_cookie, quote_etag
+from werkzeug.sansio.http import is_resource_modified
+
+from app.models import Prompt
+from app.routes.api import parse_batch_ids
+from app.utils.compression import COMPRESSORS, negotiate_encoding, split_etag_encoding
+from app.utils.fieldsets import InvalidFieldset, parse_fieldset
+from app.utils.http_cache import change_log_fingerprint, make_etag
+from app.utils.pagination import InvalidCursor, InvalidPerPage, cursor_page, keyset_query, \
+    parse_per_page
+from app.utils.prompt_filter import PromptFilter
+from app.utils.rate_limit import client_key, too_many_requests
+from app.utils.serializer import get_serializer
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # 可选依赖
+    WsgiToAsgi = None
+
+# 同步驱动对应的异步驱动
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'mysql': 'asyncmy', 'postgresql': 'asyncpg'}
+_DETAIL_PATH = re.compile(r'/api/prompts/(\d+)')
+
+
+def async_database_url(url):
+    """
+    Return the async driver URL for a database URL.
+
+    ``sqlite:///app.db`` becomes ``sqlite+aiosqlite:///app.db`` and
+    ``mysql+pymysql://...`` becomes ``mysql+asyncmy://...``.
+
+    Raises:
+        ValueError: If there is no async driver for the database
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver for {backend} databases')
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+class _Request:
+    """The parts of an ASGI HTTP request the handlers read."""
+
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'),
+                                        keep_blank_values=True))
+        self.headers = {name.decode('latin-1'): value.decode('latin-1')
+                        for name, value in scope['headers']}
+        self.cookies = parse_cookie(self.headers.get('cookie'))
+        self.client = scope['client'][0] if scope.get('client') else None
+
+
+class AsyncAPI:
+    """
+    ASGI application answering the read endpoints asynchronously and
+    passing every other request to the Flask app.
+
+    Handlers validate the request and return the coroutine function that
+    answers it, or None to leave the request to Flask.
+
+    Args:
+        app: Flask application instance (its config is used as is)
+        database_url (str): Async database URL, defaults to
+            ``ASYNC_DATABASE_URL`` or the async variant of
+            ``SQLALCHEMY_DATABASE_URI``
+    """
+
+    def __init__(self, app, database_url=None):
+        if WsgiToAsgi is None:
+            raise RuntimeError('The ASGI app requires asgiref (pip install asgiref)')
+        self.app = app
+        self.config = app.config
+        self.wsgi = WsgiToAsgi(app)
+        database_url = (database_url or app.config.get('ASYNC_DATABASE_URL')
+                        or async_database_url(app.config['SQLALCHEMY_DATABASE_URI']))
+        # 连接池在事件循环内复用连接，避免每个请求重新打开数据库
+        self.engine = create_async_engine(
+            database_url, poolclass=AsyncAdaptedQueuePool,
+            pool_size=app.config.get('ASYNC_POOL_SIZE', 10),
+            max_overflow=app.config.get('ASYNC_POOL_MAX_OVERFLOW', 10))
+        # 端点名与 api 蓝图一致，速率限制按端点名配置
+        self.routes = [
+            (re.compile(r'/api/prompts'), 'api.get_prompts', self.list_prompts),
+            (re.compile(r'/api/prompts/batch'), 'api.get_prompts_batch', self.get_prompts_batch),
+            (_DETAIL_PATH, 'api.get_prompt', self.get_prompt),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            for pattern, endpoint, handler in self.routes:
+                match = pattern.fullmatch(scope['path'])
+                if match is not None:
+                    request = _Request(scope)
+                    # 处理函数先校验参数，不接受的请求交给 Flask
+                    run = handler(request, *match.groups())
+                    if run is not None:
+                        response = await self._admit_and_run(request, endpoint, run)
+                        if response is not None:
+                            return await self._send(send, *response)
+                    break
+        await self.wsgi(scope, receive, send)
+
+    async def _admit_and_run(self, request, endpoint, run):
+        """Apply the rate limits and concurrency caps of ``setup_rate_limit``."""
+        limiter = self.app.extensions.get('rate_limiter')
+        if limiter is None:
+            return await run()
+        with self.app.app_context():
+            token = request.cookies.get(self.config['JWT_ACCESS_COOKIE_NAME'])
+            wait = limiter.check_rate(client_key(token, request.client), endpoint)
+            if wait:
+                return self._too_many_requests(wait)
+            allowed, slot = limiter.acquire(endpoint)
+            if not allowed:
+                return self._too_many_requests(1)
+        try:
+            return await run()
+        finally:
+            if slot is not None:
+                with self.app.app_context():
+                    limiter.release(endpoint, slot)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _send(self, send, status, headers, body=b''):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(name.encode('latin-1'), value.encode('latin-1'))
+                                for name, value in headers]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _too_many_requests(self, retry_after):
+        with self.app.app_context():
+            response = too_many_requests(retry_after)
+        return 429, list(response.headers.items()), response.get_data()
+
+    def _is_fresh(self, request, etag, last_modified):
+        # 与 Validators.is_fresh 相同，比较前去掉压缩编码后缀
+        return not is_resource_modified(
+            http_if_none_match=split_etag_encoding(request.headers.get('if-none-match'))[0],
+            http_if_modified_since=request.headers.get('if-modified-since'),
+            etag=etag, last_modified=last_modified)
+
+    def _not_modified(self, request, etag):
+        """Return ``(status, headers)`` of a 304, like ``Validators.not_modified``."""
+        # Werkzeug 不在 304 中发送 Last-Modified，这里保持一致
+        headers = [('Cache-Control', 'no-cache')]
+        encoding = split_etag_encoding(request.headers.get('if-none-match'))[1]
+        if encoding is not None:
+            # 304 沿用客户端缓存的那个表示的 ETag
+            etag = f'{etag}-{encoding}'
+            headers.append(('Vary', 'Accept-Encoding'))
+        return 304, headers + [('ETag', quote_etag(etag))]
+
+    def _respond(self, request, data, etag=None, last_modified=None):
+        """
+        Return ``(status, headers, body)`` of a JSON response, encoded and
+        compressed like ``jsonify`` and the compression hooks do.
+        """
+        body = self.app.json.response(data).get_data()
+        mimetype = self.app.json.mimetype
+        headers = [('Content-Type', mimetype)]
+        algorithms = self.config.get('COMPRESS_ALGORITHMS', ['zstd', 'gzip'])
+        encoding = None
+        if algorithms and mimetype in self.config.get('COMPRESS_MIMETYPES', ()):
+            headers.append(('Vary', 'Accept-Encoding'))
+            if len(body) >= self.config.get('COMPRESS_MIN_SIZE', 500):
+                encoding = negotiate_encoding(
+                    parse_accept_header(request.headers.get('accept-encoding')), algorithms)
+        if encoding is not None:
+            compressor = COMPRESSORS[encoding](self.app)
+            body = compressor.compress(body) + compressor.flush()
+            headers.append(('Content-Encoding', encoding))
+        if etag is not None:
+            if encoding is not None:
+                etag = f'{etag}-{encoding}'
+            headers += [('Cache-Control', 'no-cache'), ('ETag', quote_etag(etag))]
+            if last_modified is not None:
+                headers.append(('Last-Modified', http_date(last_modified)))
+        headers.append(('Content-Length', str(len(body))))
+        return 200, headers, body
+
+    async def _dump_rows(self, conn, serializer, rows):
+        if not rows:
+            return []
+        owners = serializer.owners(rows)
+        link_rows = {name: (await conn.execute(statement)).all()
+                     for name, statement in serializer.link_statements(owners).items()}
+        return serializer.assemble(rows, owners, link_rows)
+
+    async def _dump_ids(self, conn, serializer, ids):
+        rows = {row[0]: row for row in await conn.execute(
+            select(*serializer.columns).where(Prompt.id.in_(ids)))}
+        found = [rows[i] for i in ids if i in rows]
+        return await self._dump_rows(conn, serializer, found), [i for i in ids if i not in rows]
+
+    def list_prompts(self, request):
+        """``GET /api/prompts`` with cursor pagination (``page`` goes to Flask)."""
+        args = request.args
+        if 'page' in args:
+            return None
+        try:
+            fields = parse_fieldset(args)
+            per_page = parse_per_page(args, self.config['PROMPTS_PER_PAGE'],
+                                      self.config.get('MAX_PER_PAGE', 100))
+        except (InvalidFieldset, InvalidPerPage):
+            return None
+        criteria = PromptFilter.from_args(args).criteria()
+        serializer = get_serializer(fields)
+        try:
+            direction, statement = keyset_query(select(*serializer.columns).where(*criteria),
+                                                args.get('cursor'), per_page)
+        except InvalidCursor:
+            return None
+        return partial(self._list_prompts, request, serializer, criteria, direction,
+                       statement, per_page)
+
+    async def _list_prompts(self, request, serializer, criteria, direction, statement,
+                            per_page):
+        args = request.args
+        async with self.engine.connect() as conn:
+            # 与 listing_validators 相同的指纹；列表只用 ETag 校验
+            head, recent = (await conn.execute(change_log_fingerprint())).one()
+            etag = make_etag('prompts', head, recent)
+            if self._is_fresh(request, etag, None):
+                return self._not_modified(request, etag)
+
+            count = None
+            if args.get('include_total', 'true').lower() not in ('false', '0'):
+                count = (await conn.execute(
+                    select(func.count(Prompt.id)).where(*criteria))).scalar()
+            page = cursor_page((await conn.execute(statement)).all(), direction,
+                               args.get('cursor'), per_page, count)
+            prompts = await self._dump_rows(conn, serializer, page.items)
+        return self._respond(request, {'prompts': prompts, 'pagination': page.to_dict()},
+                             etag)
+
+    def get_prompts_batch(self, request):
+        """``GET /api/prompts/batch?ids=...``"""
+        try:
+            ids = parse_batch_ids([v for arg in request.args.getlist('ids')
+                                   for v in arg.split(',') if v.strip()])
+            fields = parse_fieldset(request.args)
+        except ValueError:
+            return None
+        if len(ids) > self.config['API_BATCH_MAX_IDS']:
+            return None
+        return partial(self._get_prompts_batch, request, get_serializer(fields), ids)
+
+    async def _get_prompts_batch(self, request, serializer, ids):
+        prompts, missing = [], []
+        if ids:
+            async with self.engine.connect() as conn:
+                prompts, missing = await self._dump_ids(conn, serializer, ids)
+        return self._respond(request, {'prompts': prompts, 'missing': missing})
+
+    def get_prompt(self, request, prompt_id):
+        """``GET /api/prompts/<id>`` (missing prompts go to Flask for the 404)."""
+        try:
+            fields = parse_fieldset(request.args)
+        except InvalidFieldset:
+            return None
+        return partial(self._get_prompt, request, get_serializer(fields), int(prompt_id))
+
+    async def _get_prompt(self, request, serializer, prompt_id):
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(
+                select(Prompt.updated_at).where(Prompt.id == prompt_id))).first()
+            if row is None:
+                return None
+            # 与 prompt_validators 相同的指纹
+            etag = make_etag('prompt', prompt_id, row.updated_at)
+            if self._is_fresh(request, etag, row.updated_at):
+                return self._not_modified(request, etag)
+            prompts, _ = await self._dump_ids(conn, serializer, [prompt_id])
+        if not prompts:
+            return None
+        return self._respond(request, prompts[0], etag, row.updated_at)
+
+
+def create_asgi_app(app, database_url=None):
+    """
+    Wrap a Flask app in an ASGI app with async read endpoints.
+
+    Args:
+        app: Flask application instance
+        database_url (str): Optional async database URL
+
+    Returns:
+        AsyncAPI
+    """
+    return AsyncAPI(app, database_url)
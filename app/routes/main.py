@@ -1,54 +1,102 @@
-from flask import Blueprint, render_template, request, current_app
+from flask import (Blueprint, render_template, request, current_app, abort, make_response,
+                   session)
+from flask_sqlalchemy import Pagination
 from app.models import Prompt, Category, Tag
+from app.utils.search import search_prompts, search_facets
+from app.utils.related import get_related
+from app.utils.prompt_filter import PromptFilter
+from app.utils.pagination import CursorPage, InvalidCursor, keyset_paginate
+from app.utils.http_cache import prompt_validators
+from app.utils.fieldsets import load_options, relationship_options
+from app.utils.serializer import get_serializer
+from app.utils.single_flight import coalesce, request_key
+from app.utils.query_budget import query_budget
+
+# Prompt fields shown in the main page's list
+INDEX_FIELDS = ('id', 'title', 'description', 'content', 'categories', 'tags')
 
 main = Blueprint('main', __name__)
 
 @main.route('/')
 @main.route('/index')
+@query_budget(8)
 def index():
     """Main page and search interface."""
-    # Get categories and tags for filters
-    categories = Category.query.all()
-    tags = Tag.query.all()
+    query = request.args.get('query', '').strip()
+    # Concurrent identical page views share one assembly of the page data
+    data = coalesce('main.index', request_key(request.args), lambda: _index_data(query))
     
-    # Handle search query and filters
-    query = request.args.get('query', '')
-    tag_id = request.args.get('tag', type=int)
-    category_id = request.args.get('category', type=int)
-    page = request.args.get('page', 1, type=int)
+    if data['pagination']['cursor']:
+        prompts = CursorPage(data['prompts'], data['pagination']['per_page'],
+                             data['pagination']['next_cursor'],
+                             data['pagination']['prev_cursor'])
+    else:
+        prompts = Pagination(None, data['pagination']['page'], data['pagination']['per_page'],
+                             data['pagination']['total'], data['prompts'])
+    facet_counts = {kind: dict(counts) for kind, counts in data['facet_counts'].items()}
     
-    # Start with base query
-    prompts_query = Prompt.query
+    return render_template('main/index.html', 
+                          prompts=prompts, 
+                          categories=data['categories'], 
+                          tags=data['tags'],
+                          query=query,
+                          facet_counts=facet_counts)
+
+def _index_data(query):
+    """
+    Assemble the data of the main page as plain, shareable values.
 
-    if tag_id:
-        # Filter by tag if tag_id is provided
-        prompts_query = prompts_query.join(Prompt.tags).filter(Tag.id == tag_id)
+    Prompts, tags and categories are dictionaries (the template reads them
+    like the models) and facet counts are ``[id, count]`` pairs, so that the
+    result survives a JSON round trip between worker processes.
+    """
+    # Get categories and tags for filters
+    categories = [{'id': c.id, 'name': c.name} for c in Category.query.all()]
+    tags = [{'id': t.id, 'name': t.name} for t in Tag.query.all()]
     
-    if category_id:
-        # Filter by category if category_id is provided
-        prompts_query = prompts_query.join(Prompt.categories).filter(Category.id == category_id)
+    # Handle search query and filters
+    prompt_filter = PromptFilter.from_args(request.args)
+    page = request.args.get('page', 1, type=int)
+    per_page = current_app.config['PROMPTS_PER_PAGE']
+    serializer = get_serializer(INDEX_FIELDS)
     
     if query:
-        # If search query provided, perform search within the filtered results
-        search_filter = (
-            Prompt.title.contains(query) |
-            Prompt.content.contains(query) |
-            Prompt.description.contains(query)
-        )
-        prompts_query = prompts_query.filter(search_filter)
+        # Search within the tag/category filters (FTS5 or cached results when available)
+        results = search_prompts(query, page=page, per_page=per_page,
+                                 prompt_filter=prompt_filter, options=load_options(('id',)))
+        prompts, _ = serializer.dump_ids([prompt.id for prompt in results.items])
+        pagination = {'cursor': False, 'page': results.page, 'per_page': results.per_page,
+                      'total': results.total}
+    else:
+        # Browse newest first with cursor pagination
+        try:
+            results = keyset_paginate(
+                prompt_filter.apply(Prompt.query).with_entities(*serializer.columns),
+                request.args.get('cursor'), per_page, include_total=False)
+        except InvalidCursor:
+            abort(400)
+        prompts = serializer.dump_rows(results.items)
+        pagination = dict(results.to_dict(), cursor=True)
+    # Result counts per tag and category, from one grouped query
+    facets = search_facets(query, prompt_filter=prompt_filter)
+    facet_counts = {kind: [[f['id'], f['count']] for f in values]
+                    for kind, values in facets.items()}
     
-    # Apply ordering and pagination
-    prompts = prompts_query.order_by(Prompt.created_at.desc()).paginate(
-        page=page, per_page=current_app.config['PROMPTS_PER_PAGE'])
-    
-    return render_template('main/index.html', 
-                          prompts=prompts, 
-                          categories=categories, 
-                          tags=tags,
-                          query=query)
+    return {'prompts': prompts, 'pagination': pagination, 'categories': categories,
+            'tags': tags, 'facet_counts': facet_counts}
 
 @main.route('/prompts/<int:id>')
+@query_budget(5)
 def prompt_detail(id):
     """Display details for a specific prompt."""
-    prompt = Prompt.query.get_or_404(id)
-    return render_template('main/prompt_detail.html', prompt=prompt)
+    # 相关提示不会改变 updated_at，一并计入 ETag
+    related = get_related(id)
+    validators = prompt_validators(id, related)
+    if validators is None:
+        abort(404)
+    # 有待显示的 flash 消息时页面内容不同，不返回 304
+    if not session.get('_flashes') and validators.is_fresh():
+        return validators.not_modified()
+    prompt = Prompt.query.options(*relationship_options()).get_or_404(id)
+    return validators.apply(make_response(
+        render_template('main/prompt_detail.html', prompt=prompt, related=related)))
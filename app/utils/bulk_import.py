@@ -0,0 +1,374 @@
+"""
+Bulk import of prompts from JSON or NDJSON.
+
+Records use the same shape as the export: ``title``, ``content``, optional
+``description``, and ``tags`` / ``categories`` given as names or as objects
+with a ``name``. Records are imported in chunks, one transaction per chunk:
+
+1. All tag and category names of the chunk are resolved with one query per
+   kind; missing ones are inserted with a single ``executemany``. Names are
+   matched case-insensitively (``Python`` and ``python`` are one tag), like
+   MySQL's default collation compares them.
+2. Prompts are inserted with a single ``executemany`` (no unit of work or
+   per-object events) and their ids are read back, with their MinHash
+   signatures computed up front.
+3. Tag, category and LSH bucket association rows are written with
+   ``executemany``.
+
+Because the bulk path bypasses the session events, the change log and the
+tag and category usage counts are written within the chunk's transaction,
+and the search cache, the in-memory search index and the autocomplete tries
+are updated explicitly after each chunk. New prompts are inserted with
+``related_stale`` set; their related prompts are computed by ``flask related
+worker`` (or ``refresh``), not within the import. The FTS5 sync triggers would rebuild a
+prompt's index row once per inserted tag or category link, so they are
+suspended within the chunk's transaction and the new prompts are indexed
+with one statement instead (see ``SearchBackend.bulk_insert``).
+
+Invalid records are skipped and reported with their row number.
+"""
+
+import json
+import time
+from collections import Counter
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db
+from app.models import (Category, Prompt, PromptLSHBucket, Tag, User, prompt_categories,
+                        prompt_tags)
+from app.utils.changes import record_changes
+from app.utils.duplicates import compute_signature
+from app.utils.label_snapshot import refresh_snapshots
+from app.utils.search import get_search_backend, get_search_cache
+from app.utils.suggest import get_suggest_index
+from app.utils.usage_counts import add_usage
+
+TITLE_MAX_LENGTH = 200
+TAG_MAX_LENGTH = 50
+CATEGORY_MAX_LENGTH = 100
+
+# 名称查询时 IN 列表的最大长度
+_LOOKUP_CHUNK = 500
+
+
+def parse_json_records(text):
+    """
+    Parse a JSON array (or ``{"prompts": [...]}``) into ``(row, record, error)`` tuples.
+
+    Raises:
+        ValueError: If the document is not valid JSON of the expected shape
+    """
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get('prompts')
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array of prompts or {"prompts": [...]}')
+    return ((row, record, None) for row, record in enumerate(data, 1))
+
+
+def parse_ndjson_records(lines):
+    """Parse NDJSON lines lazily into ``(row, record, error)`` tuples."""
+    for row, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            yield row, json.loads(line), None
+        except ValueError as e:
+            yield row, None, f'Invalid JSON: {e}'
+
+
+def _name_key(name):
+    """Return the key under which tag and category names are matched."""
+    return name.lower()
+
+
+def _names(values, max_length, label):
+    """
+    Normalize a list of names or ``{"name": ...}`` objects into
+    ``{_name_key(name): (name, description)}``; the first spelling is kept.
+    """
+    if values is None:
+        return {}
+    if not isinstance(values, list):
+        raise ValueError(f'{label} must be a list')
+    names = {}
+    for value in values:
+        description = None
+        if isinstance(value, dict):
+            description = value.get('description')
+            value = value.get('name')
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f'{label} names must be non-empty strings')
+        name = value.strip()
+        if len(name) > max_length:
+            raise ValueError(f'{label} name longer than {max_length} characters: {name[:20]}...')
+        names.setdefault(_name_key(name), (name, description))
+    return names
+
+
+def validate_record(record):
+    """Return the cleaned fields of a record, or raise ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError('Record must be a JSON object')
+    title = record.get('title')
+    content = record.get('content')
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError('title is required')
+    if len(title) > TITLE_MAX_LENGTH:
+        raise ValueError(f'title longer than {TITLE_MAX_LENGTH} characters')
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError('content is required')
+    description = record.get('description')
+    if description is not None and not isinstance(description, str):
+        raise ValueError('description must be a string')
+    return {
+        'title': title.strip(),
+        'content': content,
+        'description': description or None,
+        'tags': _names(record.get('tags'), TAG_MAX_LENGTH, 'Tag'),
+        'categories': _names(record.get('categories'), CATEGORY_MAX_LENGTH, 'Category'),
+    }
+
+
+def _resolve_names(model, user_id, names):
+    """
+    Return ``{_name_key(name): id}`` for the given names, creating the missing
+    ones.
+
+    Args:
+        names (dict): ``{_name_key(name): (name, description)}``;
+            descriptions are only used for new categories
+
+    Returns:
+        tuple: ``({key: id}, [(id, name), ...] of created rows)``
+    """
+    def lookup(keys):
+        # 数据库返回的拼写可能与查询的不同（MySQL 默认排序规则不区分大小写）
+        found = {}
+        wanted = sorted(names[key][0] for key in keys)
+        for start in range(0, len(wanted), _LOOKUP_CHUNK):
+            rows = db.session.query(model.name, model.id).filter(
+                model.user_id == user_id, model.name.in_(wanted[start:start + _LOOKUP_CHUNK]))
+            for name, item_id in rows.order_by(model.id):
+                if _name_key(name) in names:
+                    found.setdefault(_name_key(name), (item_id, name))
+        return found
+
+    ids = {key: item_id for key, (item_id, _) in lookup(names).items()}
+    missing = [key for key in names if key not in ids]
+    if not missing:
+        return ids, []
+
+    rows = [{'name': names[key][0], 'user_id': user_id} for key in missing]
+    if model is Category:
+        for row, key in zip(rows, missing):
+            row['description'] = names[key][1]
+    db.session.execute(model.__table__.insert(), rows)
+    created = lookup(missing)
+    ids.update((key, item_id) for key, (item_id, _) in created.items())
+    return ids, list(created.values())
+
+
+class ImportConflict(Exception):
+    """Raised when a chunk's new prompt ids cannot be told apart from concurrent inserts."""
+
+
+def _insert_prompts(prompt_rows, user_id):
+    """
+    Insert prompt rows with one ``executemany`` and set their ``id`` keys.
+
+    ``executemany`` cannot return generated ids, so they are read back: the
+    rows of the user with an id above the largest id seen before the insert.
+    Within the chunk's transaction these are the new rows (SQLite allows a
+    single writer, MySQL's repeatable read hides later commits); should a
+    concurrent insert for the same user show up anyway, the chunk fails
+    rather than linking tags to the wrong prompts.
+    """
+    table = Prompt.__table__
+    before = db.session.execute(select(func.max(table.c.id))).scalar() or 0
+    db.session.execute(table.insert(), prompt_rows)
+    ids = db.session.execute(select(table.c.id).where(
+        table.c.user_id == user_id, table.c.id > before).order_by(table.c.id)).scalars().all()
+    if len(ids) != len(prompt_rows):
+        raise ImportConflict(f'expected {len(prompt_rows)} new prompts, found {len(ids)}')
+    # 自增 id 按插入顺序递增
+    for row, prompt_id in zip(prompt_rows, ids):
+        row['id'] = prompt_id
+
+
+def _import_chunk(records, user_id):
+    """Write one chunk of validated ``(row, fields)`` records; return the new prompt ids."""
+    tag_names = {}
+    category_names = {}
+    for _, fields in records:
+        for key, name in fields['tags'].items():
+            tag_names.setdefault(key, name)
+        for key, name in fields['categories'].items():
+            category_names.setdefault(key, name)
+
+    tag_ids, new_tags = _resolve_names(Tag, user_id, tag_names)
+    category_ids, new_categories = _resolve_names(Category, user_id, category_names)
+
+    prompt_rows = []
+    bucket_sets = []
+    for _, fields in records:
+        signature, buckets = compute_signature(fields['title'], fields['content'])
+        prompt_rows.append({
+            'title': fields['title'],
+            'content': fields['content'],
+            'description': fields['description'],
+            'user_id': user_id,
+            'minhash': signature,
+        })
+        bucket_sets.append(buckets)
+
+    with get_search_backend().bulk_insert(db.session) as inserted_ids:
+        # 需要自增 id 写入关联表
+        _insert_prompts(prompt_rows, user_id)
+
+        tag_links, category_links, bucket_rows = [], [], []
+        for (_, fields), prompt_row, buckets in zip(records, prompt_rows, bucket_sets):
+            prompt_id = prompt_row['id']
+            tag_links += [{'prompt_id': prompt_id, 'tag_id': tag_ids[key], 'user_id': user_id}
+                          for key in fields['tags']]
+            category_links += [{'prompt_id': prompt_id, 'category_id': category_ids[key],
+                                'user_id': user_id} for key in fields['categories']]
+            bucket_rows += [{'prompt_id': prompt_id, 'bucket': bucket, 'user_id': user_id}
+                            for bucket in buckets]
+        for table, rows in ((prompt_tags, tag_links), (prompt_categories, category_links),
+                            (PromptLSHBucket.__table__, bucket_rows)):
+            if rows:
+                db.session.execute(table.insert(), rows)
+        inserted_ids += [row['id'] for row in prompt_rows]
+        refresh_snapshots(db.session, [row['id'] for row in prompt_rows])
+        add_usage(db.session, Tag, Counter(row['tag_id'] for row in tag_links))
+        add_usage(db.session, Category, Counter(row['category_id'] for row in category_links))
+        record_changes(db.session,
+                       [(user_id, 'tag', item_id, 'insert') for item_id, _ in new_tags]
+                       + [(user_id, 'category', item_id, 'insert')
+                          for item_id, _ in new_categories]
+                       + [(user_id, 'prompt', row['id'], 'insert') for row in prompt_rows])
+    db.session.commit()
+
+    prompt_ids = [row['id'] for row in prompt_rows]
+    _notify_committed(user_id, prompt_ids, new_tags, new_categories)
+    return prompt_ids
+
+
+def _notify_committed(user_id, prompt_ids, new_tags, new_categories):
+    """Update the in-process indexes that normally follow session events."""
+    cache = get_search_cache()
+    if cache is not None:
+        cache.bump([user_id])
+    backend = get_search_backend()
+    if backend.tracks_changes:
+        backend.notify_changed(prompt_ids)
+    suggest_index = get_suggest_index()
+    if suggest_index is not None:
+        suggest_index.apply(
+            [('insert', 'tags', user_id, item_id, name) for item_id, name in new_tags]
+            + [('insert', 'categories', user_id, item_id, name)
+               for item_id, name in new_categories])
+
+
+def import_prompts(records, user_id, chunk_size=None):
+    """
+    Import prompts for a user.
+
+    Args:
+        records: Iterable of ``(row, record, error)`` tuples from
+            ``parse_json_records`` or ``parse_ndjson_records``
+        user_id (int): Owner of the imported prompts, tags and categories
+        chunk_size (int): Records per transaction, defaults to
+            ``IMPORT_CHUNK_SIZE``
+
+    Returns:
+        dict: ``imported`` and ``failed`` counts, and ``errors`` as a list of
+        ``{'row': n, 'message': ...}``
+    """
+    chunk_size = chunk_size or current_app.config.get('IMPORT_CHUNK_SIZE', 1000)
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+
+    def fail(row, message):
+        report['failed'] += 1
+        report['errors'].append({'row': row, 'message': message})
+
+    def flush(chunk):
+        try:
+            report['imported'] += len(_import_chunk(chunk, user_id))
+        except (SQLAlchemyError, ImportConflict) as e:
+            db.session.rollback()
+            current_app.logger.exception('Bulk import chunk failed')
+            for row, _ in chunk:
+                fail(row, f'Database error: {e.__class__.__name__}')
+
+    chunk = []
+    for row, record, error in records:
+        if error is None:
+            try:
+                chunk.append((row, validate_record(record)))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            fail(row, error)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return report
+
+
+prompts_cli = AppGroup('prompts', help='Prompt data commands.')
+
+
+@prompts_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'email', required=True, help='Email of the user who will own the prompts.')
+@click.option('--format', 'file_format', type=click.Choice(['json', 'ndjson']), default=None,
+              help='Input format (default: from the file extension).')
+@click.option('--chunk-size', type=int, default=None, help='Records per transaction.')
+@with_appcontext
+def import_command(path, email, file_format, chunk_size):
+    """Import prompts from a JSON or NDJSON file."""
+    user = User.query.filter_by(email=email.lower()).first()
+    if user is None:
+        raise click.ClickException(f'No user with email {email}')
+    if file_format is None:
+        file_format = 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'json'
+
+    started_at = time.monotonic()
+    with open(path, encoding='utf-8') as f:
+        if file_format == 'ndjson':
+            report = import_prompts(parse_ndjson_records(f), user.id, chunk_size)
+        else:
+            try:
+                records = parse_json_records(f.read())
+            except ValueError as e:
+                raise click.ClickException(str(e))
+            report = import_prompts(records, user.id, chunk_size)
+    elapsed = time.monotonic() - started_at
+
+    for error in report['errors'][:20]:
+        click.echo(f"Row {error['row']}: {error['message']}", err=True)
+    if len(report['errors']) > 20:
+        click.echo(f"... and {len(report['errors']) - 20} more errors", err=True)
+    click.echo(f"Imported {report['imported']} prompts, {report['failed']} failed "
+               f"({elapsed:.1f}s).")
+
+
+def setup_bulk_import(app):
+    """
+    Register the import CLI commands.
+
+    Args:
+        app: Flask application instance
+    """
+    app.cli.add_command(prompts_cli)
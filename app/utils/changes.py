@@ -0,0 +1,244 @@
+"""
+Change feed for incremental client-side sync.
+
+Every insert, update and delete of a prompt, tag or category is appended to
+the ``change_log`` table in the same transaction as the change itself. The
+auto-increment id of a log row is the sync cursor, so a client that
+remembers the last cursor it saw reads only what changed since then:
+
+    GET /api/prompts/changes?since=<cursor>
+
+- Changes are written by a flush hook for ORM writes, and explicitly by the
+  bulk import, which bypasses the session events.
+- A prompt also counts as updated when a tag or category it uses is renamed
+  or deleted, since its representation embeds their names.
+- Only fields visible to clients count: recomputing related prompts or
+  MinHash signatures does not produce changes.
+- ``flask changes prune`` deletes entries older than
+  ``CHANGE_LOG_RETENTION_DAYS``; cursors that point before the oldest
+  remaining entry are rejected and the client must sync from scratch.
+"""
+
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import event, func, inspect, literal, select
+
+from app.extensions import db
+from app.models import ChangeLog, Category, Prompt, Tag, prompt_categories, prompt_tags
+from app.utils.serializer import get_serializer
+
+ENTITIES = {'prompt': Prompt, 'tag': Tag, 'category': Category}
+# 并发写入的数据库中较小的 id 可能较晚提交；读取日志的进程会复查最近这么多个 id
+CHANGE_LOG_WINDOW = 1000
+# 客户端可见的属性；只修改 related_stale、minhash 等内部列不算变更
+_TRACKED = {
+    'prompt': ('title', 'content', 'description', 'tags', 'categories'),
+    'tag': ('name',),
+    'category': ('name', 'description'),
+}
+# 与 TagSchema / CategorySchema 的字段一致
+_STATE_FIELDS = {'tag': ('id', 'name'), 'category': ('id', 'name', 'description')}
+_LINKS = {
+    'tag': (prompt_tags, prompt_tags.c.tag_id),
+    'category': (prompt_categories, prompt_categories.c.category_id),
+}
+
+
+class CursorExpired(Exception):
+    """Raised when the entries after a cursor have already been pruned."""
+
+
+def _entity_of(obj):
+    for name, model in ENTITIES.items():
+        if isinstance(obj, model):
+            return name
+    return None
+
+
+def record_changes(session, changes):
+    """
+    Append changes to the log within the session's transaction.
+
+    Args:
+        session: SQLAlchemy session
+        changes: ``(user_id, entity, entity_id, op)`` tuples
+    """
+    now = datetime.utcnow()
+    rows = [{'user_id': int(user_id), 'entity': entity, 'entity_id': entity_id, 'op': op,
+             'changed_at': now} for user_id, entity, entity_id, op in changes]
+    if rows:
+        session.execute(ChangeLog.__table__.insert(), rows)
+
+
+def _record_linked(session, entity, item_id):
+    # 用 INSERT ... SELECT 记录使用该标签/分类的所有提示，不加载它们
+    link_table, link_column = _LINKS[entity]
+    prompts = Prompt.__table__
+    session.execute(ChangeLog.__table__.insert().from_select(
+        ['user_id', 'entity', 'entity_id', 'op', 'changed_at'],
+        select(prompts.c.user_id, literal('prompt'), prompts.c.id, literal('update'),
+               literal(datetime.utcnow())).where(prompts.c.id.in_(
+                   select(link_table.c.prompt_id).where(link_column == item_id)))
+    ))
+
+
+def _is_changed(obj, entity):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in _TRACKED[entity])
+
+
+def _before_flush(session, flush_context, instances):
+    # 删除标签/分类时关联行会在 flush 中删除，需要提前记录受影响的提示
+    for obj in session.dirty:
+        entity = _entity_of(obj)
+        if entity in _LINKS and obj.id is not None and _is_changed(obj, entity):
+            _record_linked(session, entity, obj.id)
+    for obj in session.deleted:
+        entity = _entity_of(obj)
+        if entity in _LINKS:
+            _record_linked(session, entity, obj.id)
+
+
+def _after_flush(session, flush_context):
+    changes = []
+    for obj in session.new:
+        entity = _entity_of(obj)
+        if entity and obj.id is not None:
+            changes.append((obj.user_id, entity, obj.id, 'insert'))
+    for obj in session.dirty:
+        entity = _entity_of(obj)
+        if entity and obj not in session.deleted and _is_changed(obj, entity):
+            changes.append((obj.user_id, entity, obj.id, 'update'))
+    for obj in session.deleted:
+        entity = _entity_of(obj)
+        if entity:
+            changes.append((obj.user_id, entity, obj.id, 'delete'))
+    record_changes(session, changes)
+
+
+def head_cursor():
+    """Return the cursor of the latest change (0 when the log is empty)."""
+    return db.session.query(func.max(ChangeLog.id)).scalar() or 0
+
+
+def read_changes(user_id, since, limit):
+    """
+    Read one page of a user's changes after a cursor.
+
+    Entries of the same prompt, tag or category within the page are merged
+    into the latest one.
+
+    Args:
+        user_id (int): Owner of the changes
+        since (int): Cursor returned by a previous call
+        limit (int): Maximum number of log entries read
+
+    Returns:
+        tuple: ``(entries, cursor, has_more)``; entries are
+        ``(seq, entity, entity_id, op, changed_at)`` tuples in log order
+
+    Raises:
+        CursorExpired: If entries after ``since`` have been pruned
+    """
+    oldest = db.session.query(func.min(ChangeLog.id)).scalar()
+    if oldest is not None and since < oldest - 1:
+        raise CursorExpired()
+
+    query = select(ChangeLog.id, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.op,
+                   ChangeLog.changed_at).where(ChangeLog.user_id == user_id,
+                                               ChangeLog.id > since)
+    # 并发写入的数据库中较小的 id 可能较晚提交，只返回已经稳定的变更
+    settle = current_app.config.get('CHANGE_FEED_SETTLE_SECONDS', 0)
+    if settle:
+        query = query.where(
+            ChangeLog.changed_at <= datetime.utcnow() - timedelta(seconds=settle))
+    rows = db.session.execute(query.order_by(ChangeLog.id).limit(limit + 1)).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = rows[-1].id if rows else since
+    latest = {}
+    for seq, entity, entity_id, op, changed_at in rows:
+        previous = latest.pop((entity, entity_id), None)
+        # 同一页内先插入后更新，对客户端来说仍是插入
+        if previous is not None and previous[3] == 'insert' and op == 'update':
+            op = 'insert'
+        latest[(entity, entity_id)] = (seq, entity, entity_id, op, changed_at)
+    # 字典按最后一次写入的顺序排列，即按 seq 排序
+    return list(latest.values()), cursor, has_more
+
+
+def current_state(entries, fields=None):
+    """
+    Load the current state of the prompts, tags and categories that were
+    inserted or updated in a page of changes.
+
+    Args:
+        entries: Entries returned by ``read_changes``
+        fields (tuple): Sparse fieldset for the prompts
+
+    Returns:
+        dict: ``prompts``, ``tags`` and ``categories`` lists; items deleted
+        since are left out (their delete entry follows in a later page)
+    """
+    ids = {entity: [] for entity in ENTITIES}
+    for _, entity, entity_id, op, _ in entries:
+        if op != 'delete':
+            ids[entity].append(entity_id)
+    prompts, _ = get_serializer(fields).dump_ids(ids['prompt'])
+    state = {'prompts': prompts}
+    for entity, key in (('tag', 'tags'), ('category', 'categories')):
+        model, names = ENTITIES[entity], _STATE_FIELDS[entity]
+        rows = db.session.execute(select(*(getattr(model, name) for name in names)).where(
+            model.id.in_(ids[entity])).order_by(model.id)) if ids[entity] else []
+        state[key] = [dict(zip(names, row)) for row in rows]
+    return state
+
+
+def prune_changes(older_than):
+    """
+    Delete log entries recorded before a point in time.
+
+    The newest entry is always kept so that ids are never reused and
+    expired cursors can still be detected.
+
+    Returns:
+        int: Number of deleted entries
+    """
+    newest = head_cursor()
+    result = db.session.execute(ChangeLog.__table__.delete().where(
+        ChangeLog.changed_at < older_than, ChangeLog.id < newest))
+    db.session.commit()
+    return result.rowcount
+
+
+changes_cli = AppGroup('changes', help='Change feed commands.')
+
+
+@changes_cli.command('prune')
+@click.option('--days', type=int, default=None,
+              help='Keep this many days (default: CHANGE_LOG_RETENTION_DAYS).')
+@with_appcontext
+def prune_command(days):
+    """Delete old change log entries."""
+    if days is None:
+        days = current_app.config.get('CHANGE_LOG_RETENTION_DAYS', 90)
+    deleted = prune_changes(datetime.utcnow() - timedelta(days=days))
+    click.echo(f'Deleted {deleted} change log entries older than {days} days.')
+
+
+def setup_changes(app, db):
+    """
+    Record prompt, tag and category changes and register the CLI commands.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+    """
+    app.cli.add_command(changes_cli)
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
+        event.listen(db.session, 'after_flush', _after_flush)
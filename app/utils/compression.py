@@ -0,0 +1,158 @@
+"""
+HTTP response compression for the PromptVault application.
+
+The app is served by gunicorn without a proxy in front, so responses are
+compressed here. Encodings are negotiated from ``Accept-Encoding`` (q-values
+respected, ``COMPRESS_ALGORITHMS`` gives the server's preference): ``zstd``
+when the optional ``zstandard`` package is installed, otherwise ``gzip``.
+
+- Only text-like types (``COMPRESS_MIMETYPES``) of successful responses are
+  compressed, and only from ``COMPRESS_MIN_SIZE`` bytes on.
+- Streamed responses (such as the export) are compressed chunk by chunk as
+  they are sent; they have no ``Content-Length`` and are sent chunked.
+- Compressed responses get ``Vary: Accept-Encoding``, and their ETag a
+  ``-gzip`` / ``-zstd`` suffix so each encoding has its own strong
+  validator. The suffix is removed from ``If-None-Match`` before the view
+  runs, so conditional requests keep working.
+"""
+
+import re
+import zlib
+
+from flask import current_app, g, request
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+_ETAG_SUFFIX = re.compile(r'-(gzip|zstd)"')
+
+
+def _gzip_compressor(app):
+    # wbits=31 生成 gzip 格式
+    return zlib.compressobj(app.config.get('COMPRESS_LEVEL', 6), zlib.DEFLATED, 31)
+
+
+def _zstd_compressor(app):
+    return zstandard.ZstdCompressor(
+        level=app.config.get('COMPRESS_ZSTD_LEVEL', 3)).compressobj()
+
+
+COMPRESSORS = {'gzip': _gzip_compressor}
+if zstandard is not None:
+    COMPRESSORS['zstd'] = _zstd_compressor
+
+
+def negotiate_encoding(accept_encodings, algorithms):
+    """
+    Pick the content encoding for a request.
+
+    Args:
+        accept_encodings: The request's parsed ``Accept-Encoding``
+        algorithms (list): Encodings in server preference order
+
+    Returns:
+        str: The encoding to use, or None to send the response as is
+    """
+    available = [name for name in algorithms if name in COMPRESSORS]
+    # 客户端权重最高者优先，同权重时按服务器的顺序
+    best, best_quality = None, 0
+    for name in available:
+        quality = accept_encodings[name]
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def _compress_stream(original, chunks, compressor):
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        close = getattr(original, 'close', None)
+        if close is not None:
+            close()
+
+
+def split_etag_encoding(header):
+    """
+    Remove the encoding suffix from an ``If-None-Match`` header.
+
+    Returns:
+        tuple: ``(header without suffixes, encoding)``; the encoding is None
+        when the header has no suffix
+    """
+    match = _ETAG_SUFFIX.search(header) if header else None
+    if match is None:
+        return header, None
+    return _ETAG_SUFFIX.sub('"', header), match.group(1)
+
+
+def _strip_etag_suffix():
+    # 客户端缓存的是压缩后的表示，比较前去掉编码后缀
+    header, encoding = split_etag_encoding(request.environ.get('HTTP_IF_NONE_MATCH'))
+    if encoding is not None:
+        g.etag_encoding = encoding
+        request.environ['HTTP_IF_NONE_MATCH'] = header
+
+
+def _set_etag_suffix(response, encoding):
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag(f'{etag}-{encoding}', weak)
+
+
+def _compress_response(response):
+    app = current_app
+    if response.status_code == 304:
+        # 304 沿用客户端缓存的那个表示的 ETag
+        encoding = g.pop('etag_encoding', None)
+        if encoding is not None:
+            _set_etag_suffix(response, encoding)
+            response.vary.add('Accept-Encoding')
+        return response
+    if response.mimetype not in app.config.get('COMPRESS_MIMETYPES', ()):
+        return response
+    response.vary.add('Accept-Encoding')
+    if (not 200 <= response.status_code < 300 or response.status_code in (204, 206)
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.cache_control.no_transform):
+        return response
+
+    encoding = negotiate_encoding(request.accept_encodings,
+                                  app.config.get('COMPRESS_ALGORITHMS', ['zstd', 'gzip']))
+    if encoding is None:
+        return response
+
+    compressor = COMPRESSORS[encoding](app)
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, response.iter_encoded(),
+                                             compressor)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < app.config.get('COMPRESS_MIN_SIZE', 500):
+            return response
+        response.set_data(compressor.compress(data) + compressor.flush())
+    response.headers['Content-Encoding'] = encoding
+    _set_etag_suffix(response, encoding)
+    return response
+
+
+def setup_compression(app):
+    """
+    Compress responses according to the client's ``Accept-Encoding``.
+
+    Args:
+        app: Flask application instance
+    """
+    if not app.config.get('COMPRESS_ALGORITHMS', ['zstd', 'gzip']):
+        return
+    if 'zstd' in app.config.get('COMPRESS_ALGORITHMS', ()) and zstandard is None:
+        app.logger.info('zstandard is not installed, compressing with gzip only')
+    app.before_request(_strip_etag_suffix)
+    app.after_request(_compress_response)
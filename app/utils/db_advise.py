@@ -0,0 +1,237 @@
+"""
+Index advisor for the application's hot queries.
+
+``flask db-advise`` builds the queries that the busiest pages and jobs run,
+with parameters sampled from the current database, and prints the plan the
+database chooses for each (``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN`` on
+MySQL and PostgreSQL). Plans that read a whole table or sort rows without an
+index are flagged::
+
+    flask db-advise --time 20
+
+``--time`` also runs each query and reports its mean duration, for
+comparing plans before and after a migration (``flask db downgrade`` /
+``flask db upgrade``). Problems that no index can avoid (an aggregate over
+the whole table, sorting the prompts of a tag) are listed with the query and
+reported as expected. The queries are built with the same helpers as the
+views, so the catalogue follows changes to them.
+"""
+
+import re
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+
+from app.extensions import db
+from app.models import (ChangeLog, Category, Prompt, PromptLSHBucket, PromptRelated, Tag, User,
+                        prompt_categories, prompt_tags)
+from app.utils.pagination import encode_cursor, keyset_query
+from app.utils.prompt_filter import PromptFilter
+from app.utils.serializer import get_serializer
+
+# SQLite：不带 USING INDEX 的 SCAN 是全表扫描；旧版本输出 SCAN TABLE
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(?!CONSTANT ROW)(\w+)(?! USING)(?:$| )')
+_SQLITE_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+class HotQuery:
+    """
+    A query from the catalogue.
+
+    Args:
+        name (str): Short name, ``<area>.<query>``
+        build: ``build(samples)`` returns the statement to explain
+        expected: Problems accepted for this query, e.g.
+            ``('full scan of prompts',)``
+    """
+
+    def __init__(self, name, build, expected=()):
+        self.name = name
+        self.build = build
+        self.expected = tuple(expected)
+
+
+def _page(*criteria, cursor=None):
+    statement = select(*get_serializer().columns).where(*criteria)
+    return keyset_query(statement, cursor, 20)[1]
+
+
+# 按标签/分类筛选时从关联表取出提示再排序，列表索引无法覆盖跨表的条件
+_LINK_SORT = ('sort without index',)
+
+HOT_QUERIES = [
+    HotQuery('prompts.list', lambda s: _page()),
+    HotQuery('prompts.list.next_page', lambda s: _page(cursor=s['cursor'])),
+    HotQuery('prompts.list.tag', lambda s: _page(
+        *PromptFilter(tag_ids=[s['tag_id']]).criteria()), expected=_LINK_SORT),
+    HotQuery('prompts.list.category', lambda s: _page(
+        *PromptFilter(category_ids=[s['category_id']]).criteria()), expected=_LINK_SORT),
+    HotQuery('prompts.list.user', lambda s: _page(
+        *PromptFilter(user_id=s['small_user_id']).criteria())),
+    HotQuery('prompts.validators', lambda s: select(
+        func.count(Prompt.id), func.max(Prompt.updated_at)),
+        expected=('full scan of prompts',)),
+    HotQuery('prompts.validators.tag', lambda s: select(
+        func.count(Prompt.id), func.max(Prompt.updated_at)).where(
+            *PromptFilter(tag_ids=[s['tag_id']]).criteria())),
+    HotQuery('prompts.detail', lambda s: select(Prompt).where(Prompt.id == s['prompt_id'])),
+    HotQuery('serializer.tags', lambda s: get_serializer().link_statements(
+        s['owners'])['tags']),
+    HotQuery('serializer.categories', lambda s: get_serializer().link_statements(
+        s['owners'])['categories']),
+    HotQuery('suggest.tags', lambda s: select(Tag.id, Tag.name).where(
+        Tag.user_id == s['user_id'])),
+    HotQuery('suggest.categories', lambda s: select(Category.id, Category.name).where(
+        Category.user_id == s['user_id'])),
+    HotQuery('import.resolve_tags', lambda s: select(Tag.name, Tag.id).where(
+        Tag.user_id == s['user_id'], Tag.name.in_(s['tag_names']))),
+    HotQuery('tags.by_usage', lambda s: select(Tag.id, Tag.name, Tag.usage_count).order_by(
+        Tag.usage_count.desc()).limit(50)),
+    HotQuery('tags.unused', lambda s: select(Tag.id).where(Tag.usage_count == 0)),
+    HotQuery('tags.linked_prompts', lambda s: select(prompt_tags.c.prompt_id).where(
+        prompt_tags.c.tag_id == s['tag_id'])),
+    HotQuery('categories.linked_prompts', lambda s: select(
+        prompt_categories.c.prompt_id).where(
+            prompt_categories.c.category_id == s['category_id'])),
+    HotQuery('related.get', lambda s: select(Prompt.id, Prompt.title, PromptRelated.score).join(
+        PromptRelated, PromptRelated.related_id == Prompt.id).where(
+            PromptRelated.prompt_id == s['prompt_id']).order_by(
+                PromptRelated.score.desc(), Prompt.id).limit(10),
+        # 每个提示最多 RELATED_PROMPTS_K 条，排序开销可以忽略
+        expected=('sort without index',)),
+    HotQuery('related.user_corpus', lambda s: select(
+        Prompt.id, Prompt.title, Prompt.description, Prompt.content).where(
+            Prompt.user_id == s['small_user_id'])),
+    HotQuery('related.stale', lambda s: select(Prompt.id).where(
+        Prompt.user_id == s['small_user_id'], Prompt.related_stale.is_(True)).order_by(Prompt.id)),
+    HotQuery('duplicates.candidates', lambda s: select(PromptLSHBucket.prompt_id).where(
+        PromptLSHBucket.user_id == s['user_id'], PromptLSHBucket.bucket.in_([1, 2, 3]))),
+    HotQuery('changes.feed', lambda s: select(ChangeLog.id, ChangeLog.entity).where(
+        ChangeLog.user_id == s['user_id'], ChangeLog.id > 0).order_by(ChangeLog.id).limit(501)),
+    HotQuery('export.chunk', lambda s: select(*get_serializer().columns).where(
+        Prompt.id > 0).order_by(Prompt.id).limit(500)),
+    HotQuery('auth.user_by_email', lambda s: select(User).where(User.email == s['email'])),
+]
+
+
+def sample_parameters():
+    """
+    Pick realistic parameters for the catalogue from the database: the
+    users with the most and the fewest prompts, the most used tag and
+    category, and so on.
+    """
+    session = db.session
+    users = select(Prompt.user_id).group_by(Prompt.user_id).limit(1)
+    user_id = session.execute(users.order_by(func.count().desc())).scalar() or 1
+    # 提示最少的用户：按时间索引分页时要跳过最多的行
+    small_user_id = session.execute(users.order_by(func.count())).scalar() or user_id
+    tag_id = session.execute(select(prompt_tags.c.tag_id).group_by(
+        prompt_tags.c.tag_id).order_by(func.count().desc()).limit(1)).scalar() or 1
+    category_id = session.execute(select(prompt_categories.c.category_id).group_by(
+        prompt_categories.c.category_id).order_by(func.count().desc()).limit(1)).scalar() or 1
+    latest = session.execute(select(Prompt.id, Prompt.created_at, Prompt.user_id).order_by(
+        Prompt.created_at.desc(), Prompt.id.desc()).limit(20)).all()
+    tag_names = [name for (name,) in session.execute(
+        select(Tag.name).where(Tag.user_id == user_id).limit(20))]
+    return {
+        'user_id': user_id,
+        'small_user_id': small_user_id,
+        'tag_id': tag_id,
+        'category_id': category_id,
+        'prompt_id': latest[0].id if latest else 1,
+        'cursor': encode_cursor(latest[-1]) if latest else None,
+        'owners': {row.id: row.user_id for row in latest} or {1: user_id},
+        'tag_names': tag_names or ['example'],
+        'email': session.execute(select(User.email).limit(1)).scalar() or 'user@example.com',
+    }
+
+
+def _compile(statement, dialect):
+    compiled = statement.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+    if compiled.positional:
+        return str(compiled), tuple(compiled.params[name] for name in compiled.positiontup)
+    return str(compiled), compiled.params
+
+
+def explain(statement):
+    """
+    Return the database's plan for a statement.
+
+    Returns:
+        tuple: ``(plan lines, problems)``; problems are short descriptions
+        such as ``full scan of prompts``
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect
+    sql, params = _compile(statement, dialect)
+    if dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, params).all()
+        lines = [row[3] for row in rows]
+        problems = [f'full scan of {match.group(1)}' for match in map(_SQLITE_SCAN.match, lines)
+                    if match]
+        problems += ['sort without index' for line in lines if line.startswith(_SQLITE_SORT)]
+    elif dialect.name == 'mysql':
+        result = connection.exec_driver_sql('EXPLAIN ' + sql, params)
+        rows = [dict(zip(result.keys(), row)) for row in result]
+        lines = [f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} "
+                 f"{row.get('Extra') or ''}".strip() for row in rows]
+        problems = [f"full scan of {row['table']}" for row in rows if row['type'] == 'ALL']
+        problems += ['sort without index' for row in rows
+                     if 'Using filesort' in (row.get('Extra') or '')]
+    else:
+        lines = [row[0] for row in connection.exec_driver_sql('EXPLAIN ' + sql, params)]
+        problems = [f'full scan of {line.split(" on ")[1].split()[0]}' for line in lines
+                    if 'Seq Scan on ' in line]
+    return lines, problems
+
+
+def time_statement(statement, repeat):
+    """Return the mean duration of a statement in milliseconds."""
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        db.session.execute(statement).all()
+    return (time.perf_counter() - started_at) / repeat * 1000
+
+
+@click.command('db-advise')
+@click.option('--time', 'repeat', type=int, default=0,
+              help='Run each query this many times and report its mean duration.')
+@click.option('--verbose', '-v', is_flag=True, help='Print the plan of every query.')
+@click.option('--strict', is_flag=True, help='Exit with status 1 if a query is flagged.')
+@with_appcontext
+def db_advise_command(repeat, verbose, strict):
+    """Explain the hot queries and flag table scans."""
+    samples = sample_parameters()
+    flagged = 0
+    for query in HOT_QUERIES:
+        statement = query.build(samples)
+        lines, problems = explain(statement)
+        unexpected = [problem for problem in problems if problem not in query.expected]
+        if unexpected:
+            status = 'FLAG: ' + ', '.join(unexpected)
+            flagged += 1
+        elif problems:
+            status = 'expected: ' + ', '.join(problems)
+        else:
+            status = 'ok'
+        timing = f' {time_statement(statement, repeat):8.3f} ms' if repeat else ''
+        click.echo(f'{query.name:<28}{timing}  {status}')
+        if verbose or unexpected:
+            for line in lines:
+                click.echo(f'    {line}')
+    click.echo(f'{len(HOT_QUERIES)} queries, {flagged} flagged.')
+    db.session.rollback()
+    if strict and flagged:
+        raise SystemExit(1)
+
+
+def setup_db_advise(app):
+    """
+    Register the index advisor CLI command.
+
+    Args:
+        app: Flask application instance
+    """
+    app.cli.add_command(db_advise_command)
@@ -0,0 +1,229 @@
+"""
+Near-duplicate prompt detection for the PromptVault application.
+
+Every prompt stores a MinHash signature of its title and content, plus one
+``prompt_lsh_buckets`` row per LSH band. Both are maintained on flush
+whenever a prompt's title or content changes. Finding the near-duplicates of
+a prompt is a single indexed lookup of its bucket keys followed by a
+signature comparison with the few candidates found, so it never reads other
+prompts' content.
+"""
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import and_, event, func, inspect
+from sqlalchemy.orm import selectinload
+
+from app.extensions import db
+from app.models import Prompt, PromptLSHBucket
+from app.utils import minhash
+
+
+def signature_text(title, content):
+    """Return the text a prompt's MinHash signature is computed from."""
+    return f'{title or ""}\n{content or ""}'
+
+
+def compute_signature(title, content):
+    """Return ``(packed signature, set of LSH bucket keys)`` for a prompt's text."""
+    sig = minhash.signature(signature_text(title, content))
+    return minhash.to_bytes(sig), set(minhash.band_buckets(sig))
+
+
+def update_signature(prompt):
+    """Recompute a prompt's signature and LSH bucket rows."""
+    prompt.minhash, buckets = compute_signature(prompt.title, prompt.content)
+
+    existing = {row.bucket: row for row in prompt.lsh_buckets}
+    for bucket, row in existing.items():
+        if bucket not in buckets:
+            prompt.lsh_buckets.remove(row)
+    for bucket in buckets - set(existing):
+        prompt.lsh_buckets.append(
+            PromptLSHBucket(bucket=bucket, user_id=prompt.user_id))
+
+
+def find_near_duplicates(prompt, threshold=None, limit=10):
+    """
+    Return prompts of the same user that are near-duplicates of ``prompt``.
+
+    Args:
+        prompt: A Prompt with an up-to-date ``minhash``
+        threshold (float): Minimum estimated similarity, defaults to
+            ``DUPLICATE_THRESHOLD``
+        limit (int): Maximum number of results
+
+    Returns:
+        list: ``(similarity, id, title)`` tuples, most similar first
+    """
+    if threshold is None:
+        threshold = current_app.config.get('DUPLICATE_THRESHOLD', 0.8)
+    if prompt.minhash is None:
+        return []
+    sig = minhash.from_bytes(prompt.minhash)
+
+    candidates = db.session.query(PromptLSHBucket.prompt_id).filter(
+        PromptLSHBucket.user_id == prompt.user_id,
+        PromptLSHBucket.bucket.in_(minhash.band_buckets(sig)),
+        PromptLSHBucket.prompt_id != prompt.id
+    ).distinct()
+
+    matches = []
+    rows = db.session.query(Prompt.id, Prompt.title, Prompt.minhash).filter(
+        Prompt.id.in_(candidates))
+    for prompt_id, title, other in rows:
+        if other is None:
+            continue
+        score = minhash.similarity(sig, minhash.from_bytes(other))
+        if score >= threshold:
+            matches.append((score, prompt_id, title))
+    matches.sort(key=lambda m: (-m[0], m[1]))
+    return matches[:limit]
+
+
+def find_duplicate_clusters(threshold=None, user_id=None):
+    """
+    Group near-duplicate prompts into clusters.
+
+    Only prompts that share an LSH bucket with another prompt are compared.
+
+    Args:
+        threshold (float): Minimum estimated similarity for a pair
+        user_id (int): Restrict the report to one user's prompts
+
+    Returns:
+        list: Clusters as dicts with ``prompts`` (``(id, title)`` pairs, by
+        id) and ``similarity`` (lowest similarity among linked pairs),
+        largest clusters first
+    """
+    if threshold is None:
+        threshold = current_app.config.get('DUPLICATE_THRESHOLD', 0.8)
+
+    shared = db.session.query(
+        PromptLSHBucket.user_id, PromptLSHBucket.bucket
+    ).group_by(PromptLSHBucket.user_id, PromptLSHBucket.bucket).having(
+        func.count() > 1)
+    if user_id is not None:
+        shared = shared.filter(PromptLSHBucket.user_id == user_id)
+    shared = shared.subquery()
+
+    rows = db.session.query(PromptLSHBucket.bucket, PromptLSHBucket.prompt_id).join(
+        shared, and_(PromptLSHBucket.user_id == shared.c.user_id,
+                     PromptLSHBucket.bucket == shared.c.bucket)
+    ).order_by(PromptLSHBucket.bucket)
+
+    groups = {}
+    for bucket, prompt_id in rows:
+        groups.setdefault(bucket, []).append(prompt_id)
+
+    prompt_ids = sorted({pid for ids in groups.values() for pid in ids})
+    signatures = {}
+    titles = {}
+    for start in range(0, len(prompt_ids), 500):
+        chunk = prompt_ids[start:start + 500]
+        for prompt_id, title, sig in db.session.query(
+                Prompt.id, Prompt.title, Prompt.minhash).filter(Prompt.id.in_(chunk)):
+            titles[prompt_id] = title
+            if sig is not None:
+                signatures[prompt_id] = minhash.from_bytes(sig)
+
+    # 并查集合并相似的提示对
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    checked = {}
+    for ids in groups.values():
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                pair = (min(a, b), max(a, b))
+                if pair in checked or a not in signatures or b not in signatures:
+                    continue
+                checked[pair] = minhash.similarity(signatures[a], signatures[b])
+                if checked[pair] >= threshold:
+                    parent[find(a)] = find(b)
+
+    clusters = {}
+    for (a, b), score in checked.items():
+        if score < threshold:
+            continue
+        root = find(a)
+        cluster = clusters.setdefault(root, {'ids': set(), 'similarity': 1.0})
+        cluster['ids'].update((a, b))
+        cluster['similarity'] = min(cluster['similarity'], score)
+
+    result = [
+        {
+            'prompts': [(pid, titles.get(pid)) for pid in sorted(cluster['ids'])],
+            'similarity': cluster['similarity'],
+        }
+        for cluster in clusters.values()
+    ]
+    result.sort(key=lambda c: (-len(c['prompts']), -c['similarity']))
+    return result
+
+
+def _before_flush(session, flush_context, instances):
+    # 新建的提示，或标题/内容变化的提示，重新计算签名
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Prompt) or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        if (obj in session.new or state.attrs.title.history.has_changes()
+                or state.attrs.content.history.has_changes()):
+            update_signature(obj)
+
+
+duplicates_cli = AppGroup('duplicates', help='Near-duplicate detection commands.')
+
+
+@duplicates_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Compute MinHash signatures and LSH buckets for all prompts."""
+    count = 0
+    last_id = 0
+    while True:
+        prompts = Prompt.query.options(selectinload(Prompt.lsh_buckets)).filter(
+            Prompt.id > last_id).order_by(Prompt.id).limit(500).all()
+        if not prompts:
+            break
+        for prompt in prompts:
+            update_signature(prompt)
+        db.session.commit()
+        count += len(prompts)
+        last_id = prompts[-1].id
+    click.echo(f'Updated signatures for {count} prompts.')
+
+
+@duplicates_cli.command('report')
+@click.option('--threshold', type=float, default=None, help='Minimum similarity.')
+@with_appcontext
+def report_command(threshold):
+    """Print clusters of near-duplicate prompts."""
+    clusters = find_duplicate_clusters(threshold)
+    for cluster in clusters:
+        click.echo(f"{len(cluster['prompts'])} prompts, similarity >= "
+                   f"{cluster['similarity']:.2f}")
+        for prompt_id, title in cluster['prompts']:
+            click.echo(f'  #{prompt_id} {title}')
+    click.echo(f'{len(clusters)} clusters found.')
+
+
+def setup_duplicates(app, db):
+    """
+    Maintain prompt signatures on flush and register the CLI commands.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+    """
+    app.cli.add_command(duplicates_cli)
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
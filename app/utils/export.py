@@ -0,0 +1,119 @@
+"""
+Streaming export of prompts as NDJSON or CSV.
+
+Prompts are read in id order, one chunk at a time, with plain column
+queries: each chunk is one keyset query (``id > last id``) for the prompts
+plus one query each for their tags and categories. No ORM objects are
+created, so memory use stays flat however large the vault is. Because the
+order is by id, an interrupted download can be resumed by passing the last
+id received as ``after``. With a sparse fieldset only the requested columns
+are selected, and tags or categories are not queried unless requested.
+"""
+
+import csv
+import io
+import json
+
+from flask import current_app
+
+from app.extensions import db
+from app.models import Category, Prompt, Tag, prompt_categories, prompt_tags
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CSV_COLUMNS = ['id', 'title', 'content', 'description', 'created_at', 'updated_at',
+               'categories', 'tags']
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _links(link_table, link_column, model, fields, prompt_ids):
+    """Return ``{prompt_id: [dict, ...]}`` for the tags or categories of a chunk."""
+    columns = [getattr(model, field) for field in fields]
+    rows = db.session.query(link_table.c.prompt_id, *columns).join(
+        model, model.id == link_column
+    ).filter(link_table.c.prompt_id.in_(prompt_ids)).order_by(
+        link_table.c.prompt_id, model.id)
+    result = {}
+    for prompt_id, *values in rows:
+        result.setdefault(prompt_id, []).append(dict(zip(fields, values)))
+    return result
+
+
+def iter_prompts(prompt_filter=None, after=0, chunk_size=None, fields=None):
+    """
+    Yield prompts as dictionaries in id order, chunk by chunk.
+
+    Args:
+        prompt_filter (PromptFilter): Owner, tag and category filters
+        after (int): Only export prompts with a larger id (to resume)
+        chunk_size (int): Prompts read per query, defaults to
+            ``EXPORT_CHUNK_SIZE``
+        fields (tuple): Sparse fieldset (see ``app.utils.fieldsets``), None
+            for all fields
+
+    Yields:
+        dict: The same fields as the prompt API
+    """
+    chunk_size = chunk_size or current_app.config.get('EXPORT_CHUNK_SIZE', 500)
+    fields = fields or CSV_COLUMNS
+    columns = [name for name in fields if name not in ('categories', 'tags')]
+    base_query = db.session.query(*(getattr(Prompt, name) for name in columns))
+    if prompt_filter is not None:
+        base_query = prompt_filter.apply(base_query)
+
+    last_id = after or 0
+    while True:
+        rows = base_query.filter(Prompt.id > last_id).order_by(Prompt.id).limit(
+            chunk_size).all()
+        if not rows:
+            return
+        prompt_ids = [row.id for row in rows]
+        links = {}
+        if 'categories' in fields:
+            links['categories'] = _links(prompt_categories, prompt_categories.c.category_id,
+                                         Category, ('id', 'name', 'description'), prompt_ids)
+        if 'tags' in fields:
+            links['tags'] = _links(prompt_tags, prompt_tags.c.tag_id, Tag, ('id', 'name'),
+                                   prompt_ids)
+        for row in rows:
+            prompt = {}
+            for name in fields:
+                if name in links:
+                    prompt[name] = links[name].get(row.id, [])
+                elif name in ('created_at', 'updated_at'):
+                    prompt[name] = _isoformat(getattr(row, name))
+                else:
+                    prompt[name] = getattr(row, name)
+            yield prompt
+        last_id = prompt_ids[-1]
+
+
+def ndjson_lines(prompts):
+    """Serialize prompts as newline-delimited JSON."""
+    for prompt in prompts:
+        yield json.dumps(prompt, ensure_ascii=False) + '\n'
+
+
+def csv_lines(prompts, fields=None):
+    """Serialize prompts as CSV; tag and category names are joined with ``;``."""
+    columns = fields or CSV_COLUMNS
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for prompt in prompts:
+        row = dict(prompt)
+        for name in ('categories', 'tags'):
+            if name in row:
+                row[name] = ';'.join(item['name'] for item in row[name])
+        writer.writerow([row[column] for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
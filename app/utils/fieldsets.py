@@ -0,0 +1,85 @@
+"""
+Sparse fieldsets for the prompt API.
+
+``?fields=id,title,tags`` limits the fields serialized for each prompt.
+The selection is also turned into loader options: columns that are not
+requested (notably ``content``) are left out of the SELECT with
+``load_only``, and the ``tags`` / ``categories`` relationships are only
+loaded when requested, so a picker listing ids and titles never reads or
+ships prompt bodies.
+"""
+
+from sqlalchemy.orm import load_only, raiseload, selectinload
+
+from app.models import Prompt
+
+# 与 PromptSchema 的字段一致，按此顺序输出
+PROMPT_FIELDS = ('id', 'title', 'content', 'description', 'created_at', 'updated_at',
+                 'categories', 'tags')
+RELATIONSHIPS = ('categories', 'tags')
+# 游标分页和加载标签/分类时总要用到的列
+_REQUIRED_COLUMNS = ('id', 'created_at', 'user_id')
+
+
+class InvalidFieldset(ValueError):
+    """Raised when a fieldset names an unknown field."""
+
+
+def parse_fieldset(args, param='fields'):
+    """
+    Read the requested prompt fields from request arguments.
+
+    ``fields[prompts]`` is accepted on every endpoint; ``param`` names the
+    short form (None where ``fields`` already means something else).
+
+    Returns:
+        tuple: The requested fields (always including ``id``) in schema
+        order, or None for all fields
+
+    Raises:
+        InvalidFieldset: If an unknown field is requested
+    """
+    value = args.get('fields[prompts]')
+    if value is None and param:
+        value = args.get(param)
+    requested = {name.strip() for name in (value or '').split(',') if name.strip()}
+    if not requested:
+        return None
+    unknown = requested - set(PROMPT_FIELDS)
+    if unknown:
+        raise InvalidFieldset(f'Unknown fields: {", ".join(sorted(unknown))}')
+    requested.add('id')
+    return tuple(name for name in PROMPT_FIELDS if name in requested)
+
+
+def relationship_options(names=RELATIONSHIPS):
+    """
+    Return query options that batch-load relationships of prompts.
+
+    ``Prompt.tags`` and ``Prompt.categories`` load lazily, one query per
+    prompt; code that reads them for a list of prompts uses these options
+    to load them with one ``selectinload`` query each instead.
+    """
+    return [selectinload(getattr(Prompt, name)) for name in names]
+
+
+def load_options(fields):
+    """
+    Return query options that load only what a fieldset needs.
+
+    Args:
+        fields (tuple): Result of ``parse_fieldset``; None loads everything
+
+    Returns:
+        list: Options for ``Query.options``
+    """
+    if fields is None:
+        return relationship_options()
+    columns = [name for name in fields if name not in RELATIONSHIPS]
+    columns += [name for name in _REQUIRED_COLUMNS if name not in columns]
+    options = [load_only(*(getattr(Prompt, name) for name in columns))]
+    options += relationship_options([name for name in RELATIONSHIPS if name in fields])
+    # 未请求的关联不应被访问，访问时报错而不是悄悄多发查询
+    options += [raiseload(getattr(Prompt, name)) for name in RELATIONSHIPS
+                if name not in fields]
+    return options
@@ -0,0 +1,148 @@
+"""
+HTTP validators (ETag / Last-Modified) for prompt pages and API responses.
+
+Validators are computed from a few indexed columns before any prompt is
+loaded, so a conditional request that matches is answered with ``304 Not
+Modified`` without loading, serializing or rendering anything:
+
+- a single prompt is validated by its ``updated_at``
+- a listing is validated by the head of the change log (see
+  ``app.utils.changes``), which every insert, update or delete of a prompt,
+  tag or category moves, read from the primary key index without touching
+  the prompts. Any write changes the validator of every listing, not only
+  of the listings it appears in. Listings carry only an ETag: a
+  Last-Modified date would not move on deletes
+
+For this to hold, ``updated_at`` must change whenever the prompt's
+representation does. Column updates already bump it; a flush hook also
+bumps it when a prompt's tags or categories change, and when a tag or
+category it uses is renamed or deleted.
+"""
+
+from datetime import datetime
+from hashlib import blake2b
+
+from flask import current_app, request
+from sqlalchemy import event, func, inspect, select, update
+from werkzeug.http import is_resource_modified
+
+from app.extensions import db
+from app.models import Category, ChangeLog, Prompt, Tag, prompt_categories, prompt_tags
+from app.utils.changes import CHANGE_LOG_WINDOW
+
+
+def make_etag(*parts):
+    """Return an opaque ETag value for the given fingerprint parts."""
+    return blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+class Validators:
+    """
+    The ETag and Last-Modified of a response.
+
+    Args:
+        etag (str): Strong entity tag (unquoted)
+        last_modified (datetime): Naive UTC time, or None
+    """
+
+    def __init__(self, etag, last_modified=None):
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def is_fresh(self):
+        """Return True if the client's cached copy is still valid."""
+        return not is_resource_modified(
+            request.environ, etag=self.etag, last_modified=self.last_modified)
+
+    def apply(self, response):
+        """Set the validators on a response; caches must revalidate before reuse."""
+        response.set_etag(self.etag)
+        if self.last_modified is not None:
+            response.last_modified = self.last_modified
+        response.cache_control.no_cache = True
+        return response
+
+    def not_modified(self):
+        """Return an empty ``304 Not Modified`` response carrying the validators."""
+        return self.apply(current_app.response_class(status=304))
+
+
+def prompt_validators(prompt_id, *extra):
+    """
+    Return the validators of a single prompt, or None if it does not exist.
+
+    Args:
+        prompt_id (int): Prompt id
+        extra: Other values the representation depends on (e.g. the related
+            prompts shown on its page)
+    """
+    row = db.session.query(Prompt.updated_at).filter(Prompt.id == prompt_id).first()
+    if row is None:
+        return None
+    return Validators(make_etag('prompt', prompt_id, row.updated_at, *extra), row.updated_at)
+
+
+def change_log_fingerprint():
+    """
+    Return a ``select()`` of the change log's head id and the number of
+    entries among the last ``CHANGE_LOG_WINDOW`` ids.
+
+    Both are read from a short range of the primary key. The count catches
+    an entry with a smaller id that commits after a larger one.
+    """
+    log = ChangeLog.__table__
+    head = select(func.max(log.c.id)).scalar_subquery()
+    return select(func.max(log.c.id), func.count()).where(log.c.id > head - CHANGE_LOG_WINDOW)
+
+
+def listing_validators(*extra):
+    """
+    Return the validators of a prompt listing.
+
+    Args:
+        extra: Other values the representation depends on
+    """
+    head, recent = db.session.execute(change_log_fingerprint()).one()
+    return Validators(make_etag('prompts', head, recent, *extra))
+
+
+def _touch_linked(session, link_table, link_column, item_id):
+    prompts = Prompt.__table__
+    session.execute(update(prompts).where(prompts.c.id.in_(
+        select(link_table.c.prompt_id).where(link_column == item_id)
+    )).values(updated_at=datetime.utcnow()))
+
+
+def _before_flush(session, flush_context, instances):
+    # 标签/分类关联变化不会更新 prompts 表，需要手动刷新 updated_at
+    for obj in session.dirty:
+        if isinstance(obj, Prompt) and obj not in session.deleted:
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in ('tags', 'categories')):
+                obj.updated_at = datetime.utcnow()
+        elif isinstance(obj, Tag) and obj.id is not None:
+            if inspect(obj).attrs.name.history.has_changes():
+                _touch_linked(session, prompt_tags, prompt_tags.c.tag_id, obj.id)
+        elif isinstance(obj, Category) and obj.id is not None:
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in ('name', 'description')):
+                _touch_linked(session, prompt_categories, prompt_categories.c.category_id,
+                              obj.id)
+    # 删除标签/分类前关联行仍然存在
+    for obj in session.deleted:
+        if isinstance(obj, Tag):
+            _touch_linked(session, prompt_tags, prompt_tags.c.tag_id, obj.id)
+        elif isinstance(obj, Category):
+            _touch_linked(session, prompt_categories, prompt_categories.c.category_id, obj.id)
+
+
+def setup_http_cache(app, db):
+    """
+    Keep ``Prompt.updated_at`` in step with tag and category changes.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+    """
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
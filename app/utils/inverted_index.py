@@ -0,0 +1,265 @@
+"""
+In-process inverted index used by the ``memory`` search backend.
+
+Posting lists store sorted prompt ids as varint-encoded deltas in a
+``bytearray``, so a term that appears in 100k prompts with dense ids costs
+roughly 100KB instead of the several MB a Python ``set`` of ints would take.
+Index updates are incremental: appending a new (larger) id is O(1), other
+changes re-encode only the posting lists of the affected terms.
+
+Query terms match any indexed word they are a substring of ("gpt" matches
+"chatgpt"). Matching words are found through a trigram index over the
+vocabulary, so lookups scale with the number of matching words rather than
+with the corpus size.
+"""
+
+import re
+import threading
+from bisect import bisect_left
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens."""
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+def trigrams(token):
+    """Return the set of character trigrams of a token."""
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def _encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+class PostingList:
+    """A sorted list of document ids stored as varint-encoded deltas."""
+
+    __slots__ = ('_data', '_last', '_count')
+
+    def __init__(self, doc_ids=()):
+        self._data = bytearray()
+        self._last = 0
+        self._count = 0
+        for doc_id in sorted(set(doc_ids)):
+            self._append(doc_id)
+
+    def _append(self, doc_id):
+        _encode_varint(doc_id - self._last, self._data)
+        self._last = doc_id
+        self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        data = self._data
+        doc_id = 0
+        shift = 0
+        delta = 0
+        for byte in data:
+            delta |= (byte & 0x7F) << shift
+            if byte & 0x80:
+                shift += 7
+            else:
+                doc_id += delta
+                yield doc_id
+                delta = 0
+                shift = 0
+
+    def nbytes(self):
+        """Return the encoded size of the list in bytes."""
+        return len(self._data)
+
+    def add(self, doc_id):
+        """Add a document id, keeping the list sorted."""
+        if doc_id > self._last or self._count == 0:
+            self._append(doc_id)
+            return
+        ids = list(self)
+        index = bisect_left(ids, doc_id)
+        if index < len(ids) and ids[index] == doc_id:
+            return
+        ids.insert(index, doc_id)
+        self._reset(ids)
+
+    def remove(self, doc_id):
+        """Remove a document id if present."""
+        ids = list(self)
+        index = bisect_left(ids, doc_id)
+        if index < len(ids) and ids[index] == doc_id:
+            del ids[index]
+            self._reset(ids)
+
+    def _reset(self, ids):
+        self._data = bytearray()
+        self._last = 0
+        self._count = 0
+        for doc_id in ids:
+            self._append(doc_id)
+
+
+class InvertedIndex:
+    """
+    Field-aware inverted index over prompt documents.
+
+    Documents are dictionaries mapping field names to text. Queries are ANDs
+    of substring terms, optionally restricted to a subset of fields.
+    """
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self._postings = {field: {} for field in self.fields}
+        # 词表：词 -> 包含该词的字段数；以及词表的三元组索引，用于子串查询
+        self._vocab = {}
+        self._vocab_trigrams = {}
+        # 正排索引：文档 -> [(字段, 词)]，用于更新和删除
+        self._documents = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._documents
+
+    def clear(self):
+        with self._lock:
+            self._postings = {field: {} for field in self.fields}
+            self._vocab = {}
+            self._vocab_trigrams = {}
+            self._documents = {}
+
+    def add(self, doc_id, document):
+        """Index a document, replacing any previous version of it."""
+        keys = set()
+        for field in self.fields:
+            for token in tokenize(document.get(field)):
+                keys.add((field, token))
+
+        with self._lock:
+            old_keys = self._documents.get(doc_id)
+            if old_keys is not None:
+                if old_keys == keys:
+                    return
+                self._unlink(doc_id, old_keys - keys)
+                keys_to_add = keys - old_keys
+            else:
+                keys_to_add = keys
+
+            for field, token in keys_to_add:
+                postings = self._postings[field]
+                posting_list = postings.get(token)
+                if posting_list is None:
+                    posting_list = postings[token] = PostingList()
+                    self._add_vocab(token)
+                posting_list.add(doc_id)
+            self._documents[doc_id] = frozenset(keys)
+
+    def remove(self, doc_id):
+        """Remove a document from the index."""
+        with self._lock:
+            keys = self._documents.pop(doc_id, None)
+            if keys:
+                self._unlink(doc_id, keys)
+
+    def _unlink(self, doc_id, keys):
+        for field, token in keys:
+            postings = self._postings[field]
+            posting_list = postings.get(token)
+            if posting_list is None:
+                continue
+            posting_list.remove(doc_id)
+            if not posting_list:
+                del postings[token]
+                self._drop_vocab(token)
+
+    def _add_vocab(self, token):
+        count = self._vocab.get(token, 0)
+        self._vocab[token] = count + 1
+        if count == 0:
+            for trigram in trigrams(token):
+                self._vocab_trigrams.setdefault(trigram, set()).add(token)
+
+    def _drop_vocab(self, token):
+        count = self._vocab.get(token, 0) - 1
+        if count > 0:
+            self._vocab[token] = count
+            return
+        self._vocab.pop(token, None)
+        for trigram in trigrams(token):
+            tokens = self._vocab_trigrams.get(trigram)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._vocab_trigrams[trigram]
+
+    def _matching_tokens(self, term):
+        """Return the indexed words that contain ``term``."""
+        if len(term) < 3:
+            # 太短的词无法使用三元组，扫描词表（远小于语料本身）
+            return [token for token in self._vocab if term in token]
+        postings = []
+        for trigram in trigrams(term):
+            tokens = self._vocab_trigrams.get(trigram)
+            if not tokens:
+                return []
+            postings.append(tokens)
+
+        candidates = None
+        for tokens in sorted(postings, key=len):
+            candidates = set(tokens) if candidates is None else candidates & tokens
+            if not candidates:
+                return []
+        return [token for token in candidates if term in token]
+
+    def _term_ids(self, term, fields):
+        ids = set()
+        for token in self._matching_tokens(term):
+            for field in fields:
+                posting_list = self._postings[field].get(token)
+                if posting_list is not None:
+                    ids.update(posting_list)
+        return ids
+
+    def search(self, query, fields=None):
+        """
+        Return the ids of documents containing every term of the query.
+
+        Each query term matches any indexed word it is a substring of. Returns
+        None when the query has no word characters to look up.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return None
+        fields = [f for f in (fields or self.fields) if f in self._postings]
+
+        with self._lock:
+            # 先处理最长的词，通常候选集最小
+            result = None
+            for term in sorted(set(terms), key=len, reverse=True):
+                ids = self._term_ids(term, fields)
+                result = ids if result is None else result & ids
+                if not result:
+                    return set()
+            return result
+
+    def stats(self):
+        """Return size statistics for the index."""
+        with self._lock:
+            posting_lists = [pl for postings in self._postings.values()
+                             for pl in postings.values()]
+            return {
+                'documents': len(self._documents),
+                'terms': len(self._vocab),
+                'trigrams': len(self._vocab_trigrams),
+                'postings': sum(len(pl) for pl in posting_lists),
+                'posting_bytes': sum(pl.nbytes() for pl in posting_lists),
+            }
@@ -0,0 +1,162 @@
+"""
+Denormalized tag and category snapshot of each prompt.
+
+``Prompt.labels`` holds a prompt's tags and categories as JSON, in the shape
+the API returns them, so that list pages read them from the ``prompts`` row
+itself instead of querying ``prompt_tags`` and ``prompt_categories`` for
+every page (see ``PromptSerializer``).
+
+The snapshot is rewritten in the same transaction as the change it reflects:
+
+- by a flush hook when a prompt is created, its tags or categories change,
+  or a tag or category it uses is renamed or deleted
+- by the bulk import, which writes the link tables directly
+
+``flask labels rebuild`` recomputes every snapshot, e.g. after upgrading or
+after editing the link tables by hand. Prompts whose snapshot is NULL are
+served from the link tables, so a missing snapshot is slower, never wrong.
+"""
+
+import json
+
+import click
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import bindparam, event, inspect, select
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from app.extensions import db
+from app.models import Category, Prompt, Tag, prompt_categories, prompt_tags
+from app.utils.serializer import PromptSerializer
+
+# 每次查询和更新的提示数
+_BATCH_SIZE = 500
+# 快照包含的关联及其可见属性
+_LINKED = {
+    Tag: (prompt_tags, prompt_tags.c.tag_id, ('name',)),
+    Category: (prompt_categories, prompt_categories.c.category_id, ('name', 'description')),
+}
+_UPDATE = Prompt.__table__.update().where(
+    Prompt.__table__.c.id == bindparam('prompt_id')
+).values(
+    labels=bindparam('snapshot'),
+    # 快照不是提示内容的变化，不触发 updated_at 的 onupdate
+    updated_at=Prompt.__table__.c.updated_at,
+)
+
+
+def build_snapshots(prompt_ids):
+    """
+    Compute the snapshots of prompts from the link tables.
+
+    Returns:
+        dict: ``{prompt_id: JSON text}`` for the prompts that exist
+    """
+    serializer = PromptSerializer(('id', 'categories', 'tags'), snapshot=False)
+    snapshots = {}
+    ids = list(prompt_ids)
+    for start in range(0, len(ids), _BATCH_SIZE):
+        prompts, _ = serializer.dump_ids(ids[start:start + _BATCH_SIZE])
+        for prompt in prompts:
+            snapshots[prompt['id']] = json.dumps(
+                {'categories': prompt['categories'], 'tags': prompt['tags']},
+                ensure_ascii=False, separators=(',', ':'))
+    return snapshots
+
+
+def refresh_snapshots(session, prompt_ids):
+    """
+    Rewrite the snapshots of prompts within the session's transaction.
+
+    Prompts already loaded in the session get the new value too.
+
+    Returns:
+        int: Number of prompts updated
+    """
+    snapshots = build_snapshots(sorted(prompt_ids))
+    if not snapshots:
+        return 0
+    session.execute(_UPDATE, [{'prompt_id': prompt_id, 'snapshot': snapshot}
+                              for prompt_id, snapshot in snapshots.items()])
+    for prompt_id, snapshot in snapshots.items():
+        prompt = session.identity_map.get(identity_key(Prompt, prompt_id))
+        if prompt is not None:
+            set_committed_value(prompt, 'labels', snapshot)
+    return len(snapshots)
+
+
+def _pending(session):
+    return session.info.setdefault('label_snapshot_pending', {'ids': set(), 'prompts': []})
+
+
+def _linked_prompt_ids(session, obj):
+    link_table, link_column, _ = _LINKED[type(obj)]
+    return {row[0] for row in session.execute(
+        select(link_table.c.prompt_id).where(link_column == obj.id))}
+
+
+def _before_flush(session, flush_context, instances):
+    pending = _pending(session)
+    # 新提示的 id 在 flush 之后才有，先记下对象
+    pending['prompts'].extend(obj for obj in session.new if isinstance(obj, Prompt))
+    for obj in session.dirty:
+        if isinstance(obj, Prompt):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in ('tags', 'categories')):
+                pending['prompts'].append(obj)
+        elif type(obj) in _LINKED and obj.id is not None:
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in _LINKED[type(obj)][2]):
+                pending['ids'] |= _linked_prompt_ids(session, obj)
+            # 从标签/分类一侧增删的关联
+            added, _, deleted = state.attrs.prompts.history
+            pending['prompts'].extend(list(added or ()) + list(deleted or ()))
+    # 删除标签/分类前关联行仍然存在
+    for obj in session.deleted:
+        if type(obj) in _LINKED:
+            pending['ids'] |= _linked_prompt_ids(session, obj)
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.pop('label_snapshot_pending', None)
+    if pending is None:
+        return
+    prompt_ids = pending['ids'] | {obj.id for obj in pending['prompts']
+                                   if obj.id is not None and obj not in session.deleted}
+    if prompt_ids:
+        refresh_snapshots(session, prompt_ids)
+
+
+labels_cli = AppGroup('labels', help='Tag/category snapshot commands.')
+
+
+@labels_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Recompute the tag/category snapshot of every prompt."""
+    count = 0
+    last_id = 0
+    while True:
+        ids = [row[0] for row in db.session.execute(
+            select(Prompt.id).where(Prompt.id > last_id).order_by(Prompt.id).limit(_BATCH_SIZE))]
+        if not ids:
+            break
+        count += refresh_snapshots(db.session, ids)
+        db.session.commit()
+        last_id = ids[-1]
+    click.echo(f'Rebuilt tag/category snapshots for {count} prompts.')
+
+
+def setup_label_snapshot(app, db):
+    """
+    Keep the prompts' tag/category snapshots up to date and register the
+    CLI commands.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+    """
+    app.cli.add_command(labels_cli)
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
+        event.listen(db.session, 'after_flush', _after_flush)
@@ -0,0 +1,137 @@
+"""
+HTTP load test for comparing deployments of the API.
+
+``flask loadtest`` keeps ``--concurrency`` connections busy against a
+running server and reports throughput, latency percentiles and status
+codes. Run it against the sync app (gunicorn) and the ASGI app (uvicorn,
+see ``app.routes.async_api``) with the same database to compare them::
+
+    flask loadtest http://127.0.0.1:8000 /api/prompts?per_page=20 \\
+        '/api/prompts/{id}' --concurrency 256 --requests 20000
+
+``{id}`` in a path is replaced by a random id up to ``--max-id``. The
+client uses plain asyncio streams with keep-alive, so it needs no extra
+packages and is rarely the bottleneck.
+"""
+
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import click
+
+
+async def _read_response(reader):
+    """Read one response; return ``(status, keep_alive)``."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed by server')
+    version, status = status_line.decode('latin-1').split(' ', 2)[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    keep_alive = (headers.get('connection', '').lower() != 'close'
+                  and version == 'HTTP/1.1')
+    return int(status), keep_alive
+
+
+async def _worker(target, paths, counter, total, max_id, extra_headers, results):
+    host, port = target.hostname, target.port or 80
+    reader = writer = None
+    while next(counter) < total:
+        path = random.choice(paths).replace('{id}', str(random.randint(1, max_id)))
+        request = (f'GET {path} HTTP/1.1\r\nHost: {target.netloc}\r\n'
+                   f'{extra_headers}\r\n').encode('latin-1')
+        started_at = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            results['errors'][type(e).__name__] += 1
+            keep_alive = False
+        else:
+            results['latencies'].append(time.perf_counter() - started_at)
+            results['statuses'][status] += 1
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url, paths, concurrency, total, max_id=1000, accept_encoding='gzip'):
+    """
+    Send ``total`` GET requests over ``concurrency`` connections.
+
+    Returns:
+        dict: ``elapsed`` (seconds), ``latencies`` (seconds, one per
+        successful request), ``statuses`` and ``errors`` counters
+    """
+    target = urlsplit(url)
+    extra_headers = f'Accept-Encoding: {accept_encoding}\r\n' if accept_encoding else ''
+    counter = itertools.count()
+    results = {'latencies': [], 'statuses': Counter(), 'errors': Counter()}
+    started_at = time.perf_counter()
+    await asyncio.gather(*(
+        _worker(target, paths, counter, total, max_id, extra_headers, results)
+        for _ in range(concurrency)))
+    results['elapsed'] = time.perf_counter() - started_at
+    return results
+
+
+def _percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+@click.command('loadtest')
+@click.argument('url')
+@click.argument('paths', nargs=-1)
+@click.option('--concurrency', '-c', default=64, help='Concurrent connections.')
+@click.option('--requests', '-n', 'total', default=5000, help='Total number of requests.')
+@click.option('--max-id', default=1000, help='Upper bound of the ids substituted for {id}.')
+@click.option('--accept-encoding', default='gzip', help='Accept-Encoding header (empty: none).')
+def loadtest_command(url, paths, concurrency, total, max_id, accept_encoding):
+    """Load test a running server, e.g. the sync and the ASGI app."""
+    paths = list(paths) or ['/api/prompts?per_page=20']
+    results = asyncio.run(run_load(url, paths, concurrency, total, max_id, accept_encoding))
+    latencies = sorted(results['latencies'])
+    elapsed = results['elapsed']
+    click.echo(f'{len(latencies)} requests in {elapsed:.2f}s over {concurrency} connections: '
+               f'{len(latencies) / elapsed:.0f} req/s')
+    if latencies:
+        click.echo('latency p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms'.format(
+            *(_percentile(latencies, f) * 1000 for f in (0.5, 0.95, 0.99, 1.0))))
+    click.echo('status ' + ', '.join(f'{status}: {count}'
+                                     for status, count in sorted(results['statuses'].items())))
+    if results['errors']:
+        click.echo('errors ' + ', '.join(f'{name}: {count}'
+                                         for name, count in results['errors'].items()), err=True)
+
+
+def setup_loadtest(app):
+    """
+    Register the load test CLI command.
+
+    Args:
+        app: Flask application instance
+    """
+    app.cli.add_command(loadtest_command)
@@ -0,0 +1,88 @@
+"""
+MinHash signatures and LSH banding for near-duplicate detection.
+
+Signatures use one-permutation hashing: every character shingle is hashed
+once and kept in one of ``NUM_HASHES`` bins, so computing a signature is
+linear in the text length. Empty bins are filled by rotation densification.
+The fraction of equal bins between two signatures estimates the Jaccard
+similarity of their shingle sets.
+
+For LSH the signature is split into ``BANDS`` bands of ``ROWS`` values; each
+band is hashed into a stable 64-bit bucket key. Two prompts sharing any
+bucket are candidate duplicates. With 16 bands of 4 rows, pairs with a
+similarity of 0.8 share a bucket with probability > 0.99.
+"""
+
+import struct
+import zlib
+from hashlib import blake2b
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+SHINGLE_SIZE = 5
+
+_BIN_BITS = 6  # 2 ** 6 == NUM_HASHES
+_VALUE_MASK = (1 << (32 - _BIN_BITS)) - 1
+_EMPTY = 0xFFFFFFFF
+_SIGNATURE_FORMAT = f'<{NUM_HASHES}I'
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Return the set of character shingles of the normalized text."""
+    normalized = ' '.join((text or '').lower().split())
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def signature(text):
+    """Compute the MinHash signature of a text as a list of ints."""
+    bins = [_EMPTY] * NUM_HASHES
+    for shingle in shingles(text):
+        # 乘法散列：高位选桶，低位作为桶内的值
+        h = (zlib.crc32(shingle.encode('utf-8')) * 0x9E3779B1) & 0xFFFFFFFF
+        index = h >> (32 - _BIN_BITS)
+        value = h & _VALUE_MASK
+        if value < bins[index]:
+            bins[index] = value
+
+    if all(value == _EMPTY for value in bins):
+        return bins
+
+    # 旋转填充空桶：借用下一个非空桶的值并加上距离偏移
+    densified = list(bins)
+    for i in range(NUM_HASHES):
+        if bins[i] != _EMPTY:
+            continue
+        distance = 1
+        while bins[(i + distance) % NUM_HASHES] == _EMPTY:
+            distance += 1
+        densified[i] = bins[(i + distance) % NUM_HASHES] + distance * (_VALUE_MASK + 1)
+    return densified
+
+
+def to_bytes(sig):
+    """Pack a signature for storage."""
+    return struct.pack(_SIGNATURE_FORMAT, *(value & 0xFFFFFFFF for value in sig))
+
+
+def from_bytes(data):
+    """Unpack a stored signature."""
+    return list(struct.unpack(_SIGNATURE_FORMAT, data))
+
+
+def similarity(a, b):
+    """Estimate the Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_HASHES
+
+
+def band_buckets(sig):
+    """Return the LSH bucket key of every band as signed 64-bit ints."""
+    packed = [value & 0xFFFFFFFF for value in sig]
+    buckets = []
+    for band in range(BANDS):
+        rows = packed[band * ROWS:(band + 1) * ROWS]
+        digest = blake2b(struct.pack(f'<H{ROWS}I', band, *rows), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
@@ -0,0 +1,184 @@
+"""
+Keyset (cursor) pagination for prompt listings.
+
+Listings are ordered newest first on ``(created_at, id)``. Instead of an
+``OFFSET``, each page continues from the last row of the previous one, so
+the database seeks straight to it through the ``ix_prompts_created_at_id``
+index and deep pages cost the same as the first. Cursors are opaque,
+URL-safe tokens; the total count is optional because it is the only part
+whose cost grows with the listing.
+"""
+
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from app.models import Prompt
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+class InvalidPerPage(ValueError):
+    """Raised when ``per_page`` is not a positive number."""
+
+
+def parse_per_page(args, default, maximum):
+    """
+    Read ``per_page`` from request arguments, capped at ``maximum``.
+
+    A value that is not an integer falls back to ``default``.
+
+    Raises:
+        InvalidPerPage: If the value is zero or negative
+    """
+    per_page = args.get('per_page', default, type=int)
+    if per_page < 1:
+        # LIMIT 为负数时 SQLite 不限制行数
+        raise InvalidPerPage(f'per_page must be at least 1, got {per_page}')
+    return min(per_page, maximum)
+
+
+def encode_cursor(prompt, direction='next'):
+    """Return an opaque cursor pointing after (``next``) or before (``prev``) a prompt."""
+    raw = f'{direction}|{prompt.created_at.isoformat()}|{prompt.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into ``(direction, created_at, id)``."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, created_at, prompt_id = base64.urlsafe_b64decode(
+            padded.encode()).decode().split('|')
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(created_at), int(prompt_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor!r}') from e
+
+
+class CursorPage:
+    """One page of a keyset-paginated listing."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        # 未请求总数时为 None
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def pages(self):
+        if self.total is None:
+            return None
+        return (self.total + self.per_page - 1) // self.per_page
+
+    def to_dict(self):
+        """Return the pagination metadata for API responses."""
+        result = {
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+        }
+        if self.total is not None:
+            result['total_pages'] = self.pages
+            result['total_items'] = self.total
+        return result
+
+
+def keyset_query(query, cursor=None, per_page=10):
+    """
+    Order and restrict a prompt query or ``select()`` to one cursor page.
+
+    One more row than ``per_page`` is selected to tell whether the listing
+    continues; pass the rows to ``cursor_page``.
+
+    Returns:
+        tuple: ``(direction, page query)``
+
+    Raises:
+        InvalidCursor: If the cursor cannot be decoded
+    """
+    direction = 'next'
+    page_query = query.order_by(None)
+    if cursor:
+        direction, created_at, prompt_id = decode_cursor(cursor)
+        # 外层的范围条件让数据库直接在索引上定位
+        if direction == 'next':
+            page_query = page_query.filter(and_(
+                Prompt.created_at <= created_at,
+                or_(Prompt.created_at < created_at, Prompt.id < prompt_id)))
+        else:
+            page_query = page_query.filter(and_(
+                Prompt.created_at >= created_at,
+                or_(Prompt.created_at > created_at, Prompt.id > prompt_id)))
+
+    if direction == 'next':
+        page_query = page_query.order_by(Prompt.created_at.desc(), Prompt.id.desc())
+    else:
+        page_query = page_query.order_by(Prompt.created_at.asc(), Prompt.id.asc())
+
+    # 多取一行判断是否还有下一页
+    return direction, page_query.limit(per_page + 1)
+
+
+def cursor_page(rows, direction, cursor=None, per_page=10, total=None):
+    """
+    Build a ``CursorPage`` from the rows selected by ``keyset_query``.
+
+    Args:
+        rows (list): Selected rows (with ``id`` and ``created_at``)
+        direction (str): Direction returned by ``keyset_query``
+        cursor (str): The cursor the page was requested with
+        per_page (int): Items per page
+        total (int): Count of all matching prompts, or None
+    """
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    if direction == 'prev':
+        items.reverse()
+
+    next_cursor = prev_cursor = None
+    if items:
+        if direction == 'next':
+            next_cursor = encode_cursor(items[-1]) if has_more else None
+            prev_cursor = encode_cursor(items[0], 'prev') if cursor else None
+        else:
+            next_cursor = encode_cursor(items[-1])
+            prev_cursor = encode_cursor(items[0], 'prev') if has_more else None
+    return CursorPage(items, per_page, next_cursor, prev_cursor, total)
+
+
+def keyset_paginate(query, cursor=None, per_page=10, include_total=True):
+    """
+    Paginate a ``Prompt`` query newest first using a cursor.
+
+    Args:
+        query: A ``Prompt.query`` based query; its ordering is replaced
+        cursor (str): Cursor from a previous page, or None for the first page
+        per_page (int): Items per page
+        include_total (bool): Also count all matching prompts
+
+    Returns:
+        CursorPage
+
+    Raises:
+        InvalidCursor: If the cursor cannot be decoded
+    """
+    direction, page_query = keyset_query(query, cursor, per_page)
+    rows = page_query.all()
+    total = query.order_by(None).count() if include_total else None
+    return cursor_page(rows, direction, cursor, per_page, total)
@@ -0,0 +1,103 @@
+"""
+Tag, category and owner filters for prompt queries.
+
+Filters are emitted as ``prompts.id IN (SELECT prompt_id ...)`` semi-joins
+instead of joins, so a prompt is never repeated once per matching tag and
+queries need no ``DISTINCT``. Each subquery is a range scan of the
+``(tag_id, prompt_id)`` / ``(category_id, prompt_id)`` indexes. Several tags
+or categories can be combined with ``all`` (AND) or ``any`` (OR) semantics.
+"""
+
+from sqlalchemy import select
+
+from app.models import Prompt, prompt_categories, prompt_tags
+
+FILTER_MODES = ('all', 'any')
+
+
+def parse_ids(values):
+    """
+    Parse ids from repeated and/or comma separated request values.
+
+    ``['1,2', '3']`` becomes ``[1, 2, 3]``; values that are not integers are
+    ignored.
+    """
+    ids = []
+    for value in values or ():
+        for part in str(value).split(','):
+            part = part.strip()
+            if part.isdigit() and int(part) not in ids:
+                ids.append(int(part))
+    return ids
+
+
+class PromptFilter:
+    """
+    Restrictions on which prompts a query returns.
+
+    Args:
+        user_id (int): Only prompts owned by this user
+        tag_ids (list): Tag ids to filter on
+        category_ids (list): Category ids to filter on
+        tag_mode (str): ``all`` requires every tag, ``any`` at least one
+        category_mode (str): ``all`` requires every category, ``any`` at
+            least one
+    """
+
+    def __init__(self, user_id=None, tag_ids=None, category_ids=None,
+                 tag_mode='all', category_mode='any'):
+        self.user_id = user_id
+        self.tag_ids = sorted(set(tag_ids or ()))
+        self.category_ids = sorted(set(category_ids or ()))
+        self.tag_mode = tag_mode if tag_mode in FILTER_MODES else 'all'
+        self.category_mode = category_mode if category_mode in FILTER_MODES else 'any'
+
+    @classmethod
+    def from_args(cls, args, user_id=None):
+        """
+        Build a filter from request arguments.
+
+        Reads ``tag`` and ``category`` (repeated or comma separated ids) and
+        the optional ``tag_mode`` and ``category_mode``.
+        """
+        return cls(
+            user_id=user_id,
+            tag_ids=parse_ids(args.getlist('tag')),
+            category_ids=parse_ids(args.getlist('category')),
+            tag_mode=args.get('tag_mode', 'all'),
+            category_mode=args.get('category_mode', 'any')
+        )
+
+    def _semi_joins(self, link_table, link_column, ids, mode):
+        if not ids:
+            return []
+        if mode == 'any' or len(ids) == 1:
+            return [Prompt.id.in_(select(link_table.c.prompt_id).where(link_column.in_(ids)))]
+        # 每个 id 一个子查询，取交集
+        return [Prompt.id.in_(select(link_table.c.prompt_id).where(link_column == item_id))
+                for item_id in ids]
+
+    def criteria(self):
+        """Return the filter conditions as a list of SQL expressions."""
+        conditions = []
+        if self.user_id is not None:
+            conditions.append(Prompt.user_id == self.user_id)
+        conditions += self._semi_joins(prompt_tags, prompt_tags.c.tag_id,
+                                       self.tag_ids, self.tag_mode)
+        conditions += self._semi_joins(prompt_categories, prompt_categories.c.category_id,
+                                       self.category_ids, self.category_mode)
+        return conditions
+
+    def apply(self, query):
+        """Apply the filter to a ``Prompt`` query."""
+        conditions = self.criteria()
+        return query.filter(*conditions) if conditions else query
+
+    def cache_filters(self):
+        """Return the filter as a dict for search cache keys (without the user)."""
+        return {
+            'tags': tuple(self.tag_ids),
+            'tag_mode': self.tag_mode if len(self.tag_ids) > 1 else None,
+            'categories': tuple(self.category_ids),
+            'category_mode': self.category_mode if len(self.category_ids) > 1 else None,
+        }
@@ -0,0 +1,95 @@
+"""
+Per-request SQL query budgets, to catch N+1 query patterns.
+
+Views declare how many statements a request may execute::
+
+    @main.route('/prompts/<int:id>')
+    @query_budget(6)
+    def prompt_detail(id):
+        ...
+
+With ``QUERY_BUDGET_MODE`` set, every statement executed while handling a
+request is recorded and the count is sent in an ``X-Query-Count`` header.
+A request that executes more statements than its endpoint's budget is
+logged (``warn``, the development default) or fails with
+``QueryBudgetExceeded`` (``raise``, the testing default), naming the most
+repeated statement. Endpoints without a budget are only counted.
+
+Statements executed while a streamed response is being sent are not
+counted.
+"""
+
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MODES = ('warn', 'raise')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a request executes more SQL statements than its budget."""
+
+
+def query_budget(limit):
+    """
+    Declare the maximum number of SQL statements a view may execute.
+
+    Args:
+        limit (int): Budget per request, including authentication queries
+    """
+    def decorator(view):
+        # functools.wraps 会把属性复制到外层装饰器，放在哪一层都可以
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def _record(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    statements = g.get('sql_statements')
+    if statements is not None:
+        statements.append(statement)
+
+
+def _start():
+    g.sql_statements = []
+
+
+def _check(response):
+    statements = g.pop('sql_statements', None)
+    if statements is None:
+        return response
+    response.headers['X-Query-Count'] = str(len(statements))
+    view = current_app.view_functions.get(request.endpoint)
+    limit = getattr(view, 'query_budget', None)
+    if limit is None or len(statements) <= limit:
+        return response
+
+    statement, repeats = Counter(statements).most_common(1)[0]
+    message = (f'{request.endpoint} executed {len(statements)} SQL statements '
+               f'(budget {limit}); most repeated ({repeats}x): {" ".join(statement.split())}')
+    if current_app.config.get('QUERY_BUDGET_MODE') == 'raise':
+        raise QueryBudgetExceeded(message)
+    current_app.logger.warning(message)
+    return response
+
+
+def setup_query_budget(app):
+    """
+    Count SQL statements per request and enforce the declared budgets.
+
+    Args:
+        app: Flask application instance
+    """
+    mode = app.config.get('QUERY_BUDGET_MODE')
+    if not mode:
+        return
+    if mode not in MODES:
+        raise ValueError(f'Unknown QUERY_BUDGET_MODE: {mode}')
+    if not event.contains(Engine, 'before_cursor_execute', _record):
+        event.listen(Engine, 'before_cursor_execute', _record)
+    app.before_request(_start)
+    app.after_request(_check)
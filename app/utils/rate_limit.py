@@ -0,0 +1,276 @@
+"""
+Admission control for the JSON API: rate limits and concurrency caps.
+
+Every ``/api`` request passes two checks before its view runs, and is
+rejected right away with ``429 Too Many Requests`` and ``Retry-After``
+instead of waiting for a busy worker:
+
+- **Token buckets** per client: the JWT identity when the request carries
+  a valid token, otherwise the client IP. ``RATE_LIMIT_DEFAULT`` is shared
+  by all endpoints; endpoints listed in ``RATE_LIMITS`` (the expensive
+  ones) have a bucket of their own.
+- **Concurrency caps** per endpoint (``API_CONCURRENCY_LIMITS``), across
+  all clients, so that slow endpoints such as the export cannot occupy
+  every worker. A slot is held until the response has been sent.
+
+Counters live in a storage backend. ``RATE_LIMIT_STORAGE`` is a SQLite
+file shared by all worker processes of the host (one atomic statement per
+check), or ``memory`` for per-process counters. If the storage fails,
+requests are let through.
+"""
+
+import math
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import decode_token
+
+from app.utils.shared_sqlite import SharedSQLite
+
+# 速率限制检查时清理过期记录的间隔（秒）
+_CLEANUP_INTERVAL = 60
+
+
+class MemoryStorage:
+    """Per-process counters (limits are multiplied by the number of workers)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._slots = {}
+
+    def take(self, key, rate, burst, now):
+        """
+        Take a token from a bucket.
+
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until one is
+            available
+        """
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            if len(self._buckets) > 100000:
+                # 长时间未使用的桶已经补满，删除后等价
+                self._buckets = {k: v for k, v in self._buckets.items()
+                                 if now - v[1] < burst / rate}
+        return 0 if allowed else (1 - tokens) / rate
+
+    def acquire(self, name, limit, now, ttl):
+        """Take a concurrency slot; return its id, or None if all are in use."""
+        with self._lock:
+            active = self._slots.get(name, 0)
+            if active >= limit:
+                return None
+            self._slots[name] = active + 1
+        return name
+
+    def release(self, name, slot):
+        with self._lock:
+            self._slots[name] = max(self._slots.get(name, 0) - 1, 0)
+
+
+class SQLiteStorage:
+    """
+    Counters in a SQLite file shared by the worker processes of a host.
+
+    Args:
+        path (str): Database file; created on first use
+    """
+
+    _SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+        'updated_at REAL NOT NULL, allowed INTEGER NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS concurrency_slots (id INTEGER PRIMARY KEY, '
+        'name TEXT NOT NULL, expires_at REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS ix_concurrency_slots_name '
+        'ON concurrency_slots (name, expires_at)',
+    )
+    # 补充令牌、判断和扣减在一条语句中完成（SET 中的列都是更新前的值）
+    _TAKE_SQL = '''
+        INSERT INTO rate_buckets (key, tokens, updated_at, allowed)
+        VALUES (:key, :burst - 1, :now, 1)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = min(:burst, tokens + (:now - updated_at) * :rate)
+                     - (min(:burst, tokens + (:now - updated_at) * :rate) >= 1),
+            allowed = min(:burst, tokens + (:now - updated_at) * :rate) >= 1,
+            updated_at = :now
+        RETURNING tokens, allowed
+    '''
+    _ACQUIRE_SQL = '''
+        INSERT INTO concurrency_slots (name, expires_at)
+        SELECT :name, :expires_at
+        WHERE (SELECT count(*) FROM concurrency_slots
+               WHERE name = :name AND expires_at >= :now) < :limit
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._db = SharedSQLite(path, self._SCHEMA)
+        self._next_cleanup = 0
+
+    def _connection(self):
+        return self._db.connection()
+
+    def _cleanup(self, connection, now):
+        if now < self._next_cleanup:
+            return
+        self._next_cleanup = now + _CLEANUP_INTERVAL
+        # 一小时未使用的桶早已补满
+        connection.execute('DELETE FROM rate_buckets WHERE updated_at < ?', (now - 3600,))
+        connection.execute('DELETE FROM concurrency_slots WHERE expires_at < ?', (now,))
+
+    def take(self, key, rate, burst, now):
+        connection = self._connection()
+        self._cleanup(connection, now)
+        tokens, allowed = connection.execute(
+            self._TAKE_SQL, {'key': key, 'rate': rate, 'burst': burst, 'now': now}).fetchone()
+        return 0 if allowed else (1 - tokens) / rate
+
+    def acquire(self, name, limit, now, ttl):
+        # 进程异常退出时未释放的名额在 ttl 秒后过期
+        cursor = self._connection().execute(self._ACQUIRE_SQL, {
+            'name': name, 'limit': limit, 'now': now, 'expires_at': now + ttl})
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def release(self, name, slot):
+        self._connection().execute('DELETE FROM concurrency_slots WHERE id = ?', (slot,))
+
+
+def create_storage(setting):
+    """Return the storage for ``RATE_LIMIT_STORAGE`` (``memory`` or a file path)."""
+    if setting == 'memory':
+        return MemoryStorage()
+    return SQLiteStorage(setting)
+
+
+class RateLimiter:
+    """
+    Applies the configured limits to requests.
+
+    Args:
+        storage: ``MemoryStorage`` or ``SQLiteStorage``
+        config: Application config
+    """
+
+    def __init__(self, storage, config):
+        self.storage = storage
+        self.default = config.get('RATE_LIMIT_DEFAULT')
+        self.limits = dict(config.get('RATE_LIMITS') or {})
+        self.concurrency = dict(config.get('API_CONCURRENCY_LIMITS') or {})
+        self.slot_ttl = config.get('API_CONCURRENCY_SLOT_TTL', 300)
+
+    def check_rate(self, client, endpoint):
+        """
+        Take a token for a request.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise seconds to wait
+        """
+        if endpoint in self.limits:
+            rate, burst = self.limits[endpoint]
+            key = f'{client}|{endpoint}'
+        elif self.default:
+            rate, burst = self.default
+            key = client
+        else:
+            return 0
+        try:
+            return self.storage.take(key, rate, burst, time.time())
+        except sqlite3.Error:
+            current_app.logger.warning('Rate limit storage unavailable', exc_info=True)
+            return 0
+
+    def acquire(self, endpoint):
+        """
+        Take a concurrency slot for an endpoint.
+
+        Returns:
+            tuple: ``(allowed, slot)``; pass the slot to ``release`` when
+            the request is done (None when the endpoint has no cap)
+        """
+        limit = self.concurrency.get(endpoint)
+        if limit is None:
+            return True, None
+        try:
+            slot = self.storage.acquire(endpoint, limit, time.time(), self.slot_ttl)
+        except sqlite3.Error:
+            current_app.logger.warning('Rate limit storage unavailable', exc_info=True)
+            return True, None
+        return slot is not None, slot
+
+    def release(self, endpoint, slot):
+        try:
+            self.storage.release(endpoint, slot)
+        except sqlite3.Error:
+            current_app.logger.warning('Could not release concurrency slot', exc_info=True)
+
+
+def get_rate_limiter():
+    """Return the rate limiter of the current app, or None if limits are disabled."""
+    return current_app.extensions.get('rate_limiter')
+
+
+def client_key(token, remote_addr):
+    """
+    Return the bucket key of a client: its JWT identity when ``token`` is
+    valid, otherwise its IP address. Must be called in an app context.
+    """
+    if token:
+        try:
+            return f"user:{decode_token(token)[current_app.config['JWT_IDENTITY_CLAIM']]}"
+        except Exception:
+            # 无效或过期的令牌按 IP 计数，鉴权由视图负责
+            pass
+    return f'ip:{remote_addr}'
+
+
+def too_many_requests(retry_after):
+    """Return the ``429`` response for a rejected request."""
+    response = jsonify({'message': 'Too many requests, please retry later'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+def _admit():
+    limiter = get_rate_limiter()
+    if limiter is None or request.blueprint != 'api' or request.endpoint is None:
+        return None
+    token = request.cookies.get(current_app.config['JWT_ACCESS_COOKIE_NAME'])
+    wait = limiter.check_rate(client_key(token, request.remote_addr), request.endpoint)
+    if wait:
+        return too_many_requests(wait)
+    allowed, slot = limiter.acquire(request.endpoint)
+    if not allowed:
+        return too_many_requests(1)
+    if slot is not None:
+        g.concurrency_slot = (request.endpoint, slot)
+    return None
+
+
+def _release(exc):
+    # 流式响应在发送完毕后才结束请求上下文，名额一直占用到那时
+    held = g.pop('concurrency_slot', None)
+    limiter = get_rate_limiter()
+    if held is not None and limiter is not None:
+        limiter.release(*held)
+
+
+def setup_rate_limit(app):
+    """
+    Enforce the API rate limits and concurrency caps.
+
+    Args:
+        app: Flask application instance
+    """
+    if not app.config.get('RATE_LIMIT_ENABLED', True):
+        return
+    storage = create_storage(app.config.get('RATE_LIMIT_STORAGE', 'memory'))
+    app.extensions['rate_limiter'] = RateLimiter(storage, app.config)
+    app.before_request(_admit)
+    app.teardown_request(_release)
@@ -0,0 +1,355 @@
+"""
+Precomputed "related prompts" for the PromptVault application.
+
+Each prompt is represented as a sparse TF-IDF vector over the words of its
+title, description and content plus its tag names. The ``k`` most similar
+prompts of the same user (cosine similarity) are stored in
+``prompt_related``, so showing related prompts is a single primary key
+lookup.
+
+Prompts whose text or tags change are flagged with ``related_stale`` on
+flush, and their ``related_generation`` is incremented. ``refresh_related``
+reads the generations of the flagged prompts before loading the corpus and
+clears a flag only if the generation has not moved since, so a prompt edited
+while its batch is computed stays flagged for the next run. It recomputes the neighbours of flagged prompts in
+batches, using an inverted term index so each prompt is only compared with
+prompts sharing a term, and merges the new scores into the lists of the
+prompts they were compared with. IDF weights drift slowly as the corpus
+grows; ``flask related rebuild`` recomputes everything from scratch.
+
+A refresh loads the owner's whole corpus, so it runs outside the request
+path: ``flask related worker`` refreshes flagged prompts in a loop (or run
+``flask related refresh`` periodically). ``RELATED_REFRESH_ON_WRITE``
+refreshes at the end of each write request instead, for small databases.
+"""
+
+import heapq
+import math
+import time
+from collections import Counter, defaultdict
+
+import click
+from flask import current_app, g, has_app_context
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import bindparam, delete, event, inspect, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db
+from app.models import Prompt, PromptRelated, Tag, prompt_tags
+from app.utils.inverted_index import tokenize
+
+# 低于此相似度的提示不视为相关
+MIN_SCORE = 0.05
+# 语料足够大时，忽略出现在一半以上提示中的词（近似停用词）
+MAX_DF = 0.5
+MAX_DF_MIN_DOCUMENTS = 10
+
+
+def document_terms(title, description, content, tag_names=()):
+    """Return the term counts of a prompt; tags become ``#name`` terms."""
+    text = f'{title or ""}\n{description or ""}\n{content or ""}'
+    counts = Counter(token for token in tokenize(text) if len(token) > 1)
+    for name in tag_names:
+        counts['#' + name.lower()] += 1
+    return counts
+
+
+class TfidfMatrix:
+    """
+    Row-normalized sparse TF-IDF vectors with an inverted term index.
+
+    ``similarities`` is a sparse matrix-vector product: only the postings of
+    the document's own terms are visited.
+    """
+
+    def __init__(self, documents):
+        document_frequency = Counter()
+        for counts in documents.values():
+            document_frequency.update(counts.keys())
+
+        n = len(documents)
+        max_df = MAX_DF * n if n >= MAX_DF_MIN_DOCUMENTS else n
+        self.idf = {
+            term: math.log((1 + n) / (1 + df)) + 1
+            for term, df in document_frequency.items() if df <= max_df
+        }
+
+        self.vectors = {}
+        self.postings = defaultdict(list)
+        for doc_id, counts in documents.items():
+            vector = {
+                term: (1 + math.log(count)) * self.idf[term]
+                for term, count in counts.items() if term in self.idf
+            }
+            norm = math.sqrt(sum(w * w for w in vector.values()))
+            if norm:
+                vector = {term: w / norm for term, w in vector.items()}
+            self.vectors[doc_id] = vector
+            for term, weight in vector.items():
+                self.postings[term].append((doc_id, weight))
+
+    def similarities(self, doc_id):
+        """Return ``{other_id: cosine}`` for documents sharing a term with ``doc_id``."""
+        scores = defaultdict(float)
+        for term, weight in self.vectors.get(doc_id, {}).items():
+            for other_id, other_weight in self.postings[term]:
+                scores[other_id] += weight * other_weight
+        scores.pop(doc_id, None)
+        return scores
+
+
+def _top_k(scores, k):
+    """Return the ``k`` best ``{id: score}`` entries above ``MIN_SCORE``."""
+    best = heapq.nlargest(
+        k, ((score, -other_id) for other_id, score in scores.items() if score >= MIN_SCORE))
+    return {-neg_id: score for score, neg_id in best}
+
+
+def _load_documents(user_id):
+    documents = {}
+    rows = db.session.query(
+        Prompt.id, Prompt.title, Prompt.description, Prompt.content
+    ).filter(Prompt.user_id == user_id)
+    for prompt_id, title, description, content in rows:
+        documents[prompt_id] = document_terms(title, description, content)
+
+    tag_rows = db.session.query(prompt_tags.c.prompt_id, Tag.name).join(
+        Tag, Tag.id == prompt_tags.c.tag_id
+    ).filter(prompt_tags.c.user_id == user_id)
+    for prompt_id, name in tag_rows:
+        if prompt_id in documents:
+            documents[prompt_id]['#' + name.lower()] += 1
+    return documents
+
+
+def _write_lists(lists, prompt_ids):
+    table = PromptRelated.__table__
+    db.session.execute(delete(table).where(table.c.prompt_id.in_(prompt_ids)))
+    rows = [
+        {'prompt_id': prompt_id, 'related_id': related_id, 'score': score}
+        for prompt_id in prompt_ids
+        for related_id, score in lists.get(prompt_id, {}).items()
+    ]
+    if rows:
+        db.session.execute(table.insert(), rows)
+
+
+def _refresh_user(user_id, k, batch_size):
+    # 先读取标记时的代数，再加载语料：之后的修改都会让代数变化
+    generations = dict(db.session.query(Prompt.id, Prompt.related_generation).filter(
+        Prompt.user_id == user_id, Prompt.related_stale.is_(True)))
+    if not generations:
+        return 0
+    stale = sorted(generations)
+    stale_ids = set(stale)
+    matrix = TfidfMatrix(_load_documents(user_id))
+
+    # 当前存储的相关列表，以及反向索引：提示 -> 把它列为相关的提示
+    lists = {}
+    holders = defaultdict(set)
+    rows = db.session.query(
+        PromptRelated.prompt_id, PromptRelated.related_id, PromptRelated.score
+    ).join(Prompt, Prompt.id == PromptRelated.prompt_id).filter(Prompt.user_id == user_id)
+    for prompt_id, related_id, score in rows:
+        lists.setdefault(prompt_id, {})[related_id] = score
+        holders[related_id].add(prompt_id)
+
+    prompts_table = Prompt.__table__
+    clear_flag = update(prompts_table).where(
+        prompts_table.c.id == bindparam('prompt_id'),
+        prompts_table.c.related_generation == bindparam('generation'),
+    ).values(related_stale=False, updated_at=prompts_table.c.updated_at)
+    for start in range(0, len(stale), batch_size):
+        batch = stale[start:start + batch_size]
+        changed = set(batch)
+        for prompt_id in batch:
+            scores = matrix.similarities(prompt_id)
+            for related_id in lists.get(prompt_id, {}):
+                holders[related_id].discard(prompt_id)
+            lists[prompt_id] = _top_k(scores, k)
+            for related_id in lists[prompt_id]:
+                holders[related_id].add(prompt_id)
+
+            # 未标记的提示不会重新计算，把新分数合并到它们的列表中
+            for other_id in list(holders[prompt_id]):
+                if other_id not in stale_ids and scores.get(other_id, 0) < MIN_SCORE:
+                    del lists[other_id][prompt_id]
+                    holders[prompt_id].discard(other_id)
+                    changed.add(other_id)
+            for other_id, score in scores.items():
+                if other_id in stale_ids or score < MIN_SCORE:
+                    continue
+                neighbours = lists.setdefault(other_id, {})
+                if (prompt_id not in neighbours and len(neighbours) >= k
+                        and score <= min(neighbours.values())):
+                    continue
+                neighbours[prompt_id] = score
+                holders[prompt_id].add(other_id)
+                if len(neighbours) > k:
+                    dropped = min(neighbours, key=lambda i: (neighbours[i], -i))
+                    del neighbours[dropped]
+                    holders[dropped].discard(other_id)
+                changed.add(other_id)
+
+        _write_lists(lists, sorted(changed))
+        # 只清除计算期间没有再次被标记的提示，不触碰 updated_at
+        db.session.execute(clear_flag, [
+            {'prompt_id': prompt_id, 'generation': generations[prompt_id]}
+            for prompt_id in batch])
+        db.session.commit()
+    return len(stale)
+
+
+def refresh_related(user_ids=None, batch_size=200):
+    """
+    Recompute related prompts for prompts flagged as stale.
+
+    Args:
+        user_ids: Only refresh prompts of these users (all users if None)
+        batch_size (int): Number of stale prompts written per commit
+
+    Returns:
+        int: Number of prompts recomputed
+    """
+    k = current_app.config.get('RELATED_PROMPTS_K', 10)
+    query = db.session.query(Prompt.user_id).filter(
+        Prompt.related_stale.is_(True)).distinct()
+    if user_ids is not None:
+        query = query.filter(Prompt.user_id.in_(list(user_ids)))
+    user_ids = [user_id for (user_id,) in query.all()]
+    return sum(_refresh_user(user_id, k, batch_size) for user_id in user_ids)
+
+
+def get_related(prompt_id, limit=None):
+    """
+    Return the stored related prompts of a prompt.
+
+    Returns:
+        list: ``(id, title, score)`` tuples, most similar first
+    """
+    if limit is None:
+        limit = current_app.config.get('RELATED_PROMPTS_K', 10)
+    return db.session.query(Prompt.id, Prompt.title, PromptRelated.score).join(
+        PromptRelated, PromptRelated.related_id == Prompt.id
+    ).filter(PromptRelated.prompt_id == prompt_id).order_by(
+        PromptRelated.score.desc(), Prompt.id
+    ).limit(limit).all()
+
+
+def _mark_stale(session, prompt_ids):
+    table = Prompt.__table__
+    session.execute(update(table).where(table.c.id.in_(prompt_ids)).values(
+        related_stale=True, related_generation=table.c.related_generation + 1,
+        updated_at=table.c.updated_at))
+
+
+def _before_flush(session, flush_context, instances):
+    users = session.info.setdefault('related_users', set())
+    related = PromptRelated.__table__
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Prompt) and obj not in session.deleted:
+            state = inspect(obj)
+            if obj in session.new or any(
+                    state.attrs[name].history.has_changes()
+                    for name in ('title', 'description', 'content', 'tags')):
+                obj.related_stale = True
+                if obj not in session.new:
+                    obj.related_generation = Prompt.related_generation + 1
+                users.add(obj.user_id)
+        elif isinstance(obj, Tag) and obj.id is not None:
+            if inspect(obj).attrs.name.history.has_changes():
+                _mark_stale(session, select(prompt_tags.c.prompt_id).where(
+                    prompt_tags.c.tag_id == obj.id))
+                users.add(obj.user_id)
+    for obj in session.deleted:
+        if isinstance(obj, Prompt):
+            # 曾把该提示列为相关的提示需要重新计算
+            _mark_stale(session, select(related.c.prompt_id).where(
+                related.c.related_id == obj.id))
+            session.execute(delete(related).where(
+                (related.c.prompt_id == obj.id) | (related.c.related_id == obj.id)))
+            users.add(obj.user_id)
+        elif isinstance(obj, Tag):
+            _mark_stale(session, select(prompt_tags.c.prompt_id).where(
+                prompt_tags.c.tag_id == obj.id))
+            users.add(obj.user_id)
+
+
+def _after_commit(session):
+    users = session.info.pop('related_users', None)
+    if users and has_app_context():
+        g.setdefault('related_users', set()).update(int(u) for u in users)
+
+
+def _after_rollback(session):
+    session.info.pop('related_users', None)
+
+
+def _refresh_after_request(response):
+    # 在请求结束时重新计算本次请求修改过的用户的相关提示
+    user_ids = g.pop('related_users', None)
+    if user_ids and current_app.config.get('RELATED_REFRESH_ON_WRITE', False):
+        try:
+            refresh_related(user_ids)
+        except SQLAlchemyError:
+            db.session.rollback()
+            current_app.logger.exception('Failed to refresh related prompts')
+    return response
+
+
+related_cli = AppGroup('related', help='Related prompts commands.')
+
+
+@related_cli.command('refresh')
+@with_appcontext
+def refresh_command():
+    """Recompute related prompts for prompts that changed."""
+    count = refresh_related()
+    click.echo(f'Recomputed related prompts for {count} prompts.')
+
+
+@related_cli.command('worker')
+@click.option('--interval', type=float, default=30,
+              help='Seconds to wait between refreshes.')
+@with_appcontext
+def worker_command(interval):
+    """Refresh related prompts of changed prompts in a loop."""
+    while True:
+        try:
+            count = refresh_related()
+        except SQLAlchemyError:
+            db.session.rollback()
+            current_app.logger.exception('Failed to refresh related prompts')
+        else:
+            if count:
+                click.echo(f'Recomputed related prompts for {count} prompts.')
+        # 每轮使用新的会话，不保留已加载的对象
+        db.session.remove()
+        time.sleep(interval)
+
+
+@related_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Recompute related prompts for all prompts."""
+    _mark_stale(db.session, select(Prompt.__table__.c.id))
+    db.session.commit()
+    count = refresh_related()
+    click.echo(f'Recomputed related prompts for {count} prompts.')
+
+
+def setup_related(app, db):
+    """
+    Track prompt changes, and refresh related prompts after each request
+    when ``RELATED_REFRESH_ON_WRITE`` is set.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+    """
+    app.cli.add_command(related_cli)
+    app.after_request(_refresh_after_request)
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
@@ -1,94 +1,959 @@
 """
 Search utilities for the PromptVault application.
 This provides enhanced search capabilities using SQLite's FTS5 extension.
+
+Searches go through a pluggable ``SearchBackend`` chosen by the
+``SEARCH_BACKEND`` setting:
+
+- ``fts5``: an SQLite FTS5 virtual table (title, content, description, tag
+  names and category names) kept in sync by triggers and ranked with bm25.
+  The table and its triggers are created by a migration (``flask db
+  upgrade``). With the ``trigram`` tokenizer (SQLite 3.34+) terms match as
+  substrings; one and two character queries are looked up in the index's
+  vocabulary. The ``unicode61`` fallback cannot use the index for
+  single-word queries.
+- ``memory``: an in-process inverted index (see ``app.utils.inverted_index``)
+  for databases without usable text search, such as MySQL.
+- ``like``: the original ``LIKE`` scans.
+
+``auto`` picks ``fts5`` when available and ``memory`` otherwise.
 """
 
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import click
+from flask import abort, current_app, g, has_app_context, has_request_context
+from flask_sqlalchemy import Pagination
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import bindparam, event, false, func, literal, or_, select, text, union_all
+from sqlalchemy.exc import OperationalError
+
 from app import db
-from app.models import Prompt, Category, Tag
-from sqlalchemy import or_
+from app.models import ChangeLog, Prompt, Category, Tag, prompt_categories, prompt_tags
+from app.utils.changes import CHANGE_LOG_WINDOW
+from app.utils.fieldsets import relationship_options
+from app.utils.inverted_index import InvertedIndex
+from app.utils.prompt_filter import PromptFilter
+from app.utils.search_cache import SearchCache
+
+SEARCH_FIELDS = ['title', 'content', 'description', 'categories', 'tags']
+
+FTS_TABLE = 'prompts_fts'
+
+# 从当前数据库状态生成索引行（标签名和分类名以空格拼接）。每列末尾补两个
+# 空格，使列末尾的一两个字符也是某个 trigram 的开头，短查询才能从词表中找到
+_FTS_SELECT_SQL = """
+    INSERT INTO prompts_fts(rowid, title, content, description, tags, categories)
+    SELECT p.id, p.title || '  ', p.content || '  ', COALESCE(p.description, '') || '  ',
+        COALESCE((SELECT group_concat(t.name, ' ') FROM prompt_tags pt
+                  JOIN tags t ON t.id = pt.tag_id
+                  WHERE pt.prompt_id = p.id), '') || '  ',
+        COALESCE((SELECT group_concat(c.name, ' ') FROM prompt_categories pc
+                  JOIN categories c ON c.id = pc.category_id
+                  WHERE pc.prompt_id = p.id), '') || '  '
+    FROM prompts p
+"""
+
+# 重建 ids 所指定提示的索引行，ids 可以是单个值或子查询
+_FTS_REINDEX_SQL = """
+    DELETE FROM prompts_fts WHERE rowid IN ({ids});
+""" + _FTS_SELECT_SQL + """ WHERE p.id IN ({ids});
+"""
+
+
+def _fts_trigger(name, event, ids):
+    return (
+        f'CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN'
+        + _FTS_REINDEX_SQL.format(ids=ids) + 'END'
+    )
+
+
+# trigram 分词支持子串匹配（需要 SQLite 3.34+），unicode61 只支持词前缀匹配
+FTS_TOKENIZERS = {
+    'trigram': 'trigram',
+    'unicode61': 'unicode61 remove_diacritics 2',
+}
 
-def search_prompts(query, fields=None, page=1, per_page=10):
+_FTS_TABLE_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts USING fts5(
+        title, content, description, tags, categories,
+        tokenize = '{tokenize}'
+    )
+"""
+
+# 索引的词表（每个 trigram 或词及其出现的提示数），供短查询按前缀查找
+_FTS_VOCAB_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts_vocab USING fts5vocab(prompts_fts, 'row')
+"""
+
+# 短查询最多展开的 trigram 数；超出时说明这个片段很常见，按 LIKE 扫描更快
+SHORT_QUERY_MAX_TERMS = 64
+
+FTS_DDL = [
+    _fts_trigger('prompts_fts_ai', 'AFTER INSERT ON prompts', 'NEW.id'),
+    _fts_trigger('prompts_fts_au',
+                 'AFTER UPDATE OF title, content, description ON prompts', 'NEW.id'),
     """
-    Search prompts by query string with optional field filtering.
-    
+    CREATE TRIGGER IF NOT EXISTS prompts_fts_ad AFTER DELETE ON prompts BEGIN
+        DELETE FROM prompts_fts WHERE rowid = OLD.id;
+    END
+    """,
+    _fts_trigger('prompt_tags_fts_ai', 'AFTER INSERT ON prompt_tags', 'NEW.prompt_id'),
+    _fts_trigger('prompt_tags_fts_ad', 'AFTER DELETE ON prompt_tags', 'OLD.prompt_id'),
+    _fts_trigger('prompt_categories_fts_ai', 'AFTER INSERT ON prompt_categories',
+                 'NEW.prompt_id'),
+    _fts_trigger('prompt_categories_fts_ad', 'AFTER DELETE ON prompt_categories',
+                 'OLD.prompt_id'),
+    # 标签/分类改名时，重建所有引用它的提示
+    _fts_trigger('tags_fts_au', 'AFTER UPDATE OF name ON tags',
+                 'SELECT prompt_id FROM prompt_tags WHERE tag_id = NEW.id'),
+    _fts_trigger('categories_fts_au', 'AFTER UPDATE OF name ON categories',
+                 'SELECT prompt_id FROM prompt_categories WHERE category_id = NEW.id'),
+]
+
+# 批量插入时暂停的触发器，插入完成后统一建立索引
+_FTS_INSERT_TRIGGERS = {
+    name: statement
+    for name in ('prompts_fts_ai', 'prompt_tags_fts_ai', 'prompt_categories_fts_ai')
+    for statement in FTS_DDL if f'EXISTS {name} ' in statement
+}
+
+FTS_TRIGGERS = [
+    'prompts_fts_ai', 'prompts_fts_au', 'prompts_fts_ad',
+    'prompt_tags_fts_ai', 'prompt_tags_fts_ad',
+    'prompt_categories_fts_ai', 'prompt_categories_fts_ad',
+    'tags_fts_au', 'categories_fts_au',
+]
+
+
+class SearchBackend:
+    """
+    Base class for search backends.
+
+    A backend turns a text query into a filter (and ordering) on a ``Prompt``
+    query, so it can be combined with any other filters the caller applies.
+    """
+
+    name = None
+    # 是否需要通过会话事件接收提示的变更通知
+    tracks_changes = False
+
+    def init_app(self, app, db):
+        """Prepare the backend. Return False if it cannot be used."""
+        return True
+
+    def apply(self, base_query, query, fields=None):
+        """Filter and order ``base_query`` by the text query."""
+        raise NotImplementedError
+
+    def rebuild(self):
+        """Rebuild the backend's index, returning the number of indexed prompts."""
+        return 0
+
+    def notify_changed(self, prompt_ids):
+        """Called after a commit that touched the given prompts."""
+
+    @contextmanager
+    def bulk_insert(self, session):
+        """
+        Wrap inserting many prompts in the session's current transaction.
+
+        Yields a list the caller fills with the ids of the new prompts, so a
+        backend can index them in one pass when the block exits.
+        """
+        yield []
+
+    def stats(self):
+        """Return backend specific statistics."""
+        return {}
+
+
+class LikeSearchBackend(SearchBackend):
+    """Search with ``LIKE`` scans; works everywhere but scans every row."""
+
+    name = 'like'
+
+    def apply(self, base_query, query, fields=None):
+        return base_query.filter(like_search_filter(query, fields)).order_by(
+            Prompt.created_at.desc()
+        )
+
+
+class FTS5SearchBackend(SearchBackend):
+    """Search with the SQLite FTS5 index, ranked with bm25."""
+
+    name = 'fts5'
+
+    def __init__(self):
+        self.tokenizer = None
+
+    def init_app(self, app, db):
+        self.tokenizer = setup_fts(app, db)
+        return self.tokenizer is not None
+
+    def apply(self, base_query, query, fields=None):
+        # 索引只预筛选候选行并排序，整个查询的子串匹配由 LIKE 校验
+        base_query = base_query.filter(like_search_filter(query, fields))
+        fts = fts_rank_subquery(query, fields, trigram=self.tokenizer == 'trigram')
+        if fts is None:
+            return base_query.order_by(Prompt.created_at.desc())
+        return base_query.join(fts, fts.c.prompt_id == Prompt.id).order_by(
+            fts.c.rank, Prompt.created_at.desc()
+        )
+
+    @contextmanager
+    def bulk_insert(self, session):
+        # 每插入一条标签/分类关联，触发器都会重建一次整行索引；批量插入时
+        # 在事务内暂停插入触发器，最后用一条语句为新提示建立索引。SQLite 的
+        # DDL 是事务性的：其他连接看不到触发器被删除，回滚时触发器也会恢复
+        dbapi_connection = session.connection().connection
+        if not dbapi_connection.in_transaction:
+            # sqlite3 驱动只在 DML 之前隐式开启事务，DDL 必须在事务内执行
+            session.execute(text('BEGIN'))
+        for trigger in _FTS_INSERT_TRIGGERS:
+            session.execute(text(f'DROP TRIGGER IF EXISTS {trigger}'))
+        prompt_ids = []
+        yield prompt_ids
+        if prompt_ids:
+            session.execute(
+                text(_FTS_SELECT_SQL + ' WHERE p.id IN :ids').bindparams(
+                    bindparam('ids', expanding=True)),
+                {'ids': prompt_ids})
+        for statement in _FTS_INSERT_TRIGGERS.values():
+            session.execute(text(statement))
+
+    def rebuild(self):
+        # 按当前配置的分词器重建，切换 SEARCH_FTS_TOKENIZER 后用它生效
+        with db.get_engine().begin() as connection:
+            tokenizer = choose_tokenizer(
+                connection, current_app.config.get('SEARCH_FTS_TOKENIZER', 'trigram'))
+            rebuild_fts(connection, tokenizer)
+            self.tokenizer = tokenizer
+            return connection.execute(text(f'SELECT count(*) FROM {FTS_TABLE}')).scalar()
+
+
+class MemorySearchBackend(SearchBackend):
+    """
+    Search with an in-process inverted index.
+
+    The index is built lazily on the first search; while one request builds
+    it, concurrent searches fall back to ``LIKE`` instead of building it
+    again. Commits made through this process are applied incrementally before
+    the next search. Changes made by other worker processes are read from the
+    change log (see ``app.utils.changes``) every
+    ``SEARCH_INDEX_REFRESH_SECONDS``, deletions included. The last
+    ``CHANGE_LOG_WINDOW`` entries are read again each time, so an entry that
+    commits after a larger id is not skipped. A full rebuild only happens
+    when the entries the index needs have been pruned.
+    """
+
+    name = 'memory'
+    tracks_changes = True
+    batch_size = 500
+
+    def __init__(self):
+        self.index = InvertedIndex(SEARCH_FIELDS)
+        self.refresh_interval = 30
+        self._built = False
+        self._pending = set()
+        # 索引已应用到的日志 id，以及窗口内已应用的日志 id
+        self._cursor = 0
+        self._applied = set()
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        # 同一时间只有一个线程更新或重建索引
+        self._sync_lock = threading.Lock()
+
+    def init_app(self, app, db):
+        self.refresh_interval = app.config.get('SEARCH_INDEX_REFRESH_SECONDS', 30)
+        return True
+
+    def notify_changed(self, prompt_ids):
+        with self._lock:
+            self._pending.update(prompt_ids)
+
+    def apply(self, base_query, query, fields=None):
+        ids = None
+        if self._sync():
+            ids = self.index.search(query, normalize_fields(fields))
+        if ids is not None:
+            if not ids:
+                return base_query.filter(false()).order_by(Prompt.created_at.desc())
+            base_query = base_query.filter(_prompt_id_in(ids))
+        # 索引只筛选候选提示，最终的子串匹配仍由 LIKE 在候选行上校验
+        return base_query.filter(like_search_filter(query, fields)).order_by(
+            Prompt.created_at.desc()
+        )
+
+    def rebuild(self):
+        index = InvertedIndex(SEARCH_FIELDS)
+        last_id = 0
+        started_at = time.monotonic()
+        with self._lock:
+            self._pending.clear()
+        # 先读取日志位置再加载提示，之后提交的变更在下次同步时应用
+        head = db.session.query(func.max(ChangeLog.id)).scalar() or 0
+        applied = self._read_log(head - CHANGE_LOG_WINDOW)
+        while True:
+            prompts = Prompt.query.options(*relationship_options()).filter(
+                Prompt.id > last_id).order_by(Prompt.id).limit(self.batch_size).all()
+            if not prompts:
+                break
+            for prompt in prompts:
+                index.add(prompt.id, prompt.search_fields())
+            last_id = prompts[-1].id
+        self.index = index
+        self._cursor, self._applied = 0, set()
+        self._set_cursor([log_id for log_id, _ in applied])
+        self._refreshed_at = started_at
+        self._built = True
+        return len(index)
+
+    def _sync(self):
+        """Bring the index up to date; return False if it is not built yet."""
+        if not self._built:
+            if not self._sync_lock.acquire(blocking=False):
+                # 其他线程正在建立索引，这次搜索退回 LIKE 扫描
+                return False
+            try:
+                if not self._built:
+                    self.rebuild()
+            finally:
+                self._sync_lock.release()
+            return True
+        with self._sync_lock:
+            if time.monotonic() - self._refreshed_at >= self.refresh_interval:
+                self._catch_up()
+            with self._lock:
+                pending, self._pending = self._pending, set()
+            if pending:
+                self._reindex(pending)
+        return True
+
+    def _read_log(self, floor):
+        """Return ``(log id, prompt id or None)`` of the change log entries after ``floor``."""
+        log = ChangeLog.__table__
+        rows = db.session.execute(select(log.c.id, log.c.entity, log.c.entity_id).where(
+            log.c.id > floor).order_by(log.c.id))
+        return [(log_id, entity_id if entity == 'prompt' else None)
+                for log_id, entity, entity_id in rows]
+
+    def _set_cursor(self, log_ids):
+        if log_ids:
+            self._cursor = max(self._cursor, max(log_ids))
+        floor = self._cursor - CHANGE_LOG_WINDOW
+        self._applied = {log_id for log_id in self._applied | set(log_ids) if log_id > floor}
+
+    def _reindex(self, prompt_ids):
+        found = set()
+        ids = sorted(prompt_ids)
+        for start in range(0, len(ids), self.batch_size):
+            chunk = ids[start:start + self.batch_size]
+            for prompt in Prompt.query.options(*relationship_options()).filter(
+                    Prompt.id.in_(chunk)):
+                self.index.add(prompt.id, prompt.search_fields())
+                found.add(prompt.id)
+        for prompt_id in prompt_ids - found:
+            self.index.remove(prompt_id)
+
+    def _catch_up(self):
+        """Pick up changes committed by other processes since the last refresh."""
+        self._refreshed_at = time.monotonic()
+        oldest = db.session.query(func.min(ChangeLog.id)).scalar()
+        if oldest is not None and oldest > self._cursor + 1:
+            # 需要的日志已被清理，无法增量更新
+            self.rebuild()
+            return
+        # 标签/分类改名或删除时，日志也为使用它的提示各记录了一条更新
+        entries = [(log_id, prompt_id) for log_id, prompt_id
+                   in self._read_log(self._cursor - CHANGE_LOG_WINDOW)
+                   if log_id not in self._applied]
+        self.notify_changed({prompt_id for _, prompt_id in entries if prompt_id is not None})
+        self._set_cursor([log_id for log_id, _ in entries])
+
+    def stats(self):
+        """Return size statistics for the in-memory index."""
+        return self.index.stats()
+
+
+SEARCH_BACKENDS = {
+    'like': LikeSearchBackend,
+    'fts5': FTS5SearchBackend,
+    'memory': MemorySearchBackend,
+}
+
+
+def _prompt_id_in(ids):
+    # 整数 ID 直接渲染进 SQL，避免大结果集超出数据库的绑定参数数量限制
+    return Prompt.id.in_(bindparam(
+        'search_ids', value=sorted(ids), expanding=True, literal_execute=True))
+
+
+def get_search_backend():
+    """Return the search backend configured for the current application."""
+    backend = None
+    if has_app_context():
+        backend = current_app.extensions.get('search_backend')
+    return backend or LikeSearchBackend()
+
+
+def get_search_cache():
+    """Return the search result cache, or None if caching is disabled."""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('search_cache')
+
+
+def get_search_stats():
+    """Return search backend and cache statistics for this worker process."""
+    backend = get_search_backend()
+    cache = get_search_cache()
+    return {
+        'pid': os.getpid(),
+        'backend': backend.name,
+        'index': backend.stats(),
+        'cache': cache.stats() if cache is not None else None,
+    }
+
+
+def fts_enabled():
+    """Return True when the FTS5 index is set up for the current application."""
+    return get_search_backend().name == 'fts5'
+
+
+def _changed_prompt_ids(session):
+    return session.info.setdefault('search_changed_prompts', set())
+
+
+def _changed_user_ids(session):
+    return session.info.setdefault('search_changed_users', set())
+
+
+def _before_flush(session, flush_context, instances):
+    # 标签/分类被改名或删除时，关联的提示需要重新索引
+    if not has_app_context() or not get_search_backend().tracks_changes:
+        return
+    changed = _changed_prompt_ids(session)
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Tag, Category)):
+            changed.update(p.id for p in obj.prompts if p.id is not None)
+
+
+def _after_flush(session, flush_context):
+    changed = _changed_prompt_ids(session)
+    users = _changed_user_ids(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Prompt, Tag, Category)) and obj.user_id is not None:
+            users.add(int(obj.user_id))
+        if isinstance(obj, Prompt) and obj.id is not None:
+            changed.add(obj.id)
+
+
+def _after_commit(session):
+    changed = session.info.pop('search_changed_prompts', None)
+    users = session.info.pop('search_changed_users', None)
+    if not has_app_context():
+        return
+    if users:
+        cache = get_search_cache()
+        if cache is not None:
+            cache.bump(users)
+    backend = get_search_backend()
+    if changed and backend.tracks_changes:
+        backend.notify_changed(changed)
+
+
+def _after_rollback(session):
+    session.info.pop('search_changed_prompts', None)
+    session.info.pop('search_changed_users', None)
+
+
+def _register_session_events(db):
+    """Track prompt, tag and category changes on the session (once per process)."""
+    if event.contains(db.session, 'after_commit', _after_commit):
+        return
+    event.listen(db.session, 'before_flush', _before_flush)
+    event.listen(db.session, 'after_flush', _after_flush)
+    event.listen(db.session, 'after_commit', _after_commit)
+    event.listen(db.session, 'after_rollback', _after_rollback)
+
+
+def normalize_fields(fields):
+    """
+    Normalize a ``fields`` argument into a list of known search fields.
+
+    Accepts a list, a comma separated string or ``'all'``/``None``.
+    """
+    if not fields or fields == 'all':
+        return list(SEARCH_FIELDS)
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    fields = [f.strip() for f in fields if f.strip() in SEARCH_FIELDS]
+    return fields or list(SEARCH_FIELDS)
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def build_match_expression(terms, fields=None, prefix=True, any_term=False):
+    """
+    Build an FTS5 MATCH expression from query terms.
+
+    Every term becomes a quoted string, so the user's input can never be
+    interpreted as FTS5 syntax. Terms are ANDed, or ORed with ``any_term``.
+    With ``prefix`` each term is a prefix query (for the unicode61
+    tokenizer); without it, a trigram index matches each term as a substring.
+
     Args:
-        query (str): The search query string
-        fields (list): List of fields to search in. Default is all searchable fields.
-        page (int): Page number for pagination
-        per_page (int): Items per page
-        
+        terms (list): The search terms
+        fields (list): Search fields to restrict the match to
+        prefix (bool): Whether to match terms as word prefixes
+        any_term (bool): Whether one matching term is enough
+
     Returns:
-        Pagination object with search results
+        str: The MATCH expression, or None if there are no terms
     """
-    if not query:
-        return Prompt.query.order_by(Prompt.created_at.desc()).paginate(
-            page=page, per_page=per_page)
-    
-    # Clean and normalize the search query
-    query = query.strip()
-    
-    # Default to all fields if none specified
-    if not fields:
-        fields = ['title', 'content', 'description', 'categories', 'tags']
-    
-    # Base query
-    base_query = Prompt.query
-    
-    # Build search filter based on requested fields
+    suffix = '*' if prefix else ''
+    terms = ['"{}"{}'.format(term.replace('"', '""'), suffix) for term in terms]
+    if not terms:
+        return None
+
+    expression = (' OR ' if any_term else ' ').join(terms)
+    fields = normalize_fields(fields)
+    if len(fields) < len(SEARCH_FIELDS):
+        # FTS5 列名与搜索字段同名
+        columns = ' '.join(fields)
+        expression = '{%s} : (%s)' % (columns, expression)
+    return expression
+
+
+def short_query_trigrams(query, max_docs):
+    """
+    Look up the indexed trigrams that start with a one or two character query.
+
+    Every occurrence of the query starts one of these trigrams (the indexed
+    columns are padded with two spaces), so ORing them finds every candidate.
+    Returns None when the query is too common for that to beat a ``LIKE``
+    scan: more than ``SHORT_QUERY_MAX_TERMS`` trigrams, or more than
+    ``max_docs`` matching prompts summed over them.
+    """
+    # trigram 分词器不区分大小写，词表中的词都是小写
+    low = query.lower()
+    # 同一请求内（结果和分面各查一次）只读一次词表
+    lookups = g.setdefault('short_query_trigrams', {}) if has_request_context() else {}
+    if (low, max_docs) not in lookups:
+        rows = db.session.execute(text(
+            'SELECT term, doc FROM prompts_fts_vocab WHERE term >= :low AND term < :high '
+            'LIMIT :limit'
+        ), {'low': low, 'high': low + '\U0010ffff', 'limit': SHORT_QUERY_MAX_TERMS + 1}).all()
+        too_common = (len(rows) > SHORT_QUERY_MAX_TERMS
+                      or sum(doc for _, doc in rows) > max_docs)
+        lookups[low, max_docs] = None if too_common else [term for term, _ in rows]
+    return lookups[low, max_docs]
+
+
+def fts_rank_subquery(query, fields=None, trigram=False):
+    """
+    Return a subquery of ``(prompt_id, rank)`` candidates for the query.
+
+    Lower rank is better (bm25 returns negative scores for better matches).
+    The candidates are a superset of the prompts containing the whole query;
+    callers verify them with ``like_search_filter``. With a trigram index the
+    whole query is looked up as one phrase of trigrams. Queries of one or two
+    characters are looked up as the trigrams starting with them (see
+    ``short_query_trigrams``), unless they are too common.
+
+    With word tokens (unicode61) only the terms after the first can be looked
+    up, as word prefixes: the first term may start inside a word. A query of
+    a single word therefore never uses the index.
+
+    Returns None when the index cannot narrow the search; the caller then
+    scans with ``LIKE``.
+    """
+    any_term = False
+    if not trigram:
+        terms = query.split()[1:]
+    elif len(query) >= 3:
+        terms = [query]
+    else:
+        terms = short_query_trigrams(
+            query, current_app.config.get('SEARCH_SHORT_QUERY_MAX_DOCS', 2000))
+        if terms == []:
+            # 没有以这个片段开头的 trigram，不会有提示匹配
+            return text(
+                'SELECT rowid AS prompt_id, 0.0 AS rank FROM prompts_fts WHERE 0'
+            ).columns(prompt_id=db.Integer, rank=db.Float).subquery('fts')
+        any_term = True
+    if not terms:
+        return None
+
+    match = build_match_expression(terms, fields, prefix=not trigram, any_term=any_term)
+    return text(
+        'SELECT rowid AS prompt_id, bm25(prompts_fts) AS rank '
+        'FROM prompts_fts WHERE prompts_fts MATCH :match'
+    ).bindparams(match=match).columns(
+        prompt_id=db.Integer, rank=db.Float
+    ).subquery('fts')
+
+
+def like_search_filter(query, fields=None):
+    """
+    Build the ``LIKE`` filter that decides whether a prompt matches.
+
+    The whole query must appear as one contiguous substring of one of the
+    searched fields (a tag or category name counts as a field of its own).
+    """
+    fields = normalize_fields(fields)
+    pattern = f'%{_escape_like(query)}%'
     filters = []
-    
+
     if 'title' in fields:
-        filters.append(Prompt.title.ilike(f'%{query}%'))
-        
+        filters.append(Prompt.title.ilike(pattern, escape='\\'))
+
     if 'content' in fields:
-        filters.append(Prompt.content.ilike(f'%{query}%'))
-        
+        filters.append(Prompt.content.ilike(pattern, escape='\\'))
+
     if 'description' in fields:
-        filters.append(Prompt.description.ilike(f'%{query}%'))
-    
+        filters.append(Prompt.description.ilike(pattern, escape='\\'))
+
     # Add category and tag filtering if requested
     if 'categories' in fields:
         filters.append(
-            Prompt.categories.any(Category.name.ilike(f'%{query}%'))
+            Prompt.categories.any(Category.name.ilike(pattern, escape='\\'))
         )
-    
+
     if 'tags' in fields:
         filters.append(
-            Prompt.tags.any(Tag.name.ilike(f'%{query}%'))
+            Prompt.tags.any(Tag.name.ilike(pattern, escape='\\'))
         )
-    
+
     # Combine all filters with OR
-    search_filter = or_(*filters)
-    
-    # Execute search query with pagination
-    return base_query.filter(search_filter).order_by(
-        Prompt.created_at.desc()
-    ).paginate(page=page, per_page=per_page)
+    return or_(*filters)
+
+
+def apply_search(base_query, query, fields=None):
+    """
+    Apply a text search and result ordering to a ``Prompt`` query.
+
+    The configured search backend decides how the query is matched and
+    ranked. Results without a query are ordered newest first.
+
+    Args:
+        base_query: A ``Prompt.query`` based query, possibly already filtered
+        query (str): The search query string
+        fields (list): List of fields to search in. Default is all fields.
+
+    Returns:
+        The filtered and ordered query
+    """
+    query = (query or '').strip()
+    if not query:
+        return base_query.order_by(Prompt.created_at.desc())
+
+    return get_search_backend().apply(base_query, query, fields)
+
+
+def paginate_ids(ids, page, per_page, error_out=True, options=()):
+    """
+    Paginate an ordered list of prompt ids.
+
+    Loads only the prompts of the requested page and keeps the order of
+    ``ids``. Mirrors ``Query.paginate`` and aborts with 404 for pages past
+    the end when ``error_out`` is set. ``options`` are loader options for
+    the page's prompts.
+    """
+    if error_out and page < 1:
+        abort(404)
+    start = (page - 1) * per_page
+    page_ids = list(ids[start:start + per_page])
+    if error_out and page > 1 and not page_ids:
+        abort(404)
+
+    prompts = {}
+    if page_ids:
+        prompts = {p.id: p for p in Prompt.query.options(*options).filter(
+            Prompt.id.in_(page_ids))}
+    items = [prompts[i] for i in page_ids if i in prompts]
+    return Pagination(None, page, per_page, len(ids), items)
+
+
+def search_prompts(query, fields=None, page=1, per_page=10, user_id=None,
+                   prompt_filter=None, options=()):
+    """
+    Search prompts by query string with optional field filtering.
+
+    Result id lists are served from the search cache when it is enabled.
+
+    Args:
+        query (str): The search query string
+        fields (list): List of fields to search in. Default is all searchable fields.
+        page (int): Page number for pagination
+        per_page (int): Items per page
+        user_id (int): Restrict results to prompts owned by this user
+        prompt_filter (PromptFilter): Owner, tag and category filters; takes
+            the place of ``user_id`` when given
+        options: Loader options for the returned prompts (e.g. ``load_only``)
+
+    Returns:
+        Pagination object with search results
+    """
+    fields = normalize_fields(fields)
+    if prompt_filter is None:
+        prompt_filter = PromptFilter(user_id=user_id)
+    base_query = prompt_filter.apply(Prompt.query)
+
+    query = (query or '').strip()
+    cache = get_search_cache()
+    if not query or cache is None:
+        # Execute search query with pagination
+        return apply_search(base_query, query, fields).options(*options).paginate(
+            page=page, per_page=per_page)
+
+    key = cache.make_key(prompt_filter.user_id, query, fields,
+                         prompt_filter.cache_filters())
+    ids = cache.get(key)
+    if ids is None:
+        # 在查询之前读取代数：查询期间提交的写入会使这次结果不被缓存
+        generation = cache.generation(prompt_filter.user_id)
+        ids = [row[0] for row in
+               apply_search(base_query, query, fields).with_entities(Prompt.id)]
+        cache.set(key, ids, generation)
+    return paginate_ids(ids, page, per_page, options=options)
+
+
+def _facet_select(kind, model, link_table, link_column, result_ids):
+    return select(
+        literal(kind).label('kind'), model.id, model.name, func.count().label('count')
+    ).select_from(link_table).join(model, model.id == link_column).where(
+        link_table.c.prompt_id.in_(select(result_ids.c.id))
+    ).group_by(model.id, model.name)
+
+
+def search_facets(query, fields=None, user_id=None, prompt_filter=None):
+    """
+    Count the search results per tag and per category.
+
+    Both facets come from a single grouped query over ``prompt_tags`` and
+    ``prompt_categories`` restricted to the matching prompt ids, and are
+    cached alongside the result ids.
+
+    Args:
+        query (str): The search query string; empty counts all prompts
+        fields (list): List of fields to search in. Default is all fields.
+        user_id (int): Restrict results to prompts owned by this user
+        prompt_filter (PromptFilter): Owner, tag and category filters; takes
+            the place of ``user_id`` when given
+
+    Returns:
+        dict: ``{'tags': [...], 'categories': [...]}`` with ``id``, ``name``
+        and ``count`` for every facet value that has results, most results
+        first
+    """
+    fields = normalize_fields(fields)
+    if prompt_filter is None:
+        prompt_filter = PromptFilter(user_id=user_id)
+    query = (query or '').strip()
+    cache = get_search_cache()
+    key = None
+    rows = None
+    if cache is not None:
+        key = cache.make_key(prompt_filter.user_id, query, fields,
+                             dict(prompt_filter.cache_filters(), facets=True))
+        rows = cache.get(key)
+        generation = cache.generation(prompt_filter.user_id)
+
+    if rows is None:
+        result_ids = apply_search(
+            prompt_filter.apply(Prompt.query), query, fields
+        ).with_entities(Prompt.id).order_by(None).subquery()
+        statement = union_all(
+            _facet_select('tags', Tag, prompt_tags, prompt_tags.c.tag_id, result_ids),
+            _facet_select('categories', Category, prompt_categories,
+                          prompt_categories.c.category_id, result_ids),
+        )
+        rows = [tuple(row) for row in db.session.execute(statement)]
+        if cache is not None:
+            cache.set(key, rows, generation)
+
+    facets = {'tags': [], 'categories': []}
+    for kind, facet_id, name, count in rows:
+        facets[kind].append({'id': facet_id, 'name': name, 'count': count})
+    for values in facets.values():
+        values.sort(key=lambda f: (-f['count'], f['name'].lower()))
+    return facets
+
+
+def fts5_supported(connection, tokenizer='unicode61'):
+    """Check whether the SQLite library supports FTS5 with the given tokenizer."""
+    try:
+        connection.execute(text(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe '
+            f"USING fts5(x, tokenize = '{FTS_TOKENIZERS[tokenizer]}')"))
+        connection.execute(text('DROP TABLE IF EXISTS temp._fts5_probe'))
+        return True
+    except OperationalError as e:
+        # 只有缺少 FTS5 模块或分词器算作不可用；数据库被锁等其他错误直接抛出，
+        # 避免个别 worker 悄悄退回到另一种搜索后端
+        if 'no such module' in str(e.orig) or 'no such tokenizer' in str(e.orig):
+            return False
+        raise
+
+
+def fts_tokenizer(connection):
+    """Return the tokenizer of the existing FTS5 table, or None."""
+    sql = connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {'name': FTS_TABLE}).scalar()
+    if sql is None:
+        return None
+    return 'trigram' if "'trigram'" in sql else 'unicode61'
+
+
+def choose_tokenizer(connection, tokenizer):
+    """Return ``tokenizer`` if this SQLite supports it, else ``unicode61``."""
+    if tokenizer in FTS_TOKENIZERS and fts5_supported(connection, tokenizer):
+        return tokenizer
+    return 'unicode61'
+
+
+def drop_fts(connection):
+    """Drop the FTS5 table, its vocabulary table and its sync triggers."""
+    for trigger in FTS_TRIGGERS:
+        connection.execute(text(f'DROP TRIGGER IF EXISTS {trigger}'))
+    connection.execute(text(f'DROP TABLE IF EXISTS {FTS_TABLE}_vocab'))
+    connection.execute(text(f'DROP TABLE IF EXISTS {FTS_TABLE}'))
+
+
+def create_fts(connection, tokenizer='unicode61'):
+    """
+    Create the FTS5 table, its vocabulary table and sync triggers,
+    populating a new table.
+
+    An existing table built with a different tokenizer is rebuilt.
+    """
+    existing = fts_tokenizer(connection)
+    if existing is not None and existing != tokenizer:
+        drop_fts(connection)
+        existing = None
+    connection.execute(text(_FTS_TABLE_SQL.format(tokenize=FTS_TOKENIZERS[tokenizer])))
+    connection.execute(text(_FTS_VOCAB_SQL))
+    for statement in FTS_DDL:
+        connection.execute(text(statement))
+    if existing is None:
+        connection.execute(text(_FTS_SELECT_SQL))
+
+
+def rebuild_fts(connection, tokenizer='unicode61'):
+    """Drop and rebuild the FTS5 index from the current database contents."""
+    drop_fts(connection)
+    create_fts(connection, tokenizer)
+    connection.execute(text(
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+
+
+search_cli = AppGroup('search', help='Search index commands.')
+
+
+@search_cli.command('rebuild')
+@with_appcontext
+def rebuild_command():
+    """Rebuild the search index from the database."""
+    backend = get_search_backend()
+    if backend.name == 'like':
+        click.echo('The like search backend has no index to rebuild.')
+        return
+    count = backend.rebuild()
+    click.echo(f'Rebuilt {backend.name} search index with {count} prompts.')
 
 
 def setup_fts(app, db):
     """
-    Set up full-text search capabilities.
-    
-    Note: This is a placeholder for future implementation using SQLite's FTS5.
-    In a production environment, consider using a dedicated search solution like
-    Elasticsearch for more advanced search capabilities.
-    
+    Check that the FTS5 search index can be used.
+
+    The table and its sync triggers are created by a migration and rebuilt
+    with ``flask search rebuild``; nothing is written at startup. When the
+    index was built with another tokenizer than ``SEARCH_FTS_TOKENIZER``, it
+    keeps being used until it is rebuilt. A unicode61 index is reported with
+    a warning, since it cannot serve single-word queries.
+
     Args:
         app: Flask application instance
         db: SQLAlchemy database instance
+
+    Returns:
+        str: The tokenizer of the FTS5 index, or None if unavailable
     """
     with app.app_context():
-        try:
-            # Check if SQLite supports FTS5
-            db.session.execute('SELECT sqlite_version()')
-            db.session.execute('SELECT fts5()')
-            app.logger.info("SQLite FTS5 extension is available")
-            
-            # Here we would create virtual tables for FTS5
-            # This is just a placeholder - implementation would depend on
-            # specific requirements and database schema
-            
-        except Exception as e:
-            app.logger.warning(f"Full-text search setup failed: {str(e)}")
-            app.logger.info("Falling back to basic search functionality")
+        engine = db.get_engine()
+        if engine.dialect.name != 'sqlite':
+            app.logger.info("Full-text search requires SQLite")
+            return None
+        with engine.connect() as connection:
+            if not fts5_supported(connection):
+                app.logger.warning("SQLite FTS5 extension is not available")
+                return None
+            tokenizer = fts_tokenizer(connection)
+            configured = choose_tokenizer(
+                connection, app.config.get('SEARCH_FTS_TOKENIZER', 'trigram'))
+        if tokenizer is None:
+            app.logger.warning("Search index not found, run flask db upgrade")
+            return None
+        if configured != tokenizer:
+            app.logger.warning(f"Search index uses the {tokenizer} tokenizer, "
+                               f"run flask search rebuild to switch to {configured}")
+        if tokenizer == 'unicode61':
+            app.logger.warning("Search index uses the unicode61 tokenizer: "
+                               "single-word queries scan every prompt")
+        app.logger.info(f"SQLite FTS5 search index is ready ({tokenizer})")
+        return tokenizer
+
+
+def setup_search(app, db):
+    """
+    Choose and initialize the search backend for the application.
+
+    Uses the ``SEARCH_BACKEND`` setting (``auto``, ``fts5``, ``memory`` or
+    ``like``) and registers the ``flask search`` commands. A backend that
+    cannot be initialized falls back to ``like``.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+    """
+    app.cli.add_command(search_cli)
+
+    name = app.config.get('SEARCH_BACKEND', 'auto')
+    candidates = ['fts5', 'memory'] if name == 'auto' else [name]
+
+    backend = None
+    for candidate in candidates:
+        backend_class = SEARCH_BACKENDS.get(candidate)
+        if backend_class is None:
+            app.logger.warning(f"Unknown search backend: {candidate}")
+            continue
+        instance = backend_class()
+        if instance.init_app(app, db):
+            backend = instance
+            break
+
+    if backend is None:
+        app.logger.info("Falling back to basic search functionality")
+        backend = LikeSearchBackend()
+    app.extensions['search_backend'] = backend
+
+    cache_size = app.config.get('SEARCH_CACHE_SIZE', 1024)
+    if cache_size:
+        app.extensions['search_cache'] = SearchCache(
+            max_entries=cache_size,
+            ttl=app.config.get('SEARCH_CACHE_TTL', 60),
+            max_results=app.config.get('SEARCH_CACHE_MAX_RESULTS', 5000)
+        )
+    else:
+        app.extensions.pop('search_cache', None)
+
+    _register_session_events(db)
+    return backend
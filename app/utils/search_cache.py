@@ -0,0 +1,117 @@
+"""
+Search result cache for the PromptVault application.
+
+Caches the ordered list of matching prompt ids for a search, keyed by
+(user, normalized query, fields, filters). Each user has a generation
+counter that is bumped whenever one of their prompts, tags or categories is
+written; entries from an older generation are treated as misses, so
+invalidation is O(1) and never has to find the affected keys.
+
+Generations live in process memory, so writes made by another worker are
+only seen once an entry's TTL expires.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# 不区分用户的全局搜索（如首页）使用的作用域
+GLOBAL_SCOPE = None
+
+
+def normalize_query(query):
+    """Normalize a search query for use in a cache key."""
+    return ' '.join((query or '').split()).lower()
+
+
+class SearchCache:
+    """A bounded LRU cache of search result id lists."""
+
+    def __init__(self, max_entries=1024, ttl=60, max_results=5000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_results = max_results
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(user_id, query, fields, filters=None):
+        """Build a cache key from the search parameters."""
+        return (
+            user_id,
+            normalize_query(query),
+            tuple(sorted(fields)),
+            tuple(sorted((filters or {}).items())),
+        )
+
+    def generation(self, user_id):
+        """Return the current generation of a user's data."""
+        return self._generations.get(user_id, 0)
+
+    def bump(self, user_ids):
+        """Invalidate cached results for the given users (and global searches)."""
+        with self._lock:
+            for user_id in set(user_ids) | {GLOBAL_SCOPE}:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def get(self, key):
+        """Return the cached id list for a key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            generation, expires_at, ids = entry
+            if generation != self.generation(key[0]) or expires_at <= time.monotonic():
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return ids
+
+    def set(self, key, ids, generation):
+        """
+        Store an id list; lists longer than ``max_results`` are not cached.
+
+        Args:
+            key: Key from ``make_key``
+            ids: The result ids
+            generation: ``generation(user)`` read before the results were
+                computed; if a write has bumped it since, the results may
+                predate that write and are not stored
+        """
+        if len(ids) > self.max_results:
+            return
+        with self._lock:
+            if generation != self.generation(key[0]):
+                return
+            self._entries[key] = (generation, time.monotonic() + self.ttl, tuple(ids))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss statistics for sizing the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,346 @@
+"""
+Fast serialization of prompts for the JSON API.
+
+``PromptSchema`` (marshmallow) walks ORM objects field by field, which
+dominates the cost of large pages. ``PromptSerializer`` builds the same
+dictionaries from plain row tuples instead:
+
+- the page query selects only the columns of the fieldset
+  (``PromptSerializer.columns``), with no ORM objects or eager loads
+- tags and categories come from the ``Prompt.labels`` snapshot in the same
+  row (see ``app.utils.label_snapshot``); prompts without a snapshot fall
+  back to one query per relationship for the whole page
+- each prompt is assembled from a column plan built once per fieldset
+
+``flask serializer check`` verifies that both paths produce byte-identical
+JSON for every prompt; ``flask serializer bench`` reports the cost per item.
+
+``JSON_PROVIDER = 'orjson'`` additionally switches Flask's JSON encoding to
+orjson when it is installed. Its output is equivalent but not byte-identical
+(it does not escape non-ASCII characters).
+"""
+
+import json
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+
+from app.extensions import db
+from app.models import Category, Prompt, Tag, prompt_categories, prompt_tags
+from app.utils.fieldsets import PROMPT_FIELDS, relationship_options
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+_DATETIME_FIELDS = ('created_at', 'updated_at')
+# 与 TagSchema / CategorySchema 的字段一致
+_LINKS = {
+    'categories': (prompt_categories, prompt_categories.c.category_id, Category,
+                   ('id', 'name', 'description')),
+    'tags': (prompt_tags, prompt_tags.c.tag_id, Tag, ('id', 'name')),
+}
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _compile(fields, columns):
+    """Build ``(row, links) -> dict`` for a fieldset; ``columns`` is the row layout."""
+    # (字段名, 列下标, 类型)；关联字段按 id（第 0 列）查找
+    plan = []
+    for name in fields:
+        if name in _LINKS:
+            plan.append((name, 0, 'link'))
+        elif name in _DATETIME_FIELDS:
+            plan.append((name, columns.index(name), 'datetime'))
+        else:
+            plan.append((name, columns.index(name), 'column'))
+
+    def assemble(row, links):
+        item = {}
+        for name, index, kind in plan:
+            if kind == 'column':
+                item[name] = row[index]
+            elif kind == 'datetime':
+                item[name] = _isoformat(row[index])
+            else:
+                item[name] = links[name].get(row[index]) or []
+        return item
+
+    return assemble
+
+
+class PromptSerializer:
+    """
+    Serialize prompts from row tuples into the ``PromptSchema`` output.
+
+    Args:
+        fields (tuple): Sparse fieldset (see ``app.utils.fieldsets``), None
+            for all fields
+        snapshot (bool): Read tags and categories from ``Prompt.labels``
+            where it is set; False always queries the link tables
+    """
+
+    def __init__(self, fields=None, snapshot=True):
+        self.fields = tuple(fields or PROMPT_FIELDS)
+        names = [name for name in self.fields if name not in _LINKS]
+        # id 必须在第一列；created_at 用于生成分页游标，user_id 用于匹配关联行
+        names = ['id'] + [name for name in names if name != 'id']
+        names += [name for name in ('created_at', 'user_id') if name not in names]
+        self.link_names = [name for name in _LINKS if name in self.fields]
+        self._labels_index = None
+        if snapshot and self.link_names:
+            self._labels_index = len(names)
+            names.append('labels')
+        self.column_names = names
+        self._user_index = names.index('user_id')
+        self.columns = [getattr(Prompt, name) for name in names]
+        self._assemble = _compile(self.fields, names)
+
+    def link_statements(self, owners):
+        """
+        Return the queries for the tags and categories of a page.
+
+        Args:
+            owners (dict): ``{prompt_id: user_id}`` of the page's prompts
+
+        Returns:
+            dict: ``{relationship name: select statement}`` for the
+            requested relationships
+        """
+        statements = {}
+        if not owners:
+            return statements
+        for name, (link_table, link_column, model, fields) in _LINKS.items():
+            if name in self.fields:
+                statements[name] = (
+                    select(link_table.c.prompt_id, link_table.c.user_id,
+                           *(getattr(model, f) for f in fields))
+                    .join(model, model.id == link_column)
+                    .where(link_table.c.prompt_id.in_(list(owners)))
+                    .order_by(link_table.c.prompt_id, model.id)
+                )
+        return statements
+
+    def assemble(self, rows, owners, link_rows):
+        """
+        Serialize page rows given the results of ``link_statements``.
+
+        Returns:
+            list: One dictionary per row
+        """
+        links = {name: {} for name in self.link_names}
+        if self._labels_index is not None:
+            labels_index = self._labels_index
+            for row in rows:
+                if row[labels_index] is not None:
+                    snapshot = json.loads(row[labels_index])
+                    for name, grouped in links.items():
+                        grouped[row[0]] = snapshot[name]
+        for name, result in link_rows.items():
+            fields = _LINKS[name][3]
+            grouped = links[name]
+            for prompt_id, user_id, *values in result:
+                # 与 Prompt.tags / Prompt.categories 的 primaryjoin 一致
+                if owners[prompt_id] == user_id:
+                    grouped.setdefault(prompt_id, []).append(dict(zip(fields, values)))
+        assemble = self._assemble
+        return [assemble(row, links) for row in rows]
+
+    def owners(self, rows):
+        """
+        Return ``{prompt_id: user_id}`` of the rows (selected with
+        ``self.columns``) whose tags and categories must be queried.
+        """
+        user_index = self._user_index
+        if self._labels_index is None:
+            return {row[0]: row[user_index] for row in rows}
+        labels_index = self._labels_index
+        return {row[0]: row[user_index] for row in rows if row[labels_index] is None}
+
+    def dump_rows(self, rows):
+        """
+        Serialize rows selected with ``self.columns``, keeping their order.
+
+        Returns:
+            list: One dictionary per row
+        """
+        if not rows:
+            return []
+        owners = self.owners(rows)
+        link_rows = {name: db.session.execute(statement)
+                     for name, statement in self.link_statements(owners).items()}
+        return self.assemble(rows, owners, link_rows)
+
+    def dump_ids(self, ids):
+        """
+        Load and serialize prompts by id, in the order of ``ids``.
+
+        Returns:
+            tuple: ``(list of dictionaries, list of ids not found)``
+        """
+        if not ids:
+            return [], []
+        rows = {row[0]: row for row in db.session.execute(
+            select(*self.columns).where(Prompt.id.in_(ids)))}
+        found = [rows[i] for i in ids if i in rows]
+        return self.dump_rows(found), [i for i in ids if i not in rows]
+
+
+_serializers = {}
+
+
+def get_serializer(fields=None):
+    """Return the (cached) serializer for a fieldset."""
+    serializer = _serializers.get(fields)
+    if serializer is None:
+        serializer = _serializers[fields] = PromptSerializer(fields)
+    return serializer
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; keys are sorted like the default provider."""
+
+    def dumps(self, obj, **kwargs):
+        # 日期交给 default 处理，与默认 provider 的输出格式一致
+        option = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+                  | orjson.OPT_PASSTHROUGH_DATETIME)
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+serializer_cli = AppGroup('serializer', help='API serializer commands.')
+
+
+def _schema_dump(prompt_ids, fields):
+    from app.routes.api import get_prompt_schema
+
+    prompts = Prompt.query.options(*relationship_options()).filter(
+        Prompt.id.in_(prompt_ids)).order_by(Prompt.id).all()
+    return get_prompt_schema(fields, many=True).dump(prompts)
+
+
+def _fast_dump(prompt_ids, fields):
+    serializer = get_serializer(fields)
+    rows = db.session.execute(select(*serializer.columns).where(
+        Prompt.id.in_(prompt_ids)).order_by(Prompt.id)).all()
+    return serializer.dump_rows(rows)
+
+
+# 检查时使用的字段组合：全部字段，以及几种常见的稀疏字段集
+_CHECK_FIELDSETS = [
+    None,
+    ('id', 'title'),
+    ('id', 'title', 'tags'),
+    ('id', 'created_at', 'categories'),
+    ('id', 'description', 'updated_at', 'categories', 'tags'),
+]
+
+
+@serializer_cli.command('check')
+@click.option('--chunk-size', default=500, help='Prompts compared per query.')
+@with_appcontext
+def check_command(chunk_size):
+    """Check that the fast serializer matches PromptSchema byte for byte."""
+    dumps = current_app.json.dumps
+    ids = [prompt_id for (prompt_id,) in db.session.query(Prompt.id).order_by(Prompt.id)]
+    mismatches = 0
+    for fields in _CHECK_FIELDSETS:
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            expected = _schema_dump(chunk, fields)
+            actual = _fast_dump(chunk, fields)
+            for want, got in zip(expected, actual):
+                if dumps(want) != dumps(got):
+                    mismatches += 1
+                    if mismatches <= 10:
+                        click.echo(f"Mismatch for prompt {want['id']} (fields: "
+                                   f"{','.join(fields or PROMPT_FIELDS)})", err=True)
+            if len(expected) != len(actual):
+                mismatches += 1
+                click.echo(f'Different number of prompts: {len(expected)} != {len(actual)}',
+                           err=True)
+            db.session.expunge_all()
+    if mismatches:
+        raise click.ClickException(f'{mismatches} mismatches')
+    click.echo(f'Checked {len(ids)} prompts with {len(_CHECK_FIELDSETS)} fieldsets: '
+               f'identical output.')
+
+
+def _per_item(fn, items, repeat):
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+        db.session.expunge_all()
+    return (time.perf_counter() - started_at) / (repeat * items) * 1e6
+
+
+@serializer_cli.command('bench')
+@click.option('--per-page', default=100, help='Prompts per simulated page.')
+@click.option('--repeat', default=20, help='Number of timed pages.')
+@with_appcontext
+def bench_command(per_page, repeat):
+    """Compare the cost per item of PromptSchema and the fast serializer."""
+    from app.routes.api import get_prompt_schema
+
+    ids = [prompt_id for (prompt_id,) in db.session.query(Prompt.id).order_by(
+        Prompt.id.desc()).limit(per_page)]
+    if not ids:
+        raise click.ClickException('No prompts to serialize')
+    dumps = current_app.json.dumps
+    serializer = get_serializer()
+    schema = get_prompt_schema(None, many=True)
+
+    def schema_page():
+        # 与原列表接口相同：ORM 对象 + 预加载关联 + marshmallow
+        prompts = Prompt.query.options(*relationship_options()).filter(
+            Prompt.id.in_(ids)).order_by(Prompt.id.desc()).all()
+        return dumps(schema.dump(prompts))
+
+    def fast_page():
+        rows = db.session.execute(select(*serializer.columns).where(
+            Prompt.id.in_(ids)).order_by(Prompt.id.desc())).all()
+        return dumps(serializer.dump_rows(rows))
+
+    prompts = Prompt.query.options(*relationship_options()).filter(Prompt.id.in_(ids)).all()
+    data = schema.dump(prompts)
+    rows = db.session.execute(select(*serializer.columns).where(Prompt.id.in_(ids))).all()
+    results = [
+        ('PromptSchema: load + dump + JSON', _per_item(schema_page, len(ids), repeat)),
+        ('PromptSerializer: load + dump + JSON', _per_item(fast_page, len(ids), repeat)),
+        ('PromptSchema.dump only', _per_item(lambda: schema.dump(prompts), len(ids), repeat)),
+        ('PromptSerializer assembly only',
+         _per_item(lambda: [serializer._assemble(row, {'tags': {}, 'categories': {}})
+                            for row in rows], len(ids), repeat)),
+        (f'JSON encoding ({type(current_app.json).__name__})',
+         _per_item(lambda: dumps(data), len(ids), repeat)),
+    ]
+    click.echo(f'{len(ids)} prompts per page, {repeat} pages')
+    for label, micros in results:
+        click.echo(f'{label:<40} {micros:8.1f} µs/item')
+
+
+def setup_serializer(app):
+    """
+    Select the JSON provider and register the serializer CLI commands.
+
+    Args:
+        app: Flask application instance
+    """
+    app.cli.add_command(serializer_cli)
+    if app.config.get('JSON_PROVIDER', 'default') == 'orjson':
+        if orjson is None:
+            app.logger.warning('JSON_PROVIDER is orjson but orjson is not installed')
+        else:
+            app.json = OrjsonProvider(app)
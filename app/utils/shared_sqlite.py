@@ -0,0 +1,43 @@
+"""
+Small SQLite files shared by the worker processes of a host.
+
+Used for coordination state that every gunicorn worker must see but that
+may be lost without harm (rate limit counters, in-flight computations), so
+writes are not synced to disk.
+"""
+
+import os
+import sqlite3
+import threading
+
+
+class SharedSQLite:
+    """
+    Per-thread autocommit connections to a shared SQLite file.
+
+    Args:
+        path (str): Database file; created on first use
+        schema: ``CREATE ... IF NOT EXISTS`` statements run on each new
+            connection
+    """
+
+    def __init__(self, path, schema=()):
+        self.path = path
+        self.schema = tuple(schema)
+        self._local = threading.local()
+
+    def connection(self):
+        """Return the calling thread's connection, opening it if needed."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 自动提交；数据丢失无关紧要，不需要同步写盘
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            for statement in self.schema:
+                connection.execute(statement)
+            self._local.connection = connection
+        return connection
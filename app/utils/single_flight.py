@@ -0,0 +1,262 @@
+"""
+Single-flight coalescing of identical concurrent read requests.
+
+When many clients ask for the same expensive page at the same moment (a
+popular search, the first page of the listing), only one request computes
+it; the others wait for it and receive its result:
+
+- Within a process, concurrent callers with the same key wait on the first
+  caller (the leader).
+- With ``SINGLE_FLIGHT_STORAGE`` set to a SQLite file, the worker processes
+  of a host coordinate through it as well: one leader computes and stores
+  the result as JSON, the leaders of the other workers poll for it.
+- Only requests that arrive while a computation is in flight share its
+  result; nothing is kept once it is done, so this is not a cache. A waiter
+  that is not served within ``SINGLE_FLIGHT_WAIT`` seconds, or whose leader
+  failed, computes the result itself.
+
+Results are handed to several requests, so they must be plain JSON data
+that callers do not modify. ``/admin/single-flight/stats`` reports per
+group how many requests were coalesced.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import current_app
+
+from app.utils.shared_sqlite import SharedSQLite
+
+# 清理已完成或过期记录的间隔（秒）
+_CLEANUP_INTERVAL = 60
+# 等待其他进程结果时的轮询间隔（秒），逐步加倍到上限
+_POLL_INTERVAL = 0.005
+_MAX_POLL_INTERVAL = 0.05
+
+
+class SharedFlights:
+    """
+    In-flight computations in a SQLite file shared by the worker processes.
+
+    Args:
+        path (str): Database file; created on first use
+    """
+
+    _SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS flights (key TEXT PRIMARY KEY, started_at REAL NOT NULL, '
+        'expires_at REAL NOT NULL, done_at REAL, result TEXT)',
+    )
+    # 没有进行中的计算（已完成或领头进程超时）时才能接手
+    _LEAD_SQL = '''
+        INSERT INTO flights (key, started_at, expires_at) VALUES (:key, :now, :expires_at)
+        ON CONFLICT (key) DO UPDATE SET
+            started_at = :now, expires_at = :expires_at, done_at = NULL, result = NULL
+        WHERE done_at IS NOT NULL OR expires_at < :now
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._db = SharedSQLite(path, self._SCHEMA)
+        self._next_cleanup = 0
+
+    def lead(self, key, now, ttl):
+        """Try to become the leader of ``key``; return True on success."""
+        connection = self._db.connection()
+        if now >= self._next_cleanup:
+            self._next_cleanup = now + _CLEANUP_INTERVAL
+            connection.execute('DELETE FROM flights WHERE coalesce(done_at, expires_at) < ?',
+                               (now - _CLEANUP_INTERVAL,))
+        cursor = connection.execute(self._LEAD_SQL, {
+            'key': key, 'now': now, 'expires_at': now + ttl})
+        return cursor.rowcount == 1
+
+    def poll(self, key):
+        """Return ``(expires_at, done_at, result)`` of ``key``, or None."""
+        return self._db.connection().execute(
+            'SELECT expires_at, done_at, result FROM flights WHERE key = ?', (key,)).fetchone()
+
+    def finish(self, key, started_at, result, now):
+        """Store the leader's result for the waiting workers."""
+        self._db.connection().execute(
+            'UPDATE flights SET done_at = ?, result = ? WHERE key = ? AND started_at = ?',
+            (now, result, key, started_at))
+
+    def abandon(self, key, started_at):
+        """Drop a failed computation so that waiters compute the result themselves."""
+        self._db.connection().execute(
+            'DELETE FROM flights WHERE key = ? AND started_at = ?', (key, started_at))
+
+
+class _Flight:
+    """A computation in progress in this process."""
+
+    __slots__ = ('done', 'ok', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+        self.result = None
+
+
+class SingleFlight:
+    """
+    Runs each computation once for all concurrent callers with the same key.
+
+    Args:
+        wait (float): Longest time a caller waits for another one's result
+        shared: ``SharedFlights`` to coalesce across processes, or None
+    """
+
+    def __init__(self, wait=5, shared=None):
+        self.wait = wait
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats = defaultdict(Counter)
+
+    def _count(self, group, name):
+        with self._lock:
+            self._stats[group][name] += 1
+
+    def do(self, group, key, fn):
+        """
+        Return ``fn()``, sharing one call among concurrent callers.
+
+        Args:
+            group (str): Name the statistics are kept under (e.g. the endpoint)
+            key (str): Identifies identical computations within the group
+            fn: Computes the result; its exceptions are raised to the caller
+                that ran it, the waiters then run ``fn`` themselves
+        """
+        with self._lock:
+            self._stats[group]['requests'] += 1
+            flight = self._flights.get((group, key))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(group, key)] = _Flight()
+
+        if not leader:
+            if flight.done.wait(self.wait) and flight.ok:
+                self._count(group, 'coalesced')
+                return flight.result
+            if not flight.done.is_set():
+                self._count(group, 'timeouts')
+            self._count(group, 'executed')
+            return fn()
+
+        try:
+            flight.result = self._run(group, f'{group}:{key}', fn)
+            flight.ok = True
+            return flight.result
+        finally:
+            with self._lock:
+                del self._flights[(group, key)]
+            flight.done.set()
+
+    def _run(self, group, key, fn):
+        if self.shared is not None:
+            try:
+                return self._run_shared(group, key, fn)
+            except sqlite3.Error:
+                current_app.logger.warning('Single-flight storage unavailable', exc_info=True)
+        self._count(group, 'executed')
+        return fn()
+
+    def _run_shared(self, group, key, fn):
+        shared = self.shared
+        deadline = time.time() + self.wait
+        delay = _POLL_INTERVAL
+        now = time.time()
+        while not shared.lead(key, now, self.wait):
+            # 领头进程完成后记录可以被接手：先读取结果，只有领头进程失败（记录
+            # 消失）或太慢（已过期）时才尝试接手，否则刚完成的结果会被重算
+            while True:
+                if now >= deadline:
+                    self._count(group, 'timeouts')
+                    self._count(group, 'executed')
+                    return fn()
+                time.sleep(delay)
+                delay = min(delay * 2, _MAX_POLL_INTERVAL)
+                row = shared.poll(key)
+                if row is not None and row[1] is not None:
+                    self._count(group, 'shared')
+                    return json.loads(row[2])
+                now = time.time()
+                if row is None or row[0] < now:
+                    break
+        return self._lead_shared(group, key, fn, now)
+
+    def _lead_shared(self, group, key, fn, started_at):
+        self._count(group, 'executed')
+        try:
+            result = fn()
+            encoded = json.dumps(result, separators=(',', ':'))
+        except BaseException:
+            self.shared.abandon(key, started_at)
+            raise
+        self.shared.finish(key, started_at, encoded, time.time())
+        return result
+
+    def stats(self):
+        """Return the counters of each group for this process."""
+        with self._lock:
+            groups = {group: dict(counts) for group, counts in self._stats.items()}
+        return {
+            'pid': os.getpid(),
+            'storage': self.shared.path if self.shared is not None else None,
+            'wait': self.wait,
+            'groups': groups,
+        }
+
+
+def request_key(args, *extra):
+    """
+    Return a key for a request from its query arguments.
+
+    Args:
+        args: ``request.args``; the order of the arguments does not matter
+        extra: Other values the result depends on (e.g. an ETag)
+    """
+    parts = (sorted(args.items(multi=True)),) + extra
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def get_single_flight():
+    """Return the single-flight group of the current app, or None if disabled."""
+    return current_app.extensions.get('single_flight')
+
+
+def coalesce(group, key, fn):
+    """Return ``fn()``, shared with concurrent identical requests when enabled."""
+    single_flight = get_single_flight()
+    if single_flight is None:
+        return fn()
+    return single_flight.do(group, key, fn)
+
+
+def get_single_flight_stats():
+    """Return single-flight statistics for this worker process."""
+    single_flight = get_single_flight()
+    if single_flight is None:
+        return {'pid': os.getpid(), 'enabled': False}
+    return dict(single_flight.stats(), enabled=True)
+
+
+def setup_single_flight(app):
+    """
+    Set up request coalescing for the expensive read endpoints.
+
+    Args:
+        app: Flask application instance
+    """
+    if not app.config.get('SINGLE_FLIGHT_ENABLED', True):
+        return
+    storage = app.config.get('SINGLE_FLIGHT_STORAGE')
+    app.extensions['single_flight'] = SingleFlight(
+        wait=app.config.get('SINGLE_FLIGHT_WAIT', 5),
+        shared=SharedFlights(storage) if storage else None)
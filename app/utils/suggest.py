@@ -0,0 +1,253 @@
+"""
+Prefix autocomplete for tags and categories.
+
+Each user's tag and category names are loaded into a prefix trie the first
+time they are needed. Commits that create, rename or delete a tag or
+category update the tries incrementally, so suggestion lookups never touch
+the database. Tries of users that have not been seen for a while are
+dropped (LRU), and each trie is reloaded after ``SUGGEST_INDEX_TTL`` seconds
+to pick up changes made by other worker processes.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+
+from app.models import Category, Tag
+
+SUGGEST_MODELS = {
+    'tags': Tag,
+    'categories': Category,
+}
+
+
+class _TrieNode:
+    __slots__ = ('children', 'entries', 'count')
+
+    def __init__(self):
+        self.children = None
+        # 以该节点结尾的名称：id -> name
+        self.entries = None
+        # 子树中名称的数量，用于分页时跳过整棵子树
+        self.count = 0
+
+
+class PrefixTrie:
+    """A case-insensitive prefix trie of ``(id, name)`` entries."""
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._root.count
+
+    def insert(self, item_id, name):
+        """Add an entry; inserting an existing id/name pair is a no-op."""
+        key = name.lower()
+        with self._lock:
+            node = self._root
+            path = [node]
+            for char in key:
+                if node.children is None:
+                    node.children = {}
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _TrieNode()
+                node = child
+                path.append(node)
+            if node.entries is None:
+                node.entries = {}
+            if item_id in node.entries:
+                return
+            node.entries[item_id] = name
+            for visited in path:
+                visited.count += 1
+
+    def remove(self, item_id, name):
+        """Remove an entry if present, pruning empty branches."""
+        key = name.lower()
+        with self._lock:
+            node = self._root
+            path = [(None, node)]
+            for char in key:
+                node = node.children.get(char) if node.children else None
+                if node is None:
+                    return
+                path.append((char, node))
+            if not node.entries or item_id not in node.entries:
+                return
+            del node.entries[item_id]
+            if not node.entries:
+                node.entries = None
+            for _, visited in path:
+                visited.count -= 1
+            # 自底向上删除空节点
+            for i in range(len(path) - 1, 0, -1):
+                char, visited = path[i]
+                if visited.count:
+                    break
+                parent = path[i - 1][1]
+                del parent.children[char]
+                if not parent.children:
+                    parent.children = None
+
+    def search(self, prefix, offset=0, limit=20):
+        """
+        Return ``(entries, total)`` for names starting with ``prefix``.
+
+        Entries are ``(id, name)`` pairs in alphabetical order; ``offset``
+        and ``limit`` select one page of them.
+        """
+        with self._lock:
+            node = self._root
+            for char in prefix.lower():
+                node = node.children.get(char) if node.children else None
+                if node is None:
+                    return [], 0
+            results = []
+            self._collect(node, offset, limit, results)
+            return results, node.count
+
+    def _collect(self, node, skip, limit, results):
+        """Append up to ``limit`` entries after skipping ``skip``; return the skip left."""
+        if node.entries:
+            for item_id, name in sorted(node.entries.items(), key=lambda e: e[1]):
+                if len(results) >= limit:
+                    return skip
+                if skip:
+                    skip -= 1
+                else:
+                    results.append((item_id, name))
+        if node.children:
+            for char in sorted(node.children):
+                if len(results) >= limit:
+                    break
+                child = node.children[char]
+                if skip >= child.count:
+                    skip -= child.count
+                    continue
+                skip = self._collect(child, skip, limit, results)
+        return skip
+
+
+class SuggestIndex:
+    """Per-user prefix tries for tag and category names."""
+
+    def __init__(self, max_users=256, ttl=300):
+        self.max_users = max_users
+        self.ttl = ttl
+        # (user_id, kind) -> (loaded_at, trie)
+        self._tries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, user_id, kind):
+        model = SUGGEST_MODELS[kind]
+        trie = PrefixTrie()
+        rows = model.query.with_entities(model.id, model.name).filter(
+            model.user_id == user_id)
+        for item_id, name in rows:
+            trie.insert(item_id, name)
+        return trie
+
+    def get_trie(self, user_id, kind):
+        """Return the trie for a user, loading it from the database if needed."""
+        key = (user_id, kind)
+        with self._lock:
+            cached = self._tries.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                self._tries.move_to_end(key)
+                return cached[1]
+
+        loaded_at = time.monotonic()
+        trie = self._load(user_id, kind)
+        with self._lock:
+            self._tries[key] = (loaded_at, trie)
+            self._tries.move_to_end(key)
+            while len(self._tries) > self.max_users * len(SUGGEST_MODELS):
+                self._tries.popitem(last=False)
+        return trie
+
+    def suggest(self, user_id, kind, prefix, page=1, per_page=20):
+        """Return ``(entries, total)`` for one page of suggestions."""
+        trie = self.get_trie(user_id, kind)
+        return trie.search(prefix, offset=(page - 1) * per_page, limit=per_page)
+
+    def apply(self, changes):
+        """Apply committed ``(op, kind, user_id, id, name)`` changes to loaded tries."""
+        with self._lock:
+            for op, kind, user_id, item_id, name in changes:
+                cached = self._tries.get((user_id, kind))
+                if cached is None:
+                    continue
+                if op == 'insert':
+                    cached[1].insert(item_id, name)
+                else:
+                    cached[1].remove(item_id, name)
+
+
+def get_suggest_index():
+    """Return the suggestion index for the current application."""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('suggest_index')
+
+
+def _kind_of(obj):
+    for kind, model in SUGGEST_MODELS.items():
+        if isinstance(obj, model):
+            return kind
+    return None
+
+
+def _after_flush(session, flush_context):
+    changes = session.info.setdefault('suggest_changes', [])
+    for obj in session.new:
+        kind = _kind_of(obj)
+        if kind and obj.id is not None:
+            changes.append(('insert', kind, int(obj.user_id), obj.id, obj.name))
+    for obj in session.dirty:
+        kind = _kind_of(obj)
+        if not kind:
+            continue
+        history = inspect(obj).attrs.name.history
+        if history.has_changes():
+            for old_name in history.deleted:
+                changes.append(('remove', kind, int(obj.user_id), obj.id, old_name))
+            changes.append(('insert', kind, int(obj.user_id), obj.id, obj.name))
+    for obj in session.deleted:
+        kind = _kind_of(obj)
+        if kind:
+            changes.append(('remove', kind, int(obj.user_id), obj.id, obj.name))
+
+
+def _after_commit(session):
+    changes = session.info.pop('suggest_changes', None)
+    index = get_suggest_index()
+    if changes and index is not None:
+        index.apply(changes)
+
+
+def _after_rollback(session):
+    session.info.pop('suggest_changes', None)
+
+
+def setup_suggest(app, db):
+    """
+    Create the suggestion index and track tag/category changes.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+    """
+    app.extensions['suggest_index'] = SuggestIndex(
+        max_users=app.config.get('SUGGEST_INDEX_USERS', 256),
+        ttl=app.config.get('SUGGEST_INDEX_TTL', 300)
+    )
+    if not event.contains(db.session, 'after_commit', _after_commit):
+        event.listen(db.session, 'after_flush', _after_flush)
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
@@ -0,0 +1,156 @@
+"""
+Number of prompts using each tag and category.
+
+``Tag.usage_count`` and ``Category.usage_count`` are kept up to date
+incrementally, in the same transaction as the change:
+
+- by a flush hook when links are added or removed from either side
+  (``prompt.tags``, ``tag.prompts``) or a prompt is deleted
+- by the bulk import, which writes the link tables directly
+
+Counts are changed with ``usage_count = usage_count + n``, so concurrent
+writers do not lose updates, and ``updated_at`` is left alone: a new prompt
+using a tag is not a change of the tag. ``flask usage-counts reconcile``
+recomputes the counts from the link tables and reports the rows that had
+drifted, e.g. after editing the link tables by hand.
+"""
+
+from collections import Counter
+
+import click
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import bindparam, event, func, inspect, select, update
+from sqlalchemy.orm.util import identity_key
+
+from app.extensions import db
+from app.models import Category, Prompt, Tag, prompt_categories, prompt_tags
+
+# 关联属性名及对应的关联表列
+_LINKED = {
+    Tag: ('tags', prompt_tags, prompt_tags.c.tag_id),
+    Category: ('categories', prompt_categories, prompt_categories.c.category_id),
+}
+
+
+def _increment(model):
+    table = model.__table__
+    return update(table).where(table.c.id == bindparam('item_id')).values(
+        usage_count=table.c.usage_count + bindparam('delta'),
+        # 计数不是标签/分类本身的变化，不触发 updated_at 的 onupdate
+        updated_at=table.c.updated_at,
+    )
+
+
+def add_usage(session, model, deltas):
+    """
+    Add to the usage counts of tags or categories within the session's
+    transaction.
+
+    Args:
+        model: ``Tag`` or ``Category``
+        deltas: ``{id: change}``; zero changes are skipped
+    """
+    rows = [{'item_id': item_id, 'delta': delta} for item_id, delta in deltas.items() if delta]
+    if not rows:
+        return
+    session.execute(_increment(model), rows)
+    # 已加载的对象下次访问时重新读取
+    for row in rows:
+        obj = session.identity_map.get(identity_key(model, row['item_id']))
+        if obj is not None:
+            session.expire(obj, ['usage_count'])
+
+
+def reconcile_usage_counts(session):
+    """
+    Recompute every usage count from the link tables.
+
+    Returns:
+        dict: Number of rows corrected per model name
+    """
+    corrected = {}
+    for model, (name, link_table, link_column) in _LINKED.items():
+        table = model.__table__
+        actual = select(func.count()).select_from(link_table).where(
+            link_column == table.c.id).scalar_subquery()
+        result = session.execute(update(table).where(table.c.usage_count != actual).values(
+            usage_count=actual, updated_at=table.c.updated_at))
+        corrected[name] = result.rowcount
+    session.expire_all()
+    return corrected
+
+
+def _pending(session):
+    return session.info.setdefault('usage_count_pending', {'links': set(), 'deltas': Counter()})
+
+
+def _before_flush(session, flush_context, instances):
+    pending = _pending(session)
+    # 关联两侧的历史可能同时记录同一条变化，按 (符号, 提示, 标签/分类) 去重
+    links = pending['links']
+    for obj in list(session.new) + list(session.dirty):
+        if obj in session.deleted:
+            continue
+        if isinstance(obj, Prompt):
+            state = inspect(obj)
+            for name, _, _ in _LINKED.values():
+                added, _, deleted = state.attrs[name].history
+                links.update((1, obj, item) for item in added or ())
+                links.update((-1, obj, item) for item in deleted or ())
+        elif type(obj) in _LINKED:
+            added, _, deleted = inspect(obj).attrs.prompts.history
+            links.update((1, prompt, obj) for prompt in added or ()
+                         if prompt not in session.deleted)
+            links.update((-1, prompt, obj) for prompt in deleted or ()
+                         if prompt not in session.deleted)
+    # 删除提示时以数据库中的关联为准，删除前关联行仍然存在
+    deleted_ids = [obj.id for obj in session.deleted
+                   if isinstance(obj, Prompt) and obj.id is not None]
+    if deleted_ids:
+        for model, (_, link_table, link_column) in _LINKED.items():
+            pending['deltas'].update({(model, item_id): -count for item_id, count in
+                                      session.execute(select(link_column, func.count()).where(
+                                          link_table.c.prompt_id.in_(deleted_ids)).group_by(
+                                              link_column))})
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.pop('usage_count_pending', None)
+    if pending is None:
+        return
+    deltas = pending['deltas']
+    for sign, _, item in pending['links']:
+        # 同一次 flush 中被删除的标签/分类无需更新
+        if item.id is not None and item not in session.deleted:
+            deltas[(type(item), item.id)] += sign
+    for model in _LINKED:
+        add_usage(session, model, {item_id: delta for (kind, item_id), delta in deltas.items()
+                                   if kind is model})
+
+
+usage_counts_cli = AppGroup('usage-counts', help='Tag/category usage count commands.')
+
+
+@usage_counts_cli.command('reconcile')
+@with_appcontext
+def reconcile_command():
+    """Recompute the usage counts of all tags and categories."""
+    corrected = reconcile_usage_counts(db.session)
+    db.session.commit()
+    click.echo(f"Corrected {corrected['tags']} tag and "
+               f"{corrected['categories']} category usage counts.")
+
+
+def setup_usage_counts(app, db):
+    """
+    Keep the tag and category usage counts up to date and register the CLI
+    commands.
+
+    Args:
+        app: Flask application instance
+        db: SQLAlchemy database instance
+    """
+    app.cli.add_command(usage_counts_cli)
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
+        event.listen(db.session, 'after_flush', _after_flush)
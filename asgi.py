@@ -0,0 +1,13 @@
+"""
+ASGI entry point: async read endpoints in front of the Flask app.
+
+    pip install -r requirements-async.txt
+    uvicorn asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+See app/routes/async_api.py; requirements-async.txt pins asgiref, uvicorn
+and the async database drivers (aiosqlite for SQLite, asyncmy for MySQL).
+"""
+from run import app
+from app.routes.async_api import create_asgi_app
+
+application = create_asgi_app(app)
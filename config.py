@@ -28,7 +28,74 @@ class Config:
     
     # 应用配置
     PROMPTS_PER_PAGE = 10
+    MAX_PER_PAGE = 100  # per_page 的上限，超出时按上限返回
+    API_BATCH_MAX_IDS = 100  # 批量获取接口一次最多请求的提示数
+    EXPORT_CHUNK_SIZE = 500  # 导出时每次查询读取的提示数
+    IMPORT_CHUNK_SIZE = 1000  # 批量导入时每个事务写入的提示数
+    CHANGE_FEED_MAX_LIMIT = 500  # 变更接口每页最多返回的变更数
+    CHANGE_FEED_SETTLE_SECONDS = 0  # 只返回早于此秒数的变更；MySQL 等并发写入的数据库建议设为几秒
+    CHANGE_LOG_RETENTION_DAYS = 90  # flask changes prune 默认保留的天数
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'default')  # default 或 orjson（需安装 orjson）
     PASSWORD_RESET_EXPIRES = 24  # 密码重置链接24小时后过期
+
+    # 响应压缩配置
+    COMPRESS_ALGORITHMS = ['zstd', 'gzip']  # 按优先顺序；zstd 需要安装 zstandard，空列表关闭压缩
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))  # gzip 压缩级别（1-9）
+    COMPRESS_ZSTD_LEVEL = int(os.environ.get('COMPRESS_ZSTD_LEVEL', 3))  # zstd 压缩级别（1-22）
+    COMPRESS_MIN_SIZE = 500  # 小于此字节数的响应不压缩
+    COMPRESS_MIMETYPES = [
+        'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+        'application/javascript', 'application/json', 'application/x-ndjson',
+    ]
+
+    # API 速率限制和并发上限
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ['true', 'on', '1']
+    # 各 worker 共享的 SQLite 文件，或 memory（每个进程单独计数）
+    RATE_LIMIT_STORAGE = os.environ.get('RATE_LIMIT_STORAGE') or \
+        os.path.join(basedir, 'instance', 'ratelimit.db')
+    RATE_LIMIT_DEFAULT = (10, 30)  # 每个用户（未登录时每个 IP）：每秒补充的请求数，突发上限
+    RATE_LIMITS = {  # 开销较大的端点单独计数，覆盖默认限额
+        'api.search_prompts': (5, 20),
+        'api.export_prompts': (0.2, 3),
+        'api.import_prompts_api': (0.2, 3),
+    }
+    API_CONCURRENCY_LIMITS = {  # 端点同时处理的请求数上限（所有用户合计）
+        'api.search_prompts': 8,
+        'api.export_prompts': 2,
+        'api.import_prompts_api': 2,
+    }
+    API_CONCURRENCY_SLOT_TTL = 300  # 占用的并发名额最长保留秒数（进程异常退出时释放）
+
+    # 相同并发读请求合并（单飞）配置
+    SINGLE_FLIGHT_ENABLED = os.environ.get(
+        'SINGLE_FLIGHT_ENABLED', 'true').lower() in ['true', 'on', '1']
+    # 各 worker 共享的 SQLite 文件；未设置时只在进程内合并
+    SINGLE_FLIGHT_STORAGE = os.environ.get('SINGLE_FLIGHT_STORAGE')
+    SINGLE_FLIGHT_WAIT = 5  # 等待其他请求计算结果的最长秒数，超时后自行计算
+
+    # ASGI 异步读接口配置（asgi.py）
+    ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')  # 默认由 SQLALCHEMY_DATABASE_URI 换成异步驱动
+    ASYNC_POOL_SIZE = int(os.environ.get('ASYNC_POOL_SIZE', 10))  # 每个进程的数据库连接数
+    ASYNC_POOL_MAX_OVERFLOW = 10  # 连接池满时额外允许的连接数
+    
+    # 搜索配置
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')  # auto, fts5, memory, like
+    SEARCH_FTS_TOKENIZER = os.environ.get('SEARCH_FTS_TOKENIZER', 'trigram')  # trigram, unicode61
+    # 一两个字符的查询命中的提示数（按索引词表估计）超过此值时改用 LIKE 扫描
+    SEARCH_SHORT_QUERY_MAX_DOCS = 2000
+    SEARCH_INDEX_REFRESH_SECONDS = 30  # 内存索引同步其他进程变更的间隔
+    SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', 1024))  # 0 表示关闭搜索缓存
+    SEARCH_CACHE_TTL = 60  # 缓存条目最长有效期（秒），限制其他进程写入后的过期时间
+    SEARCH_CACHE_MAX_RESULTS = 5000  # 结果数超过此值的搜索不缓存
+    SUGGEST_INDEX_USERS = 256  # 内存中保留标签/分类前缀树的用户数
+    SUGGEST_INDEX_TTL = 300  # 前缀树重新加载的间隔（秒）
+    DUPLICATE_THRESHOLD = 0.8  # 判定为近似重复的最小相似度
+    RELATED_PROMPTS_K = 10  # 每个提示预先计算的相关提示数
+    # 由 flask related worker（或定时执行 flask related refresh）重新计算；开启后在写请求结束时
+    # 同步计算，需要加载整个用户的语料，只适合很小的库
+    RELATED_REFRESH_ON_WRITE = False
+    # 统计每个请求的 SQL 语句数：warn 超出预算时记录日志，raise 时报错
+    QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE')
     
     @staticmethod
     def init_app(app):
@@ -36,9 +103,12 @@ class Config:
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'warn')
 
 class TestingConfig(Config):
     TESTING = True
+    RATE_LIMIT_ENABLED = False
+    QUERY_BUDGET_MODE = 'raise'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
     SERVER_NAME = 'localhost:5000'
@@ -0,0 +1,32 @@
+"""Add FTS5 search index for prompts
+
+Revision ID: 0a6d3e8f5c42
+Revises: f5c1d8e3b726
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+from flask import current_app
+
+from app.utils.search import choose_tokenizer, create_fts, drop_fts, fts5_supported
+
+# revision identifiers, used by Alembic.
+revision = '0a6d3e8f5c42'
+down_revision = 'f5c1d8e3b726'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 全文索引只用于带 FTS5 的 SQLite；其他数据库由 SEARCH_BACKEND=auto 选择内存索引
+    connection = op.get_bind()
+    if connection.dialect.name != 'sqlite' or not fts5_supported(connection):
+        return
+    tokenizer = choose_tokenizer(
+        connection, current_app.config.get('SEARCH_FTS_TOKENIZER', 'trigram'))
+    # 已有的索引（由旧版本在启动时创建）保留，否则建表并填充
+    create_fts(connection, tokenizer)
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite':
+        drop_fts(connection)
@@ -0,0 +1,23 @@
+"""Add a generation counter to the related-prompts stale flag
+
+Revision ID: 1b7e4c9a2d53
+Revises: 0a6d3e8f5c42
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '1b7e4c9a2d53'
+down_revision = '0a6d3e8f5c42'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 不用 batch 重建表：SQLite 上 FTS5 触发器引用了 prompts
+    op.add_column('prompts', sa.Column('related_generation', sa.Integer(), nullable=False,
+                                       server_default='0'))
+
+def downgrade():
+    op.drop_column('prompts', 'related_generation')
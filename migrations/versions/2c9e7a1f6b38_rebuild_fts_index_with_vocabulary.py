@@ -0,0 +1,30 @@
+"""Rebuild the FTS5 search index with padded columns and a vocabulary table
+
+Revision ID: 2c9e7a1f6b38
+Revises: 1b7e4c9a2d53
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+
+from app.utils.search import fts_tokenizer, rebuild_fts
+
+# revision identifiers, used by Alembic.
+revision = '2c9e7a1f6b38'
+down_revision = '1b7e4c9a2d53'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    connection = op.get_bind()
+    if connection.dialect.name != 'sqlite':
+        return
+    tokenizer = fts_tokenizer(connection)
+    if tokenizer is not None:
+        # 按原分词器重建：已有的索引行没有末尾的空格，短查询会漏掉列末尾的匹配
+        rebuild_fts(connection, tokenizer)
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        # 补了空格的索引行对旧版本同样可用，只删除词表
+        op.execute('DROP TABLE IF EXISTS prompts_fts_vocab')
@@ -0,0 +1,38 @@
+"""Add prompt MinHash signatures and LSH buckets
+
+Revision ID: 3c9d2a7f1b4e
+Revises: 8fa90a7eef81
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3c9d2a7f1b4e'
+down_revision = '8fa90a7eef81'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 提示的 MinHash 签名，已有数据通过 flask duplicates rebuild 回填
+    with op.batch_alter_table('prompts') as batch_op:
+        batch_op.add_column(sa.Column('minhash', sa.LargeBinary(), nullable=True))
+
+    # 创建prompt_lsh_buckets表
+    op.create_table('prompt_lsh_buckets',
+        sa.Column('prompt_id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['prompt_id'], ['prompts.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('prompt_id', 'bucket')
+    )
+    op.create_index('ix_prompt_lsh_buckets_user_bucket', 'prompt_lsh_buckets',
+                    ['user_id', 'bucket'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_prompt_lsh_buckets_user_bucket', table_name='prompt_lsh_buckets')
+    op.drop_table('prompt_lsh_buckets')
+    with op.batch_alter_table('prompts') as batch_op:
+        batch_op.drop_column('minhash')
@@ -0,0 +1,38 @@
+"""Add precomputed related prompts
+
+Revision ID: 5e1f7c3a9d20
+Revises: 3c9d2a7f1b4e
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5e1f7c3a9d20'
+down_revision = '3c9d2a7f1b4e'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 已有的提示全部标记为待计算，通过 flask related refresh 生成相关提示
+    with op.batch_alter_table('prompts') as batch_op:
+        batch_op.add_column(sa.Column('related_stale', sa.Boolean(), nullable=False,
+                                      server_default=sa.true()))
+        batch_op.create_index('ix_prompts_related_stale', ['related_stale'], unique=False)
+
+    # 创建prompt_related表
+    op.create_table('prompt_related',
+        sa.Column('prompt_id', sa.Integer(), nullable=False),
+        sa.Column('related_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['prompt_id'], ['prompts.id'], ),
+        sa.ForeignKeyConstraint(['related_id'], ['prompts.id'], ),
+        sa.PrimaryKeyConstraint('prompt_id', 'related_id')
+    )
+
+def downgrade():
+    op.drop_table('prompt_related')
+    with op.batch_alter_table('prompts') as batch_op:
+        batch_op.drop_index('ix_prompts_related_stale')
+        batch_op.drop_column('related_stale')
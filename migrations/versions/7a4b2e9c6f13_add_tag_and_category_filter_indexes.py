@@ -0,0 +1,26 @@
+"""Add tag and category filter indexes
+
+Revision ID: 7a4b2e9c6f13
+Revises: 5e1f7c3a9d20
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7a4b2e9c6f13'
+down_revision = '5e1f7c3a9d20'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 按标签/分类筛选时从关联表一侧查找提示
+    op.create_index('ix_prompt_tags_tag_prompt', 'prompt_tags',
+                    ['tag_id', 'prompt_id'], unique=False)
+    op.create_index('ix_prompt_categories_category_prompt', 'prompt_categories',
+                    ['category_id', 'prompt_id'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_prompt_categories_category_prompt', table_name='prompt_categories')
+    op.drop_index('ix_prompt_tags_tag_prompt', table_name='prompt_tags')
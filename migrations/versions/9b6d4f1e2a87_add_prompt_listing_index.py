@@ -0,0 +1,22 @@
+"""Add prompt listing index for cursor pagination
+
+Revision ID: 9b6d4f1e2a87
+Revises: 7a4b2e9c6f13
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9b6d4f1e2a87'
+down_revision = '7a4b2e9c6f13'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 列表按 (created_at, id) 倒序分页
+    op.create_index('ix_prompts_created_at_id', 'prompts', ['created_at', 'id'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_prompts_created_at_id', table_name='prompts')
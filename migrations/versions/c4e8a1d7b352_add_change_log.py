@@ -0,0 +1,36 @@
+"""Add change log for incremental sync
+
+Revision ID: c4e8a1d7b352
+Revises: 9b6d4f1e2a87
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1d7b352'
+down_revision = '9b6d4f1e2a87'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 只记录升级之后的变更，已有的客户端需要先完整同步一次
+    op.create_table('change_log',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('entity', sa.String(length=20), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('op', sa.String(length=10), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_change_log_user_id_id', 'change_log', ['user_id', 'id'], unique=False)
+    op.create_index('ix_change_log_changed_at', 'change_log', ['changed_at'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_change_log_changed_at', table_name='change_log')
+    op.drop_index('ix_change_log_user_id_id', table_name='change_log')
+    op.drop_table('change_log')
@@ -0,0 +1,24 @@
+"""Add denormalized tag/category snapshot to prompts
+
+Revision ID: d7a3f9c2e614
+Revises: c4e8a1d7b352
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd7a3f9c2e614'
+down_revision = 'c4e8a1d7b352'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 已有数据通过 flask labels rebuild 回填；为空时列表接口仍从关联表读取
+    with op.batch_alter_table('prompts') as batch_op:
+        batch_op.add_column(sa.Column('labels', sa.Text(), nullable=True))
+
+def downgrade():
+    with op.batch_alter_table('prompts') as batch_op:
+        batch_op.drop_column('labels')
@@ -0,0 +1,27 @@
+"""Add per-user composite indexes to prompts
+
+Revision ID: e2b8c5f4a391
+Revises: d7a3f9c2e614
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8c5f4a391'
+down_revision = 'd7a3f9c2e614'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 按用户筛选的列表和相关推荐的语料查询（flask db-advise）
+    op.create_index('ix_prompts_user_id_created_at_id', 'prompts',
+                    ['user_id', 'created_at', 'id'], unique=False)
+    # 刷新一个用户的过期相关推荐时按 id 顺序读取，免去排序
+    op.create_index('ix_prompts_user_id_related_stale', 'prompts',
+                    ['user_id', 'related_stale'], unique=False)
+
+def downgrade():
+    op.drop_index('ix_prompts_user_id_related_stale', table_name='prompts')
+    op.drop_index('ix_prompts_user_id_created_at_id', table_name='prompts')
@@ -0,0 +1,36 @@
+"""Add usage counts to tags and categories
+
+Revision ID: f5c1d8e3b726
+Revises: e2b8c5f4a391
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f5c1d8e3b726'
+down_revision = 'e2b8c5f4a391'
+branch_labels = None
+depends_on = None
+
+_TABLES = (
+    ('tags', 'prompt_tags', 'tag_id'),
+    ('categories', 'prompt_categories', 'category_id'),
+)
+
+def upgrade():
+    for table, link_table, link_column in _TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('usage_count', sa.Integer(), nullable=False,
+                                          server_default='0'))
+        op.create_index(f'ix_{table}_usage_count', table, ['usage_count'], unique=False)
+        # 回填已有数据；之后由应用增量维护，flask usage-counts reconcile 可重新校正
+        op.execute(f'UPDATE {table} SET usage_count = (SELECT count(*) FROM {link_table} '
+                   f'WHERE {link_table}.{link_column} = {table}.id)')
+
+def downgrade():
+    for table, _, _ in _TABLES:
+        op.drop_index(f'ix_{table}_usage_count', table_name=table)
+        # 不用 batch 重建表：SQLite 上 FTS5 触发器引用了 tags/categories
+        op.drop_column(table, 'usage_count')
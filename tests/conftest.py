@@ -0,0 +1,40 @@
+"""Shared pytest fixtures."""
+
+import pytest
+
+from app import create_app
+from app.extensions import db as _db
+
+
+@pytest.fixture
+def app():
+    """Application configured for testing, with an empty in-memory database."""
+    app = create_app('testing')
+    with app.app_context():
+        _db.create_all()
+        yield app
+        _db.session.remove()
+        _db.drop_all()
+
+
+@pytest.fixture
+def db(app):
+    """Database bound to the test application."""
+    return _db
+
+
+@pytest.fixture
+def client(app):
+    """Test client of the application."""
+    return app.test_client()
+
+
+@pytest.fixture
+def user(db):
+    """A saved user owning the test data."""
+    from app.models import User
+
+    user = User('tester@example.com', 'password1')
+    db.session.add(user)
+    db.session.commit()
+    return user
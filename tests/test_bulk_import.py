@@ -0,0 +1,77 @@
+"""Bulk import of prompts."""
+
+import pytest
+
+from app.models import Category, ChangeLog, Prompt, Tag
+from app.utils.bulk_import import import_prompts
+
+
+def _records(*records):
+    return [(row, record, None) for row, record in enumerate(records, 1)]
+
+
+@pytest.fixture
+def case_insensitive_names(db, monkeypatch):
+    """Compare tag and category names like MySQL's default collation does."""
+    db.drop_all()
+    for model in (Tag, Category):
+        monkeypatch.setattr(model.__table__.c.name.type, 'collation', 'NOCASE')
+    db.create_all()
+
+
+def _tag_names(prompt):
+    return sorted(tag.name for tag in prompt.tags)
+
+
+def test_import_links_tags_and_categories(db, user):
+    report = import_prompts(_records(
+        {'title': 'One', 'content': 'First', 'tags': ['python', 'sql'],
+         'categories': [{'name': 'Code', 'description': 'Programming'}]},
+        {'title': 'Two', 'content': 'Second', 'tags': ['python']},
+        {'title': '', 'content': 'Missing title'},
+    ), user.id)
+
+    assert report['imported'] == 2
+    assert report['errors'] == [{'row': 3, 'message': 'title is required'}]
+    one, two = Prompt.query.order_by(Prompt.id).all()
+    assert _tag_names(one) == ['python', 'sql']
+    assert _tag_names(two) == ['python']
+    assert [(c.name, c.description) for c in one.categories] == [('Code', 'Programming')]
+    assert Tag.query.filter_by(name='python').one().usage_count == 2
+    # 导入的提示由 flask related worker 计算相关提示
+    assert one.related_stale and two.related_stale
+    assert ChangeLog.query.filter_by(entity='prompt', op='insert').count() == 2
+
+
+def test_import_merges_names_differing_in_case(db, user):
+    report = import_prompts(_records(
+        {'title': 'One', 'content': 'First', 'tags': ['Python', 'python', 'PYTHON']},
+        {'title': 'Two', 'content': 'Second', 'tags': ['python'], 'categories': ['code']},
+        {'title': 'Three', 'content': 'Third', 'categories': ['Code']},
+    ), user.id, chunk_size=10)
+
+    assert report == {'imported': 3, 'failed': 0, 'errors': []}
+    assert [tag.name for tag in Tag.query.all()] == ['Python']
+    assert [category.name for category in Category.query.all()] == ['code']
+    assert Tag.query.one().usage_count == 2
+    assert Category.query.one().usage_count == 2
+
+
+def test_import_reuses_names_matched_by_collation(db, case_insensitive_names, user):
+    # MySQL 的 name IN ('python') 会返回 'Python'
+    db.session.add(Tag(name='Python', user_id=user.id))
+    db.session.add(Category(name='Writing', user_id=user.id))
+    db.session.commit()
+
+    report = import_prompts(_records(
+        {'title': 'One', 'content': 'First', 'tags': ['python'], 'categories': ['WRITING']},
+        {'title': 'Two', 'content': 'Second', 'tags': ['PYTHON', 'new']},
+    ), user.id)
+
+    assert report == {'imported': 2, 'failed': 0, 'errors': []}
+    assert sorted(tag.name for tag in Tag.query.all()) == ['Python', 'new']
+    assert Category.query.count() == 1
+    one, two = Prompt.query.order_by(Prompt.id).all()
+    assert _tag_names(one) == ['Python']
+    assert _tag_names(two) == ['Python', 'new']
+    assert [category.name for category in one.categories] == ['Writing']
@@ -0,0 +1,72 @@
+"""Change feed for incremental sync."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import ChangeLog, Prompt, Tag
+from app.utils.changes import CursorExpired, head_cursor, prune_changes, read_changes
+
+
+def _changes(user, since, limit=100):
+    entries, cursor, has_more = read_changes(user.id, since, limit)
+    return [(entity, op) for _, entity, _, op, _ in entries], cursor, has_more
+
+
+def test_feed_returns_changes_after_cursor(db, user):
+    since = head_cursor()
+    prompt = Prompt(title='Draft', content='Text', user_id=user.id)
+    prompt.tags = [Tag(name='notes', user_id=user.id)]
+    db.session.add(prompt)
+    db.session.commit()
+    # 同一页内先插入后更新，仍按插入返回
+    prompt.title = 'Final'
+    db.session.commit()
+
+    changes, cursor, has_more = _changes(user, since)
+    assert sorted(changes) == [('prompt', 'insert'), ('tag', 'insert')]
+    assert cursor == head_cursor()
+    assert not has_more
+
+    db.session.delete(prompt)
+    db.session.commit()
+    assert _changes(user, cursor)[0] == [('prompt', 'delete')]
+
+
+def test_feed_pages_with_limit(db, user):
+    since = head_cursor()
+    db.session.add_all([Prompt(title=f'Prompt {i}', content='Text', user_id=user.id)
+                        for i in range(3)])
+    db.session.commit()
+
+    changes, cursor, has_more = _changes(user, since, limit=2)
+    assert len(changes) == 2 and has_more
+    changes, cursor, has_more = _changes(user, cursor, limit=2)
+    assert len(changes) == 1 and not has_more
+
+
+def test_renaming_a_tag_updates_its_prompts(db, user):
+    tag = Tag(name='notes', user_id=user.id)
+    prompt = Prompt(title='Draft', content='Text', user_id=user.id)
+    prompt.tags = [tag]
+    db.session.add(prompt)
+    db.session.commit()
+    since = head_cursor()
+
+    tag.name = 'journal'
+    db.session.commit()
+    assert sorted(_changes(user, since)[0]) == [('prompt', 'update'), ('tag', 'update')]
+
+
+def test_pruned_cursor_expires(db, user):
+    db.session.add_all([Prompt(title=f'Prompt {i}', content='Text', user_id=user.id)
+                        for i in range(3)])
+    db.session.commit()
+    since = head_cursor() - 3
+
+    # 最新的一条始终保留
+    assert prune_changes(datetime.utcnow() + timedelta(days=1)) == 2
+    assert db.session.query(ChangeLog).count() == 1
+    with pytest.raises(CursorExpired):
+        read_changes(user.id, since, 100)
+    assert _changes(user, head_cursor())[0] == []
@@ -0,0 +1,93 @@
+"""Conditional requests on prompt listings and single prompts."""
+
+import pytest
+from sqlalchemy import event
+
+from app.models import Prompt, Tag
+
+
+@pytest.fixture
+def tag(db, user):
+    """A tag used by three prompts."""
+    tag = Tag(name='python', user_id=user.id)
+    for i in range(3):
+        prompt = Prompt(title=f'Prompt {i}', content=f'Content {i}', user_id=user.id)
+        prompt.tags = [tag]
+        db.session.add(prompt)
+    db.session.commit()
+    return tag
+
+
+@pytest.fixture
+def statements(db):
+    """SQL statements executed while the test runs."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    engine = db.get_engine()
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_listing_not_modified(client, tag):
+    response = client.get('/api/prompts')
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    assert 'Last-Modified' not in response.headers
+
+    response = client.get('/api/prompts', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+
+
+def test_listing_not_modified_reads_no_prompts(client, tag, statements):
+    etag = client.get('/api/prompts').headers['ETag']
+    statements.clear()
+    assert client.get('/api/prompts', headers={'If-None-Match': etag}).status_code == 304
+    assert statements
+    assert not [s for s in statements if 'prompts' in s]
+
+
+def test_listing_without_total_does_not_count_prompts(client, tag, statements):
+    response = client.get('/api/prompts?include_total=false')
+    assert response.status_code == 200
+    assert 'total_items' not in response.get_json()['pagination']
+    assert not [s for s in statements if 'count(' in s and 'prompts' in s]
+
+
+def test_listing_etag_changes_after_delete(client, db, tag):
+    etag = client.get('/api/prompts').headers['ETag']
+    db.session.delete(Prompt.query.first())
+    db.session.commit()
+
+    response = client.get('/api/prompts', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.get_json()['prompts']) == 2
+    # 列表不发送 Last-Modified，If-Modified-Since 不会得到过期的 304
+    response = client.get('/api/prompts',
+                          headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert response.status_code == 200
+
+
+def test_listing_etag_changes_after_tag_rename(client, db, tag):
+    etag = client.get('/api/prompts').headers['ETag']
+    tag.name = 'python3'
+    db.session.commit()
+
+    response = client.get('/api/prompts', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['prompts'][0]['tags'] == [{'id': tag.id, 'name': 'python3'}]
+
+
+def test_prompt_not_modified(client, db, tag):
+    prompt_id = Prompt.query.first().id
+    response = client.get(f'/api/prompts/{prompt_id}')
+    assert response.status_code == 200
+    assert 'Last-Modified' in response.headers
+
+    etag = response.headers['ETag']
+    assert client.get(f'/api/prompts/{prompt_id}',
+                      headers={'If-None-Match': etag}).status_code == 304
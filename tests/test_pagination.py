@@ -0,0 +1,54 @@
+"""Cursor and numbered pages of the prompt listing."""
+
+import pytest
+
+from app.models import Prompt
+
+
+@pytest.fixture
+def prompts(db, user):
+    """Thirty prompts, the newest last."""
+    for i in range(30):
+        db.session.add(Prompt(title=f'Prompt {i}', content=f'Content {i}', user_id=user.id))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('query', ['', '&page=1'])
+@pytest.mark.parametrize('per_page', [0, -1, -5])
+def test_per_page_must_be_positive(client, prompts, query, per_page):
+    response = client.get(f'/api/prompts?per_page={per_page}{query}')
+    assert response.status_code == 400
+
+
+def test_search_per_page_must_be_positive(client, prompts):
+    assert client.get('/api/prompts/search?q=Prompt&per_page=-5').status_code == 400
+
+
+@pytest.mark.parametrize('query', ['', '&page=1'])
+def test_per_page_is_capped(app, client, prompts, query):
+    app.config['MAX_PER_PAGE'] = 7
+    data = client.get(f'/api/prompts?per_page=1000000{query}').get_json()
+    assert len(data['prompts']) == 7
+    assert data['pagination']['per_page'] == 7
+
+
+def test_cursor_pages_cover_listing_once(client, prompts):
+    seen = []
+    data = client.get('/api/prompts?per_page=8').get_json()
+    while True:
+        seen += [prompt['id'] for prompt in data['prompts']]
+        cursor = data['pagination']['next_cursor']
+        if cursor is None:
+            break
+        data = client.get(f'/api/prompts?per_page=8&cursor={cursor}').get_json()
+    assert seen == sorted(seen, reverse=True)
+    assert len(set(seen)) == 30
+
+    # prev_cursor 回到上一页
+    previous = client.get(
+        f"/api/prompts?per_page=8&cursor={data['pagination']['prev_cursor']}").get_json()
+    assert [prompt['id'] for prompt in previous['prompts']] == seen[16:24]
+
+
+def test_invalid_cursor(client, prompts):
+    assert client.get('/api/prompts?cursor=not-a-cursor').status_code == 400
@@ -0,0 +1,43 @@
+"""API rate limits and concurrency caps."""
+
+import pytest
+
+from app.utils.rate_limit import MemoryStorage, SQLiteStorage, setup_rate_limit
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    """Each rate limit storage backend."""
+    if request.param == 'memory':
+        return MemoryStorage()
+    return SQLiteStorage(str(tmp_path / 'ratelimit.db'))
+
+
+def test_token_bucket(storage):
+    # 每秒补充 2 个，突发上限 3
+    assert [storage.take('client', 2, 3, 100.0) for _ in range(3)] == [0, 0, 0]
+    assert storage.take('client', 2, 3, 100.0) == pytest.approx(0.5)
+    assert storage.take('other', 2, 3, 100.0) == 0
+    assert storage.take('client', 2, 3, 100.5) == 0
+    assert storage.take('client', 2, 3, 100.5) > 0
+
+
+def test_concurrency_slots(storage):
+    first = storage.acquire('export', 2, 100.0, 300)
+    assert storage.acquire('export', 2, 100.0, 300) is not None
+    assert storage.acquire('export', 2, 100.0, 300) is None
+    storage.release('export', first)
+    assert storage.acquire('export', 2, 100.0, 300) is not None
+
+
+def test_requests_over_the_limit_are_rejected(app, client):
+    app.config.update(RATE_LIMIT_ENABLED=True, RATE_LIMIT_STORAGE='memory',
+                      RATE_LIMIT_DEFAULT=(0.01, 2))
+    setup_rate_limit(app)
+
+    assert [client.get('/api/prompts').status_code for _ in range(2)] == [200, 200]
+    response = client.get('/api/prompts')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    # 只限制 JSON API
+    assert client.get('/auth/login').status_code == 200
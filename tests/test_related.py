@@ -0,0 +1,64 @@
+"""Precomputed related prompts."""
+
+import pytest
+
+from app.models import Prompt
+from app.utils import related
+from app.utils.related import get_related, refresh_related
+
+
+@pytest.fixture
+def prompts(db, user):
+    """Three prompts about python and one about cooking, all flagged stale."""
+    texts = [
+        ('Python script', 'Write a python script that parses logs'),
+        ('Python tests', 'Write python unit tests for a parser'),
+        ('Python docs', 'Document a python parser module'),
+        ('Soup recipe', 'Tomato soup recipe with basil'),
+    ]
+    items = [Prompt(title=title, content=content, user_id=user.id) for title, content in texts]
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+def _stale_ids():
+    return sorted(p.id for p in Prompt.query.filter(Prompt.related_stale.is_(True)))
+
+
+def test_refresh_computes_related(db, prompts):
+    assert refresh_related() == 4
+    assert _stale_ids() == []
+    related_ids = [prompt_id for prompt_id, _, _ in get_related(prompts[0].id)]
+    assert set(related_ids) == {prompts[1].id, prompts[2].id}
+    assert get_related(prompts[3].id) == []
+
+
+def test_edit_during_refresh_stays_stale(db, prompts, monkeypatch):
+    edited = prompts[0].id
+    load_documents = related._load_documents
+
+    def load_then_edit(user_id):
+        documents = load_documents(user_id)
+        # 语料已经读取后，另一个请求修改了提示
+        db.session.get(Prompt, edited).content = 'Tomato soup recipe with onion'
+        db.session.commit()
+        return documents
+
+    monkeypatch.setattr(related, '_load_documents', load_then_edit)
+    refresh_related()
+    assert _stale_ids() == [edited]
+
+    monkeypatch.setattr(related, '_load_documents', load_documents)
+    assert refresh_related() == 1
+    assert _stale_ids() == []
+    assert get_related(edited)[0][0] == prompts[3].id
+
+
+def test_deleting_a_prompt_flags_its_holders(db, prompts):
+    refresh_related()
+    db.session.delete(prompts[2])
+    db.session.commit()
+    assert _stale_ids() == [prompts[0].id, prompts[1].id]
+    refresh_related()
+    assert [prompt_id for prompt_id, _, _ in get_related(prompts[0].id)] == [prompts[1].id]
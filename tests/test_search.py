@@ -0,0 +1,165 @@
+"""Text search backends."""
+
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+
+from app.models import ChangeLog, Prompt, Tag
+from app.utils.search import (
+    FTS5SearchBackend, MemorySearchBackend, choose_tokenizer, create_fts, fts_rank_subquery,
+    search_prompts,
+)
+
+
+@pytest.fixture
+def prompts(db, user):
+    """Prompts of one user; the search cache is disabled."""
+    items = [
+        Prompt(title='Python script', content='Parse log files', user_id=user.id),
+        Prompt(title='Soup recipe', content='Tomato soup with basil', user_id=user.id),
+        Prompt(title='SQL query', content='Count rows per day', user_id=user.id),
+    ]
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+@pytest.fixture
+def memory(app, prompts):
+    """A memory backend that catches up on every search."""
+    app.extensions.pop('search_cache', None)
+    backend = MemorySearchBackend()
+    backend.init_app(app, None)
+    backend.refresh_interval = 0
+    app.extensions['search_backend'] = backend
+    return backend
+
+
+@pytest.fixture
+def fts(app, db):
+    """
+    An FTS5 backend over a trigram index kept in sync by its triggers.
+
+    Request it before ``user`` and ``prompts``: setting the backend up ends an
+    application context, which detaches the objects loaded so far.
+    """
+    with db.get_engine().begin() as connection:
+        if choose_tokenizer(connection, 'trigram') != 'trigram':
+            pytest.skip('SQLite has no FTS5 trigram tokenizer')
+        create_fts(connection, 'trigram')
+    app.extensions.pop('search_cache', None)
+    backend = FTS5SearchBackend()
+    backend.init_app(app, db)
+    app.extensions['search_backend'] = backend
+    return backend
+
+
+@contextmanager
+def other_worker(app):
+    """Write as another process would: this process's backend is not notified."""
+    backend = app.extensions.pop('search_backend')
+    try:
+        yield
+    finally:
+        app.extensions['search_backend'] = backend
+
+
+def _titles(query):
+    return sorted(prompt.title for prompt in search_prompts(query, per_page=50).items)
+
+
+def test_memory_applies_own_commits(db, memory, prompts):
+    assert _titles('soup') == ['Soup recipe']
+    prompts[0].content = 'Parse soup orders'
+    db.session.commit()
+    assert _titles('soup') == ['Python script', 'Soup recipe']
+
+
+def test_memory_catches_up_on_other_workers(app, db, memory, prompts, monkeypatch):
+    assert _titles('soup') == ['Soup recipe']
+    monkeypatch.setattr(memory, 'rebuild', lambda: pytest.fail('unexpected rebuild'))
+
+    with other_worker(app):
+        # 时钟偏差：另一个进程写入的 updated_at 早于本进程已索引的提示
+        prompts[2].content = 'Count soup orders'
+        prompts[2].updated_at = datetime(2000, 1, 1)
+        db.session.delete(prompts[1])
+        db.session.add(Prompt(title='Soup stock', content='Bones', user_id=prompts[0].user_id))
+        db.session.commit()
+
+    assert _titles('soup') == ['SQL query', 'Soup stock']
+    assert prompts[1].id not in memory.index.search('soup', ['title'])
+
+
+def test_memory_applies_late_log_entries(app, db, memory, prompts, user):
+    assert _titles('basil') == ['Soup recipe']
+    head = memory._cursor
+    # 较大的 id 先提交；较小的 id 之后才提交，也必须被应用
+    db.session.add(ChangeLog(id=head + 5, user_id=user.id, entity='prompt',
+                             entity_id=prompts[1].id, op='update'))
+    db.session.commit()
+    assert _titles('basil') == ['Soup recipe']
+    assert memory._cursor == head + 5
+
+    with other_worker(app):
+        prompts[0].content = 'Parse logs, then basil'
+        db.session.commit()
+    db.session.query(ChangeLog).filter(ChangeLog.id > head + 5).update({'id': head + 2})
+    db.session.commit()
+    assert _titles('basil') == ['Python script', 'Soup recipe']
+
+
+def test_memory_build_is_not_repeated_concurrently(db, memory, prompts):
+    assert not memory._built
+    memory._sync_lock.acquire()
+    try:
+        # 另一个线程正在建立索引时退回 LIKE，结果相同
+        assert _titles('soup') == ['Soup recipe']
+        assert not memory._built
+    finally:
+        memory._sync_lock.release()
+    assert _titles('soup') == ['Soup recipe']
+    assert memory._built
+
+
+def test_fts_looks_up_short_queries_in_the_vocabulary(app, db, fts, prompts, user):
+    prompts[2].tags = [Tag(name='AI', user_id=user.id)]
+    db.session.commit()
+
+    assert fts_rank_subquery('pt', trigram=True) is not None
+    # 出现在列末尾、或整列不足三个字符的片段也能找到
+    assert _titles('pt') == ['Python script']
+    assert _titles('AY') == ['SQL query']
+    assert _titles('ai') == ['SQL query']
+    assert _titles('b') == ['Soup recipe']
+    assert _titles('zq') == []
+
+
+def test_fts_scans_common_short_queries(app, fts, prompts):
+    app.config['SEARCH_SHORT_QUERY_MAX_DOCS'] = 0
+    assert fts_rank_subquery('pt', trigram=True) is None
+    assert _titles('pt') == ['Python script']
+
+
+def test_fts_matches_the_whole_query_as_a_substring(fts, prompts):
+    assert _titles('tomato soup') == ['Soup recipe']
+    assert _titles('soup tomato') == []
+    assert _titles('ARSE LOG') == ['Python script']
+
+
+def test_fts_restricts_to_fields(fts, prompts):
+    assert [p.title for p in search_prompts('recipe', fields=['title']).items] == ['Soup recipe']
+    assert search_prompts('recipe', fields=['content']).items == []
+
+
+def test_fts_follows_tag_renames(db, fts, prompts, user):
+    tag = Tag(name='kitchen', user_id=user.id)
+    prompts[1].tags = [tag]
+    db.session.commit()
+    assert _titles('kitchen') == ['Soup recipe']
+
+    tag.name = 'bakery'
+    db.session.commit()
+    assert _titles('kitchen') == []
+    assert _titles('bakery') == ['Soup recipe']
@@ -0,0 +1,52 @@
+"""PromptSerializer must produce the same JSON as PromptSchema."""
+
+import pytest
+from flask import current_app
+from sqlalchemy import update
+
+from app.models import Category, Prompt, Tag
+from app.utils.serializer import _CHECK_FIELDSETS, _fast_dump, _schema_dump
+
+
+@pytest.fixture
+def prompt_ids(db, user):
+    """Seed prompts with and without tags/categories; return their ids."""
+    tags = [Tag(name=name, user_id=user.id) for name in ('chatgpt', 'coding', '写作')]
+    categories = [Category(name='Writing', description='Long form', user_id=user.id),
+                  Category(name='Code', user_id=user.id)]
+    db.session.add_all(tags + categories)
+    db.session.commit()
+    for i in range(12):
+        prompt = Prompt(title=f'Prompt {i} "quoted"', content=f'Write code {i}\n写代码',
+                        description=None if i % 4 == 0 else f'Description {i}',
+                        user_id=user.id)
+        prompt.tags = tags[:i % 4]
+        prompt.categories = categories[:i % 3]
+        db.session.add(prompt)
+    db.session.commit()
+    return [prompt_id for (prompt_id,) in db.session.query(Prompt.id).order_by(Prompt.id)]
+
+
+def _assert_identical(prompt_ids, fields):
+    dumps = current_app.json.dumps
+    expected = _schema_dump(prompt_ids, fields)
+    actual = _fast_dump(prompt_ids, fields)
+    assert len(actual) == len(expected) == len(prompt_ids)
+    for want, got in zip(expected, actual):
+        assert dumps(got) == dumps(want)
+
+
+@pytest.mark.parametrize('fields', _CHECK_FIELDSETS)
+def test_matches_schema_with_snapshots(db, prompt_ids, fields):
+    assert db.session.query(Prompt).filter(Prompt.labels.is_(None)).count() == 0
+    _assert_identical(prompt_ids, fields)
+
+
+@pytest.mark.parametrize('fields', _CHECK_FIELDSETS)
+def test_matches_schema_without_snapshots(db, prompt_ids, fields):
+    # 一半的提示没有快照，从关联表读取标签和分类
+    db.session.execute(update(Prompt.__table__).where(
+        Prompt.id.in_(prompt_ids[::2])).values(labels=None))
+    db.session.commit()
+    db.session.expunge_all()
+    _assert_identical(prompt_ids, fields)
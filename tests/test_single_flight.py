@@ -0,0 +1,142 @@
+"""Single-flight coalescing of identical concurrent requests."""
+
+import threading
+import time
+
+from flask import request
+
+from app.utils.single_flight import SharedFlights, SingleFlight, request_key
+
+
+def _wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def _start(target, *args):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(target(*args)))
+    thread.start()
+    return thread, results
+
+
+class Blocking:
+    """A computation that runs until the test releases it."""
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        return self.result
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight(wait=5)
+    compute = Blocking({'total': 3})
+    leader, leader_result = _start(flights.do, 'search', 'q', compute)
+    assert compute.started.wait(5)
+
+    waiters = [_start(flights.do, 'search', 'q', compute) for _ in range(3)]
+    _wait_until(lambda: flights.stats()['groups']['search']['requests'] == 4)
+    compute.release.set()
+    for thread, _ in [(leader, leader_result)] + waiters:
+        thread.join()
+
+    assert compute.calls == 1
+    assert leader_result == [{'total': 3}]
+    assert all(results == [{'total': 3}] for _, results in waiters)
+    counts = flights.stats()['groups']['search']
+    assert counts['executed'] == 1 and counts['coalesced'] == 3
+
+
+def test_waiters_run_the_call_when_the_leader_fails():
+    flights = SingleFlight(wait=5)
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('boom')
+
+    def lead():
+        try:
+            flights.do('search', 'q', fail)
+        except RuntimeError as e:
+            return e
+
+    leader, errors = _start(lead)
+    assert started.wait(5)
+    waiter, results = _start(flights.do, 'search', 'q', lambda: 'computed')
+    _wait_until(lambda: flights.stats()['groups']['search']['requests'] == 2)
+    release.set()
+    leader.join()
+    waiter.join()
+    assert [str(e) for e in errors] == ['boom']
+    assert results == ['computed']
+
+
+class PolledFlights(SharedFlights):
+    """Shared storage that counts how often a waiter polled it."""
+
+    polls = 0
+
+    def poll(self, key):
+        self.polls += 1
+        return super().poll(key)
+
+
+def test_processes_share_results_through_storage(tmp_path):
+    path = str(tmp_path / 'flights.db')
+    # 两个 SingleFlight 相当于两个 worker 进程
+    first = SingleFlight(wait=5, shared=SharedFlights(path))
+    second = SingleFlight(wait=5, shared=PolledFlights(path))
+    compute = Blocking([1, 2, 3])
+    leader, _ = _start(first.do, 'search', 'q', compute)
+    assert compute.started.wait(5)
+
+    waiter, results = _start(second.do, 'search', 'q', compute)
+    _wait_until(lambda: second.shared.polls)
+    compute.release.set()
+    leader.join()
+    waiter.join()
+
+    assert compute.calls == 1
+    assert results == [[1, 2, 3]]
+    assert second.stats()['groups']['search']['shared'] == 1
+
+
+def test_request_key_ignores_argument_order(app):
+    with app.test_request_context('/?a=1&b=2'):
+        key = request_key(request.args)
+    with app.test_request_context('/?b=2&a=1'):
+        assert request_key(request.args) == key
+        assert request_key(request.args, 'etag') != key
+
+
+def test_waiter_takes_a_result_finished_between_polls(tmp_path):
+    path = str(tmp_path / 'flights.db')
+    first = SingleFlight(wait=5, shared=SharedFlights(path))
+    compute = Blocking('result')
+    leader, _ = _start(first.do, 'search', 'q', compute)
+    assert compute.started.wait(5)
+
+    class FinishAfterPoll(SharedFlights):
+        def poll(self, key):
+            row = super().poll(key)
+            if not compute.release.is_set():
+                # 领头进程恰好在这次读取之后完成，记录已可以被接手
+                compute.release.set()
+                leader.join()
+            return row
+
+    second = SingleFlight(wait=5, shared=FinishAfterPoll(path))
+    assert second.do('search', 'q', compute) == 'result'
+    assert compute.calls == 1